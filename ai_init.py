@@ -1,9 +1,25 @@
+import time
 import requests
 import google.generativeai as genai
+from token_budget import apply_budget, estimate_tokens, record_usage
+from prompt_cache import prompt_prefix_cache
+from structured_output import IncrementalJsonParser, parse_json_reply, count as count_json_outcome
 
+GEMINI_MODEL = "gemini-2.5-flash-preview-04-17"
 
 
-def query_groq_llm(user_question, context_text, groq_api_key):
+
+def query_groq_llm(user_question, context_text, groq_api_key, call_site="default", route=None, static_prefix=None):
+    # Trim the prompt to the call site's budget before sending it
+    if context_text:
+        context_text, truncated = apply_budget(call_site, context_text)
+    else:
+        user_question, truncated = apply_budget(call_site, user_question)
+    # Groq has no context caching; the static prefix is always sent inline
+    if static_prefix:
+        context_text = static_prefix + context_text
+    start = time.perf_counter()
+
     url = "https://api.groq.com/openai/v1/chat/completions"
     headers = {
         "Authorization": f"Bearer {groq_api_key}",
@@ -21,26 +37,104 @@ def query_groq_llm(user_question, context_text, groq_api_key):
     }
     response = requests.post(url, headers=headers, json=body)
     result = response.json()
-    return result['choices'][0]['message']['content']
+    answer = result['choices'][0]['message']['content']
+
+    usage = result.get("usage") or {}
+    record_usage(
+        call_site,
+        usage.get("prompt_tokens") or estimate_tokens(context_text) + estimate_tokens(user_question),
+        usage.get("completion_tokens") or estimate_tokens(answer),
+        time.perf_counter() - start,
+        truncated,
+        route
+    )
+    return answer
+
+def _generate(model, prompt, response_schema=None):
+    """
+    Run one Gemini generation and return (response, text).
 
-def query_gemini_llm(user_question, context_text, gemini_api_key):
+    With a response schema the reply is constrained to JSON and streamed
+    through the incremental parser, which stops reading as soon as the value
+    is complete or can no longer become valid JSON.
+    """
+    if response_schema is None:
+        response = model.generate_content(prompt)
+        return response, response.text
+    config = {"response_mime_type": "application/json", "response_schema": response_schema}
+    response = model.generate_content(prompt, generation_config=config, stream=True)
+    parser = IncrementalJsonParser()
+    text = ""
+    for chunk in response:
+        text += chunk.text
+        if not parser.feed(chunk.text) or parser.done:
+            break
+    return response, text
+
+def query_gemini_llm(user_question, context_text, gemini_api_key, call_site="default", route=None, static_prefix=None,
+                     response_schema=None):
+    """
+    Send a prompt to Gemini and return the text reply.
+
+    Args:
+        user_question: The user's question (appended after the context).
+        context_text: Instructions and context for the model.
+        gemini_api_key: Gemini API key.
+        call_site: Name used for token accounting and the input budget (see token_budget.py).
+        route: Optional request route, recorded alongside the call site.
+        static_prefix: Fixed instructions placed before the context. They are
+            registered once with Gemini's context cache and referenced by
+            handle; when caching is unavailable they are sent inline.
+        response_schema: Optional JSON schema; the reply is then schema-constrained
+            JSON text (see query_gemini_json).
+    """
     try:
+        # Trim the prompt to the call site's budget before sending it
+        if context_text:
+            context_text, truncated = apply_budget(call_site, context_text)
+        else:
+            user_question, truncated = apply_budget(call_site, user_question)
+        start = time.perf_counter()
         
         
         # Configure the client with API key
         genai.configure(api_key=gemini_api_key)
         
-        # Create a client instance
-        client = genai.GenerativeModel("gemini-2.5-flash-preview-04-17")
-        
-        # Format the prompt with system context and user question
-        full_prompt = f"{context_text}\n\nUser question: {user_question}"
-        
-        # Generate content
-        response = client.generate_content(full_prompt)
+        # Reference the static prefix by its cache handle when the provider accepts it
+        handle = prompt_prefix_cache.handle(GEMINI_MODEL, static_prefix) if static_prefix else None
+        response = None
+        if handle is not None:
+            full_prompt = f"{context_text}\n\nUser question: {user_question}"
+            try:
+                response, text = _generate(prompt_prefix_cache.backend.model_for(handle), full_prompt, response_schema)
+            except Exception as e:
+                # Expired or deleted at the provider; fall back to the full prompt for this call
+                print(f"Cached prompt prefix rejected, sending it inline: {e}")
+                prompt_prefix_cache.drop(GEMINI_MODEL, static_prefix)
+
+        if response is None:
+            # Create a client instance
+            client = genai.GenerativeModel(GEMINI_MODEL)
+
+            # Format the prompt with system context and user question
+            full_prompt = f"{static_prefix or ''}{context_text}\n\nUser question: {user_question}"
+
+            # Generate content
+            response, text = _generate(client, full_prompt, response_schema)
+
+        usage = getattr(response, "usage_metadata", None)
+        prompt_prefix_cache.record_cached_tokens(getattr(usage, "cached_content_token_count", 0))
+        record_usage(
+            call_site,
+            getattr(usage, "prompt_token_count", 0) or estimate_tokens(full_prompt),
+            getattr(usage, "candidates_token_count", 0) or estimate_tokens(text),
+            time.perf_counter() - start,
+            truncated,
+            route
+        )
         
         # Return the text response
-        return response.text
+        return text
         
     except ImportError:
         # Handle case where google-generativeai package is not installed
@@ -50,6 +144,40 @@ def query_gemini_llm(user_question, context_text, gemini_api_key):
         print(f"Error querying Gemini: {str(e)}")
         return f"Error: {str(e)}"
 
+def query_gemini_json(user_question, context_text, gemini_api_key, schema, call_site="default", route=None,
+                      static_prefix=None):
+    """
+    Ask Gemini for a JSON value constrained by `schema` and return it parsed.
 
+    The reply is validated against the schema; a malformed reply is first
+    repaired locally and, only if that fails, re-asked once with the error.
 
+    Returns:
+        The parsed value (unknown object keys removed).
 
+    Raises:
+        ValueError: If neither the reply nor the single repair attempt is usable.
+    """
+    raw = query_gemini_llm(user_question, context_text, gemini_api_key, call_site=call_site, route=route,
+                           static_prefix=static_prefix, response_schema=schema)
+    try:
+        return parse_json_reply(raw, schema)
+    except ValueError as e:
+        error = e
+    if raw.startswith("Error:"):
+        # The call itself failed; a repair prompt would fail the same way
+        count_json_outcome("failed")
+        raise ValueError(raw)
+    count_json_outcome("repair_calls")
+    repair_prompt = (
+        f"Your previous reply could not be used ({error}).\n"
+        f"Previous reply:\n{raw}\n\n"
+        "Return only the corrected JSON value that matches the required schema."
+    )
+    raw = query_gemini_llm(repair_prompt, "", gemini_api_key, call_site=call_site, route="json_repair",
+                           response_schema=schema)
+    try:
+        return parse_json_reply(raw, schema)
+    except ValueError:
+        count_json_outcome("failed")
+        raise
@@ -0,0 +1,168 @@
+import os
+import hashlib
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from embeddings import embed_query, embed_texts, normalize_rows
+from local_classifier import SEED_EXAMPLES, FOLLOW_UP_PATTERN, normalize
+from traffic_log import read_events
+
+# Load environment variables
+load_dotenv()
+
+# Minimum gap between the best and second-best label similarity to answer locally
+CENTROID_ROUTER_MIN_MARGIN = float(os.getenv("CENTROID_ROUTER_MIN_MARGIN", "0.05"))
+# Number of nearest labelled examples that vote alongside the centroids
+CENTROID_ROUTER_TOP_K = int(os.getenv("CENTROID_ROUTER_TOP_K", "5"))
+# Embedded example bank is cached here, keyed by a hash of the bank contents
+CENTROID_ROUTER_CACHE_PATH = os.getenv("CENTROID_ROUTER_CACHE_PATH", "cache/noid_router.npz")
+
+
+def _example_bank(route="noid"):
+    """Seed examples from the classifier prompts plus logged LLM decisions for the route."""
+    bank = {label: list(texts) for label, texts in SEED_EXAMPLES[route].items()}
+    for record in read_events("classifier"):
+        if record.get("route") == route and record.get("label") in bank and record.get("question"):
+            if record["question"] not in bank[record["label"]]:
+                bank[record["label"]].append(record["question"])
+    return bank
+
+
+class CentroidRouter:
+    """
+    Nearest-centroid router for the four-way guest routing
+    (single / clublist / recommendation / general).
+
+    Each label is represented by the normalized mean embedding of its
+    labelled examples. A question is embedded once and scored against all
+    centroids (plus a top-k vote over individual examples) with one matrix
+    product; when the best label does not clear the runner-up by
+    `min_margin` the caller should escalate to the LLM.
+    """
+
+    def __init__(self, bank=None, min_margin=CENTROID_ROUTER_MIN_MARGIN, top_k=CENTROID_ROUTER_TOP_K,
+                 cache_path=CENTROID_ROUTER_CACHE_PATH, embed_fn=embed_texts):
+        self.bank = bank or _example_bank()
+        self.min_margin = min_margin
+        self.top_k = top_k
+        self.cache_path = cache_path
+        self.embed_fn = embed_fn
+        self.labels = sorted(self.bank)
+        self._lock = threading.Lock()
+        self._built = False
+        self.stats = {"routed": 0, "escalated": 0}
+
+    def _bank_digest(self):
+        payload = "\n".join(f"{label}\t{text}" for label in self.labels for text in self.bank[label])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def build(self):
+        """Embed the example bank (or load it from the on-disk cache) and compute centroids."""
+        with self._lock:
+            if self._built:
+                return
+            texts = [text for label in self.labels for text in self.bank[label]]
+            example_labels = np.array([i for i, label in enumerate(self.labels) for _ in self.bank[label]])
+            digest = self._bank_digest()
+
+            vectors = None
+            if self.cache_path and os.path.exists(self.cache_path):
+                try:
+                    cached = np.load(self.cache_path)
+                    if str(cached["digest"]) == digest:
+                        vectors = cached["vectors"]
+                except Exception as e:
+                    print(f"Ignoring unreadable router cache '{self.cache_path}': {e}")
+            if vectors is None:
+                vectors = normalize_rows(self.embed_fn(texts))
+                if self.cache_path:
+                    try:
+                        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+                        np.savez(self.cache_path, digest=digest, vectors=vectors)
+                    except OSError as e:
+                        print(f"Could not write router cache '{self.cache_path}': {e}")
+
+            self.examples = vectors
+            self.example_labels = example_labels
+            self.centroids = normalize_rows(np.stack([
+                vectors[example_labels == i].mean(axis=0) for i in range(len(self.labels))
+            ]))
+            self._built = True
+
+    def scores(self, query_embedding):
+        """Return per-label scores: centroid similarity blended with a top-k example vote."""
+        self.build()
+        q = normalize_rows(query_embedding)
+        centroid_sims = self.centroids @ q
+
+        example_sims = self.examples @ q
+        k = min(self.top_k, len(example_sims))
+        top = np.argpartition(-example_sims, k - 1)[:k]
+        vote = np.bincount(self.example_labels[top], weights=example_sims[top], minlength=len(self.labels))
+        vote = vote / max(k, 1)
+        return 0.5 * centroid_sims + 0.5 * vote
+
+    def route(self, user_question, query_embedding=None):
+        """
+        Route a question.
+
+        Args:
+            user_question: The raw question.
+            query_embedding: Precomputed question embedding (embedded here if omitted).
+
+        Returns:
+            (label or None, margin). None means the margin was too small; ask the LLM.
+        """
+        if query_embedding is None:
+            query_embedding = embed_query(user_question)
+        scores = self.scores(query_embedding)
+        order = np.argsort(-scores)
+        margin = float(scores[order[0]] - scores[order[1]]) if len(order) > 1 else 1.0
+        with self._lock:
+            if margin < self.min_margin:
+                self.stats["escalated"] += 1
+                return None, margin
+            self.stats["routed"] += 1
+        return self.labels[order[0]], margin
+
+    def get_stats(self):
+        with self._lock:
+            total = self.stats["routed"] + self.stats["escalated"]
+            return {
+                **self.stats,
+                "min_margin": self.min_margin,
+                "escalation_rate": round(self.stats["escalated"] / total, 3) if total else 0.0,
+            }
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_centroid_router():
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = CentroidRouter()
+        return _router
+
+
+def centroid_route_noid(user_question):
+    """
+    Route a guest question with the centroid router, or return None to defer to the LLM.
+
+    Follow-up questions ("tell me more", "what about it") depend on history the
+    router cannot see, so they are always deferred.
+    """
+    if FOLLOW_UP_PATTERN.search(normalize(user_question)):
+        return None
+    try:
+        label, _ = get_centroid_router().route(user_question)
+        return label
+    except Exception as e:
+        print(f"Centroid router error: {e}")
+        return None
+
+
+def get_centroid_router_stats():
+    return _router.get_stats() if _router is not None else {}
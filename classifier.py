@@ -3,6 +3,11 @@ import re
 from dotenv import load_dotenv
 from ai_init import query_groq_llm, query_gemini_llm
 from faq_formatter import format_faqs_for_llm_club
+from local_classifier import local_classify
+from centroid_router import centroid_route_noid
+from traffic_log import log_event
+from token_budget import estimate_tokens
+from dialogue_state import INTERESTS_PROMPT, ALL_CLUBS_PROMPT
 
 # Load environment variables from .env file
 load_dotenv()
@@ -11,20 +16,12 @@ load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-def classify_question(user_question: str, provider: str = "gemini",prefix="") -> str:
-    """
-    Classifies a user question as 'Website', 'Club', or 'Both'.
-    
-    Args:
-        user_question: The question text to classify
-        provider: Which LLM provider to use - "openrouter" or "groq" (default: "openrouter")
-        
-    Returns:
-        str: Classification result ('Website', 'Club', or 'Both')
-    """
-    try:
-        # Classification prompt
-        context_text = """
+# Guest routing backend after the local classifier: "llm" (default) or "centroid"
+NOID_ROUTER = os.getenv("NOID_ROUTER", "llm")
+
+# Classifier instruction blocks. They never change between calls, so they are sent as
+# static prompt prefixes; the history, the output format and the question form the dynamic suffix.
+QUESTION_CLASSIFIER_PROMPT = """
         You are a classifier. Your task is to analyze a user question and classify its intent into one of the following three categories:
 
         1. **Website** 
@@ -55,71 +52,15 @@ def classify_question(user_question: str, provider: str = "gemini",prefix="") ->
         - "How do i create new clubs?"
 
         STRICTLY FOLLOW THIS: If the question uses vague pronouns (like "it", "they", "this", "that", etc.) or refers implicitly to something already discussed (e.g., tell me more, explain more, ), you may use the conversation history provided below (If it exist).\n\n
-        """
-
-        context_text += f"{prefix}\n\n"
         
-        
-        context_text += """
-        **STRICTLY respond with one of the following words:** Website, Club, General
 
-        Now classify the following question accordingly.
         """
 
-        print(f"classifier context: {context_text}")
-        
-        # Choose provider based on parameter
-        if provider.lower() == "groq":
-            classification = query_groq_llm(user_question, context_text, GROQ_API_KEY)
-        else:
-            classification = query_gemini_llm(user_question, context_text, GEMINI_API_KEY)
-        
-        # Clean up response to ensure it's just the classification
-        classification = classification.strip()
-        
-        # Validate the result
-        valid_classifications = ["Website", "Club", "General"]
-        if classification not in valid_classifications:
-            # If response contains unexpected content, attempt to extract correct value
-            for valid in valid_classifications:
-                if valid.lower() in classification.lower():
-                    return valid
-            # Default to "Club" if we can't determine the classification
-            return "Club"
-        
-        return classification
-    except Exception as e:
-        print(f"Classification error with {provider} provider: {str(e)}")
-        # Default to Club if there's an error
-        return "Club"
-    
-def classify_question_noid(user_question: str, provider: str = "gemini",prefix="") -> str:
-    """
-    Classifies a user question 
-    as :
-            -Question about a single club
-            -Question about what clubs are there
-            -The Question is asking about club recommendation
-            -General question about the University (default if unsure)
-    
-    Args:
-        user_question: The question text to classify
-        provider: Which LLM provider to use - "openrouter" or "groq" (default: "openrouter")
-        
-    Returns:
-        str: Classification result ('single', 'clublist', 'recommendation' or  'general')
-    """
-    try:
-        # Classification prompt
-        context_text = """
+NOID_CLASSIFIER_PROMPT = """
         You are a classifier. Your task is to analyze a user question and classify its intent into one of the following four categories:
         Before you classify, please read the following instructions carefully:
         STRICTLY FOLLOW THIS: If the question uses vague pronouns (like "tell me more", "Explain more", "this", "what is this about", etc.) or refers implicitly to something already discussed (e.g., previous messages or the current state of the club), always refer back to the history (IF IT EXIST).\n\n
-        """
-
-        context_text += f"{prefix}\n\n"
-
-        context_text += """
+        
         1. **single**  
         The question is about a specific club.  
         This includes questions that refer to a known club name or ask about a club's activities, schedule, or members.  
@@ -164,64 +105,14 @@ def classify_question_noid(user_question: str, provider: str = "gemini",prefix="
         - "What is NDHU?"
         - "How do I join clubs?"
         
-        **STRICTLY respond with one of the following words:** single, clublist, recommendation, general
 
-        Now classify the following question accordingly.
         """
-        
-        # Choose provider based on parameter
-        if provider.lower() == "groq":
-            classification = query_groq_llm(user_question, context_text, GROQ_API_KEY)
-        else:
-            classification = query_gemini_llm(user_question, context_text, GEMINI_API_KEY)
-        
-        # Clean up response to ensure it's just the classification
-        classification = classification.strip().lower()
-        
-        # Validate the result
-        valid_classifications = ["single", "clublist", "recommendation", "general"]
-        if classification not in valid_classifications:
-            # If response contains unexpected content, attempt to extract correct value
-            for valid in valid_classifications:
-                if valid in classification:
-                    return valid
-            # Default to "general" if we can't determine the classification
-            return "general"
-        
-        return classification
-    except Exception as e:
-        print(f"Classification error with {provider} provider: {str(e)}")
-        # Default to general if there's an error
-        return "general"
-    
 
-def classify_catcher_all_clubs(user_question: str, provider: str = "gemini",prefix="") -> str:
-    """
-    Classifies a user question 
-    as :
-            -Question about a single club
-            -Question about what clubs are there
-            -The Question is asking about club recommendation
-            -General question about the University (default if unsure)
-    
-    Args:
-        user_question: The question text to classify
-        provider: Which LLM provider to use - "openrouter" or "groq" (default: "openrouter")
-        
-    Returns:
-        str: Classification result ('yes', 'no', or  'continue')
-    """
-    try:
-        # Classification prompt
-        context_text = """
+CATCHER_CLASSIFIER_PROMPT = """
         You are a classifier. Your task is to analyze a user question and classify its intent into one of the following four categories:
         Before you classify, please read the following instructions carefully:
         STRICTLY FOLLOW THIS: If the question uses vague pronouns (like "tell me more", "Explain more", "this", "what is this about", etc.) or refers implicitly to something already discussed (e.g., previous messages or the current state of the club), always refer back to the history (IF IT EXIST).\n\n
-        """
-
-        context_text += f"{prefix}\n\n"
-
-        context_text += """
+        
         1. yes
         Select this category if the user clearly expresses interest in seeing the full list of available clubs.
         These responses indicate affirmation or agreement with the idea of viewing all clubs.
@@ -281,16 +172,179 @@ def classify_catcher_all_clubs(user_question: str, provider: str = "gemini",pref
 
 
         
-        **STRICTLY respond with one of the following words:** yes, no, continue
 
-        Now classify the following question accordingly.
         """
+
+# Output format of each classifier; it follows the history so it is the last instruction the model reads
+CLASSIFIER_OUTPUT_FORMAT = """
+        **STRICTLY respond with one of the following words:** {labels}
+
+        Now classify the following question accordingly.
+"""
+
+
+
+def classify_locally(route: str, user_question: str):
+    """
+    Try to classify without an LLM call.
+
+    Args:
+        route: "question", "noid" or "catcher".
+        user_question: The question text to classify
+
+    Returns:
+        str: The label, or None when the question needs the LLM.
+    """
+    local = local_classify(route, user_question)
+    if local:
+        return local
+    # Embedding router; the question embedding is cached and reused by query_pdf
+    if route == "noid" and NOID_ROUTER == "centroid":
+        return centroid_route_noid(user_question)
+    return None
+
+def classify_question(user_question: str, provider: str = "gemini",prefix="", local_first: bool = True) -> str:
+    """
+    Classifies a user question as 'Website', 'Club', or 'Both'.
+    
+    Args:
+        user_question: The question text to classify
+        provider: Which LLM provider to use - "openrouter" or "groq" (default: "openrouter")
+        
+    Returns:
+        str: Classification result ('Website', 'Club', or 'Both')
+    """
+    try:
+        # Cheap local answer first; only uncertain questions reach the LLM
+        if local_first:
+            local = classify_locally("question", user_question)
+            if local:
+                return local
+
+        # Classification prompt. The static instructions are sent as a cacheable prefix (see prompt_cache.py);
+        # the history, the output format and the question follow it
+        context_text = f"{prefix}\n\n" + CLASSIFIER_OUTPUT_FORMAT.format(labels="Website, Club, General")
+
+        print(f"classifier context: ~{estimate_tokens(context_text)} tokens")
+        
+        # Choose provider based on parameter
+        if provider.lower() == "groq":
+            classification = query_groq_llm(user_question, context_text, GROQ_API_KEY, call_site="classify_question",
+                                            static_prefix=QUESTION_CLASSIFIER_PROMPT)
+        else:
+            classification = query_gemini_llm(user_question, context_text, GEMINI_API_KEY, call_site="classify_question",
+                                             static_prefix=QUESTION_CLASSIFIER_PROMPT)
+        
+        # Clean up response to ensure it's just the classification
+        classification = classification.strip()
+        
+        # Validate the result
+        valid_classifications = ["Website", "Club", "General"]
+        if classification not in valid_classifications:
+            # If response contains unexpected content, attempt to extract correct value
+            for valid in valid_classifications:
+                if valid.lower() in classification.lower():
+                    return valid
+            # Default to "Club" if we can't determine the classification
+            return "Club"
+        
+        log_event("classifier", route="question", question=user_question, label=classification)
+        return classification
+    except Exception as e:
+        print(f"Classification error with {provider} provider: {str(e)}")
+        # Default to Club if there's an error
+        return "Club"
+    
+def classify_question_noid(user_question: str, provider: str = "gemini",prefix="", local_first: bool = True) -> str:
+    """
+    Classifies a user question 
+    as :
+            -Question about a single club
+            -Question about what clubs are there
+            -The Question is asking about club recommendation
+            -General question about the University (default if unsure)
+    
+    Args:
+        user_question: The question text to classify
+        provider: Which LLM provider to use - "openrouter" or "groq" (default: "openrouter")
+        
+    Returns:
+        str: Classification result ('single', 'clublist', 'recommendation' or  'general')
+    """
+    try:
+        # Cheap local answer first; only uncertain questions reach the LLM
+        if local_first:
+            local = classify_locally("noid", user_question)
+            if local:
+                return local
+
+        # Classification prompt. The static instructions are sent as a cacheable prefix (see prompt_cache.py);
+        # the history, the output format and the question follow it
+        context_text = f"{prefix}\n\n" + CLASSIFIER_OUTPUT_FORMAT.format(labels="single, clublist, recommendation, general")
         
         # Choose provider based on parameter
         if provider.lower() == "groq":
-            classification = query_groq_llm(user_question, context_text, GROQ_API_KEY)
+            classification = query_groq_llm(user_question, context_text, GROQ_API_KEY, call_site="classify_noid",
+                                            static_prefix=NOID_CLASSIFIER_PROMPT)
         else:
-            classification = query_gemini_llm(user_question, context_text, GEMINI_API_KEY)
+            classification = query_gemini_llm(user_question, context_text, GEMINI_API_KEY, call_site="classify_noid",
+                                             static_prefix=NOID_CLASSIFIER_PROMPT)
+        
+        # Clean up response to ensure it's just the classification
+        classification = classification.strip().lower()
+        
+        # Validate the result
+        valid_classifications = ["single", "clublist", "recommendation", "general"]
+        if classification not in valid_classifications:
+            # If response contains unexpected content, attempt to extract correct value
+            for valid in valid_classifications:
+                if valid in classification:
+                    return valid
+            # Default to "general" if we can't determine the classification
+            return "general"
+        
+        log_event("classifier", route="noid", question=user_question, label=classification)
+        return classification
+    except Exception as e:
+        print(f"Classification error with {provider} provider: {str(e)}")
+        # Default to general if there's an error
+        return "general"
+    
+
+def classify_catcher_all_clubs(user_question: str, provider: str = "gemini",prefix="", local_first: bool = True) -> str:
+    """
+    Classifies a user question 
+    as :
+            -Question about a single club
+            -Question about what clubs are there
+            -The Question is asking about club recommendation
+            -General question about the University (default if unsure)
+    
+    Args:
+        user_question: The question text to classify
+        provider: Which LLM provider to use - "openrouter" or "groq" (default: "openrouter")
+        
+    Returns:
+        str: Classification result ('yes', 'no', or  'continue')
+    """
+    try:
+        # Cheap local answer first; only uncertain questions reach the LLM
+        if local_first:
+            local = classify_locally("catcher", user_question)
+            if local:
+                return local
+
+        # Classification prompt. The static instructions are sent as a cacheable prefix (see prompt_cache.py);
+        # the history, the output format and the question follow it
+        context_text = f"{prefix}\n\n" + CLASSIFIER_OUTPUT_FORMAT.format(labels="yes, no, continue")
+        
+        # Choose provider based on parameter
+        if provider.lower() == "groq":
+            classification = query_groq_llm(user_question, context_text, GROQ_API_KEY, call_site="classify_catcher",
+                                            static_prefix=CATCHER_CLASSIFIER_PROMPT)
+        else:
+            classification = query_gemini_llm(user_question, context_text, GEMINI_API_KEY, call_site="classify_catcher",
+                                             static_prefix=CATCHER_CLASSIFIER_PROMPT)
         
         # Clean up response to ensure it's just the classification
         classification = classification.strip().lower()
@@ -306,6 +360,7 @@ def classify_catcher_all_clubs(user_question: str, provider: str = "gemini",pref
             # Default to "general" if we can't determine the classification
             return "continue"
         
+        log_event("classifier", route="catcher", question=user_question, label=classification)
         return classification
     except Exception as e:
         print(f"Classification error with {provider} provider: {str(e)}")
@@ -314,26 +369,27 @@ def classify_catcher_all_clubs(user_question: str, provider: str = "gemini",pref
     
 
 def classify_return_recommendation(history: str) -> bool:
-    RECOMMENDER_PROMPTS = [
-        "Could you tell me about your hobbies or interests so I can recommend clubs for you?"
-    ]
-    for line in history.splitlines():
-        for prompt in RECOMMENDER_PROMPTS:
-            if prompt in line.strip():
-                return True
-    return False
-
-def classify_return_all_clubs(history: str,user_question: str = "") -> str:
-    
-    if user_question:
-
-        classification = classify_catcher_all_clubs(
-            user_question, 
-            prefix=history
-        )
+    """
+    History fallback for sessions without dialogue state: True if the
+    assistant asked for the user's interests.
+    """
+    return any(INTERESTS_PROMPT in line.strip() for line in history.splitlines())
 
+def classify_return_all_clubs(history: str,user_question: str = ""):
+    """
+    History fallback for sessions without dialogue state.
 
-    return classification
+    Without a question, returns whether the assistant asked "Would you like
+    to see all available clubs?". With a question, returns 'yes', 'no' or
+    'continue'; the catcher classifier only runs when that prompt is present.
+    """
+    # Match the prompt with or without its question mark
+    pending = any(ALL_CLUBS_PROMPT.rstrip("?") in line.strip() for line in history.splitlines())
+    if not user_question:
+        return pending
+    if not pending:
+        return "continue"
+    return classify_catcher_all_clubs(user_question, prefix=history)
 
 
 def classify_edit(user_question: str, provider: str = "gemini", prefix: str = "") -> str:
@@ -373,9 +429,9 @@ def classify_edit(user_question: str, provider: str = "gemini", prefix: str = ""
         """
         # Call the chosen LLM
         if provider.lower() == "groq":
-            raw = query_groq_llm(prompt, "", GROQ_API_KEY)
+            raw = query_groq_llm(prompt, "", GROQ_API_KEY, call_site="classify_edit")
         else:
-            raw = query_gemini_llm(prompt, "", GEMINI_API_KEY)
+            raw = query_gemini_llm(prompt, "", GEMINI_API_KEY, call_site="classify_edit")
 
         
         # Normalize
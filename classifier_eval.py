@@ -0,0 +1,263 @@
+import os
+import sys
+import json
+import time
+import argparse
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+import classifier
+import protection
+from local_classifier import normalize
+from edit_parser import detect_edit_intent
+
+# Load environment variables
+load_dotenv()
+
+EVAL_DATASET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test", "data", "classifier_eval_v3.jsonl")
+EVAL_RECORDINGS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test", "data", "classifier_eval_v3.recorded.json")
+
+TASKS = ("question", "noid", "catcher", "edit", "safety")
+ROUTERS = ("llm", "local", "hybrid", "cached")
+
+# Modules whose LLM calls are intercepted for counting and replay
+LLM_MODULES = (classifier, protection)
+
+ABSTAIN = "<abstain>"
+
+
+def load_dataset(path=EVAL_DATASET_PATH, tasks=TASKS):
+    """Load the labelled evaluation set (one JSON object per line)."""
+    with open(path, "r", encoding="utf-8") as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    return [item for item in items if item["task"] in tasks]
+
+
+def _item_key(item):
+    return f"{item['task']}::{item['question']}::{item.get('history', '')}"
+
+
+class RecordedLLM:
+    """
+    Stand-in for query_gemini_llm/query_groq_llm that counts calls and replays
+    recorded raw responses keyed by the evaluation item.
+
+    Args:
+        recordings: Dict of item key -> raw LLM response.
+        live_fn: Real LLM function to call when a recording is missing (None = offline).
+        record: Store responses from live_fn into `recordings`.
+    """
+
+    def __init__(self, recordings=None, live_fn=None, record=False):
+        self.recordings = recordings if recordings is not None else {}
+        self.live_fn = live_fn
+        self.record = record
+        self.current_key = None
+        self.calls = 0
+        self.missing = 0
+
+    def __call__(self, user_question, context_text, api_key, *args, **kwargs):
+        self.calls += 1
+        if self.current_key in self.recordings and not self.record:
+            return self.recordings[self.current_key]
+        if self.live_fn is None:
+            self.missing += 1
+            raise KeyError(f"No recorded LLM response for '{self.current_key}'")
+        response = self.live_fn(user_question, context_text, api_key, *args, **kwargs)
+        if self.record:
+            self.recordings[self.current_key] = response
+        return response
+
+
+@contextmanager
+def intercept_llm(llm):
+    """Route the classifier and safety modules' LLM calls through `llm`."""
+    saved = [(m, m.query_gemini_llm, m.query_groq_llm) for m in LLM_MODULES]
+    try:
+        for m in LLM_MODULES:
+            m.query_gemini_llm = llm
+            m.query_groq_llm = llm
+        yield llm
+    finally:
+        for m, gemini, groq in saved:
+            m.query_gemini_llm = gemini
+            m.query_groq_llm = groq
+
+
+def _safety_label(verdict):
+    if verdict is None:
+        return ABSTAIN
+    return "safe" if verdict else "unsafe"
+
+
+def _predict(task, router, item):
+    """Run one item through a router. Returns the predicted label or ABSTAIN."""
+    question = item["question"]
+    history = item.get("history", "")
+
+    if task == "safety":
+        if router == "local":
+            return _safety_label(protection.local_safety_check(question))
+        if router == "llm":
+            return _safety_label(protection._llm_safety_check(question))
+        return _safety_label(protection.is_question_safe(question))
+
+    if task == "edit":
+        local = detect_edit_intent(question) if router != "llm" else None
+        if local or router == "local":
+            return local or ABSTAIN
+        return classifier.classify_edit(question, prefix=history).lower()
+
+    if router == "local":
+        return classifier.classify_locally(task, question) or ABSTAIN
+    fn = {
+        "question": classifier.classify_question,
+        "noid": classifier.classify_question_noid,
+        "catcher": classifier.classify_catcher_all_clubs,
+    }[task]
+    return fn(question, prefix=history, local_first=(router != "llm"))
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def evaluate(router, items, llm=None):
+    """
+    Evaluate one router over dataset items.
+
+    Args:
+        router: "llm", "local", "hybrid" or "cached" (hybrid plus a result cache
+            keyed by task, normalized question and history).
+        items: Items from load_dataset().
+        llm: RecordedLLM used for all LLM calls (default: offline replay of nothing).
+
+    Returns:
+        dict of task -> metrics (accuracy, coverage, confusion matrix, latency, LLM calls).
+        Items whose LLM call had no recording are counted under "missing" and left out
+        of every other metric, since the classifier only returned its fallback label.
+    """
+    llm = llm or RecordedLLM()
+    cache = {}
+    # Start every router from a cold safety-verdict cache so LLM call counts are comparable
+    protection._verdict_cache.clear()
+    results = {}
+    with intercept_llm(llm):
+        for item in items:
+            task = item["task"]
+            entry = results.setdefault(task, {
+                "n": 0, "correct": 0, "decided": 0, "llm_calls": 0, "missing": 0,
+                "latencies_ms": [], "confusion": {}, "errors": [], "missing_ids": [],
+            })
+            llm.current_key = _item_key(item)
+            calls_before = llm.calls
+            missing_before = llm.missing
+            start = time.perf_counter()
+
+            cache_key = (task, normalize(item["question"]), item.get("history", ""))
+            if router == "cached" and cache_key in cache:
+                predicted = cache[cache_key]
+            else:
+                predicted = _predict(task, "hybrid" if router == "cached" else router, item)
+                if llm.missing == missing_before:
+                    cache[cache_key] = predicted
+
+            if llm.missing > missing_before:
+                entry["missing"] += 1
+                entry["missing_ids"].append(item["id"])
+                continue
+            entry["latencies_ms"].append((time.perf_counter() - start) * 1000)
+            entry["llm_calls"] += llm.calls - calls_before
+            entry["n"] += 1
+            gold = item["label"].lower()
+            predicted = predicted.lower() if predicted != ABSTAIN else ABSTAIN
+            if predicted != ABSTAIN:
+                entry["decided"] += 1
+            if predicted == gold:
+                entry["correct"] += 1
+            else:
+                entry["errors"].append({"id": item["id"], "gold": gold, "predicted": predicted})
+            row = entry["confusion"].setdefault(gold, {})
+            row[predicted] = row.get(predicted, 0) + 1
+
+    report = {}
+    for task, entry in results.items():
+        latencies = entry.pop("latencies_ms")
+        scored = entry["n"] or 1
+        report[task] = {
+            **entry,
+            "accuracy": round(entry["correct"] / scored, 3),
+            "coverage": round(entry["decided"] / scored, 3),
+            "accuracy_when_decided": round(entry["correct"] / entry["decided"], 3) if entry["decided"] else 0.0,
+            "latency_ms": {
+                "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+                "p50": round(_percentile(latencies, 50), 3),
+                "p95": round(_percentile(latencies, 95), 3),
+            },
+        }
+    return report
+
+
+def load_recordings(path=EVAL_RECORDINGS_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_recordings(recordings, path=EVAL_RECORDINGS_PATH):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(recordings, f, indent=2, ensure_ascii=False, sort_keys=True)
+
+
+def print_report(router, report):
+    print(f"\n=== Router: {router} ===")
+    for task, m in report.items():
+        print(
+            f"{task:<9} n={m['n']:<3} missing={m['missing']:<3} acc={m['accuracy']:.3f} coverage={m['coverage']:.3f} "
+            f"acc|decided={m['accuracy_when_decided']:.3f} llm_calls={m['llm_calls']:<3} "
+            f"latency p50={m['latency_ms']['p50']:.2f}ms p95={m['latency_ms']['p95']:.2f}ms"
+        )
+        for gold, row in sorted(m["confusion"].items()):
+            print(f"    {gold:<15} -> {row}")
+
+
+# Run the benchmark: python classifier_eval.py --router local hybrid
+# Record fresh LLM responses (needs GEMINI_API_KEY): python classifier_eval.py --router llm --record
+if __name__ == "__main__":
+    from ai_init import query_gemini_llm
+
+    parser = argparse.ArgumentParser(description="Evaluate classifier routers on the labelled dataset.")
+    parser.add_argument("--router", nargs="+", default=list(ROUTERS), choices=ROUTERS)
+    parser.add_argument("--tasks", nargs="+", default=list(TASKS), choices=TASKS)
+    parser.add_argument("--dataset", default=EVAL_DATASET_PATH)
+    parser.add_argument("--recordings", default=EVAL_RECORDINGS_PATH)
+    parser.add_argument("--live", action="store_true", help="Call the real LLM when a recording is missing")
+    parser.add_argument("--record", action="store_true", help="Call the real LLM and overwrite recordings")
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    args = parser.parse_args()
+
+    items = load_dataset(args.dataset, args.tasks)
+    recordings = load_recordings(args.recordings)
+    full_report = {}
+    missing = 0
+    for router in args.router:
+        llm = RecordedLLM(recordings, live_fn=query_gemini_llm if (args.live or args.record) else None,
+                          record=args.record)
+        full_report[router] = evaluate(router, items, llm)
+        if llm.missing:
+            print(f"{router}: {llm.missing} LLM calls had no recording; those items are not scored")
+        missing += llm.missing
+        print_report(router, full_report[router])
+    if args.record:
+        save_recordings(recordings, args.recordings)
+        print(f"Saved {len(recordings)} recordings to {args.recordings}")
+    if args.json:
+        print(json.dumps(full_report, indent=2))
+    if missing:
+        # A partial replay is not a benchmark result; fail so it is never mistaken for one
+        print(f"Error: {missing} LLM calls had no recording in {args.recordings} (run with --live or --record)")
+        sys.exit(1)
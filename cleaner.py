@@ -1,4 +1,5 @@
 import json
+from structured_output import repair_json
 
 
 def parse_llm_json_response(raw_response):
@@ -46,17 +47,10 @@ def parse_llm_json_response(raw_response):
     try:
         return json.loads(cleaned_response)
     except json.JSONDecodeError as e:
-        # If it still fails, try to extract any JSON-like content using regex
-        import re
-        json_matches = re.findall(r'\{.*?\}', cleaned_response, re.DOTALL)
-        
-        if json_matches:
-            # Try each potential JSON match
-            for potential_json in json_matches:
-                try:
-                    return json.loads(potential_json)
-                except json.JSONDecodeError:
-                    continue
-                
-        # If all attempts fail, raise a ValueError with the original error
-        raise ValueError(f"Failed to parse LLM response as JSON: {str(e)}")
\ No newline at end of file
+        # If it still fails, recover the first JSON value (balanced, so nested values survive)
+        # and fix common mistakes such as trailing commas (a cut-off reply is rejected)
+        try:
+            return repair_json(cleaned_response)
+        except ValueError:
+            # If all attempts fail, raise a ValueError with the original error
+            raise ValueError(f"Failed to parse LLM response as JSON: {str(e)}")
@@ -0,0 +1,83 @@
+import os
+import threading
+from dotenv import load_dotenv
+from shared_cache import create_cache
+
+# Load environment variables
+load_dotenv()
+
+# Number of clubs whose rendered context is kept (least recently used is evicted)
+CLUB_CONTEXT_CACHE_SIZE = int(os.getenv("CLUB_CONTEXT_CACHE_SIZE", "256"))
+# Upper bound on how long a rendered context is trusted without an invalidation
+CLUB_CONTEXT_TTL_SECONDS = int(os.getenv("CLUB_CONTEXT_TTL_SECONDS", "600"))
+# Usernames change rarely; cache them for the personalization line
+USERNAME_CACHE_TTL_SECONDS = int(os.getenv("USERNAME_CACHE_TTL_SECONDS", "3600"))
+
+
+class ClubContextCache:
+    """
+    Rendered club context (details, FAQs, events) per club, keyed by a
+    content version.
+
+    Every club has a version number that invalidation hooks bump (club edits,
+    FAQ or event changes), so a stale rendering is never served after a
+    change; the TTL only guards against changes made outside this service
+    without a hook. Entries are also keyed by day because the events list is
+    "upcoming as of today". Versions live in the shared cache tier, so a
+    bump in one worker invalidates the club in every worker.
+    """
+
+    def __init__(self, maxsize=CLUB_CONTEXT_CACHE_SIZE, ttl=CLUB_CONTEXT_TTL_SECONDS):
+        self.cache = create_cache("club_context", maxsize=maxsize, ttl=ttl, version_key=lambda key: key[0])
+        self._lock = threading.Lock()
+        self.invalidations = 0
+
+    def version(self, club_id):
+        return self.cache.version(club_id)
+
+    def get(self, club_id, day):
+        """Return the cached entry for the club's current version, or None."""
+        return self.cache.get((club_id, day))
+
+    def set(self, club_id, day, entry, version):
+        """Store an entry rendered at `version`; dropped if the club changed meanwhile."""
+        self.cache.set((club_id, day), entry, version=version)
+
+    def invalidate(self, club_id=None):
+        """Bump the content version of one club, or drop every entry when club_id is None."""
+        with self._lock:
+            self.invalidations += 1
+        if club_id is None:
+            self.cache.clear()
+        else:
+            self.cache.bump(club_id)
+
+    def get_stats(self):
+        return {**self.cache.get_stats(), "invalidations": self.invalidations}
+
+
+# Shared caches
+club_context_cache = ClubContextCache()
+username_cache = create_cache("usernames", maxsize=4096, ttl=USERNAME_CACHE_TTL_SECONDS)
+
+
+def invalidate_club_context(club_id=None, kind="club"):
+    """
+    Invalidation hook for club, FAQ and event changes.
+
+    Args:
+        club_id: The changed club (None = every club).
+        kind: "club", "faqs" or "events"; club changes also drop the record
+            used for update diffs, event changes reset the event index.
+    """
+    club_context_cache.invalidate(club_id)
+    if kind == "club":
+        from club_updates import club_updates
+        club_updates.invalidate(club_id)
+    if kind == "events":
+        from event_index import event_index
+        event_index.invalidate(club_id)
+
+
+def get_club_context_stats():
+    return {"clubs": club_context_cache.get_stats(), "usernames": username_cache.get_stats()}
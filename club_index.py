@@ -0,0 +1,340 @@
+import os
+import glob
+import json
+import time
+import hashlib
+import threading
+import contextlib
+import numpy as np
+from dotenv import load_dotenv
+from embeddings import embed_texts, normalize_rows
+
+# Load environment variables
+load_dotenv()
+
+# Seconds between checks of the clubs table for catalog changes
+CLUB_INDEX_REFRESH_SECONDS = int(os.getenv("CLUB_INDEX_REFRESH_SECONDS", "300"))
+# Embedded club vectors are cached here, keyed by a hash of each club's text
+CLUB_INDEX_CACHE_PATH = os.getenv("CLUB_INDEX_CACHE_PATH", "cache/club_index.npz")
+# Read-only snapshot of the built index (matrix .npy + clubs .json). Every worker memory-maps
+# the same matrix file, so N gunicorn workers share one copy of it in the page cache.
+CLUB_INDEX_SNAPSHOT_DIR = os.getenv("CLUB_INDEX_SNAPSHOT_DIR", "cache/club_index")
+
+
+def club_text(club):
+    """Text embedded for a club: name, category and description."""
+    return (
+        f"{club.get('name') or ''}. Category: {club.get('category') or 'Uncategorized'}. "
+        f"{club.get('description') or ''}"
+    ).strip()
+
+
+def _text_digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _load_clubs():
+    from supabase_client import get_all_clubs
+    return get_all_clubs(formatted=False)
+
+
+class ClubVectorIndex:
+    """
+    In-memory embedding matrix of the club catalog for recommendation.
+
+    Each club's name, category and description are embedded once and kept as
+    one row of a unit-normalized float32 matrix, so ranking a query is a single
+    matrix-vector product. Vectors are cached per club text (in memory and in
+    an .npz file), so a catalog refresh only embeds clubs whose text changed.
+
+    With a snapshot directory, the built matrix is also written to disk and
+    memory-mapped read-only. Workers whose catalog matches the snapshot map
+    it instead of embedding and stacking their own copy, and concurrent
+    builds in several workers are serialized by a file lock, so only the
+    first one embeds.
+    """
+
+    def __init__(self, load_clubs=_load_clubs, embed_fn=embed_texts,
+                 refresh_seconds=CLUB_INDEX_REFRESH_SECONDS, cache_path=CLUB_INDEX_CACHE_PATH,
+                 snapshot_dir=CLUB_INDEX_SNAPSHOT_DIR):
+        self.load_clubs = load_clubs
+        self.embed_fn = embed_fn
+        self.refresh_seconds = refresh_seconds
+        self.cache_path = cache_path
+        self.snapshot_dir = snapshot_dir
+        self._lock = threading.Lock()
+        self._vectors_by_digest = None
+        self.clubs = []
+        self.categories = np.array([], dtype=object)
+        # category (lower case) -> row indices of its clubs, and the category's mean vector
+        self.by_category = {}
+        self.category_centroids = {}
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.catalog_digest = None
+        self.built_at = 0.0
+        self.stats = {"builds": 0, "embedded": 0, "queries": 0, "snapshot_loads": 0}
+        # Callables run (with the index) after every rebuild that changed the catalog
+        self.listeners = []
+
+    def _load_vector_cache(self):
+        self._vectors_by_digest = {}
+        if self.cache_path and os.path.exists(self.cache_path):
+            try:
+                cached = np.load(self.cache_path, allow_pickle=False)
+                self._vectors_by_digest = dict(zip(cached["digests"].tolist(), cached["vectors"]))
+            except Exception as e:
+                print(f"Ignoring unreadable club index cache '{self.cache_path}': {e}")
+
+    def _save_vector_cache(self, digests):
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            np.savez(self.cache_path, digests=np.array(digests), vectors=self.matrix)
+        except OSError as e:
+            print(f"Could not write club index cache '{self.cache_path}': {e}")
+
+    def _snapshot_meta_path(self):
+        return os.path.join(self.snapshot_dir, "index.json")
+
+    @contextlib.contextmanager
+    def _snapshot_lock(self):
+        """Serialize index builds across worker processes (no-op without fcntl or a snapshot dir)."""
+        try:
+            import fcntl
+        except ImportError:
+            fcntl = None
+        if not self.snapshot_dir or fcntl is None:
+            yield
+            return
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        with open(os.path.join(self.snapshot_dir, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_snapshot(self, catalog_digest=None):
+        """Return (clubs, memory-mapped matrix, digest) from disk, or None if absent or stale."""
+        if not self.snapshot_dir or not os.path.exists(self._snapshot_meta_path()):
+            return None
+        try:
+            with open(self._snapshot_meta_path(), encoding="utf-8") as f:
+                meta = json.load(f)
+            if catalog_digest is not None and meta["catalog_digest"] != catalog_digest:
+                return None
+            matrix = np.load(os.path.join(self.snapshot_dir, meta["matrix"]), mmap_mode="r", allow_pickle=False)
+            if matrix.shape[0] != len(meta["clubs"]):
+                return None
+            return meta["clubs"], matrix, meta["catalog_digest"]
+        except Exception as e:
+            print(f"Ignoring unreadable club index snapshot '{self.snapshot_dir}': {e}")
+            return None
+
+    def _write_snapshot(self, clubs, catalog_digest):
+        """Write the matrix and clubs atomically; returns the memory-mapped matrix (or None)."""
+        if not self.snapshot_dir or not clubs:
+            return None
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            name = f"matrix-{catalog_digest[:16]}.npy"
+            path = os.path.join(self.snapshot_dir, name)
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, np.ascontiguousarray(self.matrix, dtype=np.float32))
+            os.replace(path + ".tmp", path)
+            meta_path = self._snapshot_meta_path()
+            with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"catalog_digest": catalog_digest, "matrix": name, "clubs": clubs}, f, default=str)
+            os.replace(meta_path + ".tmp", meta_path)
+            # Older matrices stay readable for workers still mapping them until they remap
+            for old in glob.glob(os.path.join(self.snapshot_dir, "matrix-*.npy")):
+                if old != path:
+                    try:
+                        os.remove(old)
+                    except OSError:
+                        pass
+            return np.load(path, mmap_mode="r", allow_pickle=False)
+        except OSError as e:
+            print(f"Could not write club index snapshot '{self.snapshot_dir}': {e}")
+            return None
+
+    def _install(self, clubs, matrix, catalog_digest):
+        """Swap in a built catalog and derive the category lookups (caller holds the lock)."""
+        self.clubs = clubs
+        self.categories = np.array([(club.get("category") or "").strip().lower() for club in clubs], dtype=object)
+        self.matrix = matrix
+        self.by_category = {}
+        for row, category in enumerate(self.categories):
+            self.by_category.setdefault(category, []).append(row)
+        self.by_category = {c: np.array(rows) for c, rows in self.by_category.items()}
+        self.category_centroids = {
+            c: normalize_rows(np.asarray(self.matrix[rows]).mean(axis=0)) for c, rows in self.by_category.items()
+        }
+        self.catalog_digest = catalog_digest
+
+    def load_snapshot(self):
+        """
+        Map the on-disk snapshot without touching the database or the embeddings API.
+
+        Called in the gunicorn parent before workers fork (see gunicorn.conf.py),
+        so workers start with a ready index; their first refresh only re-checks
+        the catalog.
+
+        Returns:
+            bool: True if a snapshot was loaded.
+        """
+        snapshot = self._read_snapshot()
+        if snapshot is None:
+            return False
+        clubs, matrix, catalog_digest = snapshot
+        with self._lock:
+            self._install(clubs, matrix, catalog_digest)
+            self.built_at = time.time()
+            self.stats["snapshot_loads"] += 1
+        print(f"Club index snapshot loaded: {len(clubs)} clubs")
+        return True
+
+    def build(self, clubs=None):
+        """
+        (Re)build the index from the given clubs, or from the clubs table.
+
+        Returns:
+            bool: True if the catalog changed and the matrix was rebuilt.
+        """
+        clubs = list(clubs if clubs is not None else self.load_clubs() or [])
+        texts = [club_text(club) for club in clubs]
+        digests = [_text_digest(text) for text in texts]
+        catalog_digest = _text_digest("\n".join(digests))
+
+        missing = []
+        with self._lock, self._snapshot_lock():
+            self.built_at = time.time()
+            if catalog_digest == self.catalog_digest:
+                return False
+            # Another worker may already have built this catalog
+            snapshot = self._read_snapshot(catalog_digest)
+            if snapshot is not None:
+                self._install(*snapshot)
+                # Re-read the on-disk vector cache (written by that worker) on the next rebuild
+                self._vectors_by_digest = None
+                self.stats["snapshot_loads"] += 1
+            else:
+                if self._vectors_by_digest is None:
+                    self._load_vector_cache()
+
+                missing = [i for i, d in enumerate(digests) if d not in self._vectors_by_digest]
+                if missing:
+                    vectors = normalize_rows(self.embed_fn([texts[i] for i in missing]))
+                    for i, vector in zip(missing, vectors):
+                        self._vectors_by_digest[digests[i]] = vector
+                    self.stats["embedded"] += len(missing)
+
+                # Keep only vectors for the current catalog
+                self._vectors_by_digest = {d: self._vectors_by_digest[d] for d in digests}
+                matrix = (
+                    np.stack([self._vectors_by_digest[d] for d in digests]).astype(np.float32)
+                    if clubs else np.zeros((0, 0), dtype=np.float32)
+                )
+                self._install(clubs, matrix, catalog_digest)
+                if missing:
+                    self._save_vector_cache(digests)
+                mapped = self._write_snapshot(clubs, catalog_digest)
+                if mapped is not None:
+                    self.matrix = mapped
+            self.stats["builds"] += 1
+        print(f"Club index built: {len(clubs)} clubs, {len(missing)} embedded")
+        for listener in self.listeners:
+            try:
+                listener(self)
+            except Exception as e:
+                print(f"Club index listener error: {e}")
+        return True
+
+    def ensure_fresh(self):
+        """Build on first use and re-check the catalog every `refresh_seconds`."""
+        if self.catalog_digest is None or time.time() - self.built_at > self.refresh_seconds:
+            self.build()
+
+    def invalidate(self):
+        """Force a catalog re-check on the next query (call after editing clubs)."""
+        self.built_at = 0.0
+
+    def rank(self, query_embedding, categories=None, top_k=5, min_score=None):
+        """
+        Rank clubs by cosine similarity to a query embedding.
+
+        Args:
+            query_embedding: 1-D embedding of the user's interests.
+            categories: Only score clubs in these categories (case-insensitive).
+            top_k: Maximum number of results.
+            min_score: Drop results scoring below this similarity.
+
+        Returns:
+            List of {"club": row, "score": float}, best first.
+        """
+        self.ensure_fresh()
+        with self._lock:
+            clubs, matrix, by_category = self.clubs, self.matrix, self.by_category
+            self.stats["queries"] += 1
+        if not clubs:
+            return []
+
+        if categories:
+            rows = self._category_rows(by_category, categories)
+            if rows.size == 0:
+                return []
+            scores = matrix[rows] @ normalize_rows(query_embedding)
+        else:
+            rows = np.arange(len(clubs))
+            # Score the (possibly shared, memory-mapped) matrix in place instead of copying it
+            scores = matrix @ normalize_rows(query_embedding)
+        k = min(top_k, rows.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = [{"club": clubs[rows[i]], "score": round(float(scores[i]), 4)} for i in top]
+        if min_score is not None:
+            results = [r for r in results if r["score"] >= min_score]
+        return results
+
+    @staticmethod
+    def _category_rows(by_category, categories):
+        wanted = {c.strip().lower() for c in categories}
+        parts = [by_category[c] for c in wanted if c in by_category]
+        return np.unique(np.concatenate(parts)) if parts else np.array([], dtype=int)
+
+    def clubs_in_categories(self, categories):
+        """Inverted-index lookup: all clubs in any of the given categories."""
+        self.ensure_fresh()
+        with self._lock:
+            return [self.clubs[i] for i in self._category_rows(self.by_category, categories)]
+
+    def rank_categories(self, categories, top_k=5):
+        """
+        Rank the clubs of the given categories without a query embedding:
+        clubs closest to the categories' mean vector (the most typical) come first.
+        """
+        self.ensure_fresh()
+        with self._lock:
+            centroids = [self.category_centroids[c.strip().lower()] for c in categories
+                         if c.strip().lower() in self.category_centroids]
+        if not centroids:
+            return []
+        return self.rank(np.mean(centroids, axis=0), categories=categories, top_k=top_k)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                **self.stats,
+                "clubs": len(self.clubs),
+                "shared_matrix": isinstance(self.matrix, np.memmap),
+                "age_seconds": round(time.time() - self.built_at, 1) if self.built_at else None,
+            }
+
+
+# Shared index
+club_index = ClubVectorIndex()
+
+
+def get_club_index_stats():
+    return club_index.get_stats()
@@ -0,0 +1,254 @@
+import os
+import threading
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from shared_cache import create_cache
+from edit_parser import EDITABLE_FIELDS
+
+# Load environment variables
+load_dotenv()
+
+# Column used as the optimistic-concurrency precondition: a timestamp ("updated_at") or an
+# integer counter ("version"). Set CLUB_VERSION_COLUMN= (empty) for tables without one.
+CLUB_VERSION_COLUMN = os.getenv("CLUB_VERSION_COLUMN", "updated_at") or None
+# How long a club record read for diffing is trusted (commits and invalidations refresh it)
+CLUB_RECORD_TTL_SECONDS = int(os.getenv("CLUB_RECORD_TTL_SECONDS", "600"))
+# Database function applying several clubs' changes in one request (see readme)
+CLUB_BULK_UPDATE_RPC = "apply_club_updates"
+
+# Key under which an edit session keeps the club version it started from
+BASE_KEY = "_base"
+
+
+def pending_fields(updates):
+    """The field updates of an edit session, without bookkeeping keys such as BASE_KEY."""
+    return {k: v for k, v in (updates or {}).items() if not k.startswith("_")}
+
+
+def _is_missing_column(error):
+    """True only for PostgreSQL's "undefined column" error (42703), not for timeouts or outages."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return False
+    try:
+        # PostgREST reports database errors as a JSON payload with the SQLSTATE code
+        return response.json().get("code") == "42703"
+    except ValueError:
+        return False
+
+
+def _same(a, b):
+    return (str(a).strip() if a is not None else None) == (str(b).strip() if b is not None else None)
+
+
+class ClubUpdateEngine:
+    """
+    Diff-only club updates with an optimistic version check.
+
+    Pending updates are compared against the cached current record and only
+    changed columns are sent. The write is conditional on the version the
+    edit started from, so a manager never silently overwrites another
+    manager's commit: the conflict is reported with the current values
+    instead. Committed clubs are invalidated in the club context cache and
+    the recommendation index.
+    """
+
+    def __init__(self, pool=None, version_column=CLUB_VERSION_COLUMN, ttl=CLUB_RECORD_TTL_SECONDS):
+        self._pool = pool
+        self.version_column = version_column
+        self.records = create_cache("club_records", maxsize=1024, ttl=ttl, read_through=True)
+        self._lock = threading.Lock()
+        self.stats = {
+            "commits": 0, "unchanged": 0, "conflicts": 0, "errors": 0, "batches": 0,
+            "columns_sent": 0, "columns_skipped": 0,
+        }
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            from supabase_pool import pool
+            self._pool = pool
+        return self._pool
+
+    def _columns(self):
+        return ",".join(["id"] + EDITABLE_FIELDS + ([self.version_column] if self.version_column else []))
+
+    def current(self, club_id, refresh=False):
+        """Return the club's current record (cached), or None if it does not exist."""
+        record = None if refresh else self.records.get(club_id)
+        if record is None:
+            try:
+                rows = self.pool.request_sync("GET", "clubs", params={
+                    "select": self._columns(), "id": f"eq.{club_id}", "limit": 1
+                })
+            except Exception as e:
+                if not self.version_column or not _is_missing_column(e):
+                    # Transient failures must not disable the version check for the whole process
+                    raise
+                # The table has no version column yet; continue without the precondition
+                print(f"Club version column '{self.version_column}' unavailable, updates are unconditional: {e}")
+                self.version_column = None
+                return self.current(club_id, refresh=True)
+            record = rows[0] if rows else None
+            if record is not None:
+                self.records.set(club_id, record)
+        return record
+
+    def snapshot(self, club_id):
+        """Version token to remember when an edit session starts (None without a version column)."""
+        record = self.current(club_id)
+        return record.get(self.version_column) if record and self.version_column else None
+
+    def diff(self, club_id, updates, record=None):
+        """Return only the editable fields whose value differs from the current record."""
+        record = record if record is not None else (self.current(club_id) or {})
+        return {k: v for k, v in pending_fields(updates).items()
+                if k in EDITABLE_FIELDS and not _same(record.get(k), v)}
+
+    def _next_version(self, record):
+        if self.version_column == "updated_at":
+            return datetime.now(timezone.utc).isoformat()
+        return (record.get(self.version_column) or 0) + 1
+
+    def _result(self, club_id, status, fields=(), record=None, conflicts=None):
+        version = record.get(self.version_column) if record and self.version_column else None
+        return {"club_id": club_id, "status": status, "fields": list(fields), "version": version,
+                "conflicts": conflicts or {}}
+
+    def _count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self.stats[name] += amount
+
+    def _conflict(self, club_id, changed):
+        """Refresh the record after a failed precondition and report the fields' current values."""
+        record = self.current(club_id, refresh=True)
+        if record is None:
+            self._count(errors=1)
+            return self._result(club_id, "error", changed)
+        self._count(conflicts=1)
+        return self._result(club_id, "conflict", changed, record,
+                            conflicts={k: record.get(k) for k in changed})
+
+    def commit(self, club_id, updates, base=None):
+        """
+        Write the changed fields of `updates`, conditional on `base`.
+
+        Args:
+            club_id: The club to update.
+            updates: Pending field -> value updates (bookkeeping keys are ignored).
+            base: Version the edit started from (default: the cached record's version).
+
+        Returns:
+            dict with "status" ("applied", "unchanged", "conflict" or "error"),
+            the changed "fields", the club's new "version" and, for a conflict,
+            the current values of the conflicting fields.
+        """
+        try:
+            record = self.current(club_id)
+            if record is None:
+                self._count(errors=1)
+                return self._result(club_id, "error", pending_fields(updates))
+            changed = self.diff(club_id, updates, record)
+            self._count(columns_skipped=len(pending_fields(updates)) - len(changed))
+            if not changed:
+                self._count(unchanged=1)
+                return self._result(club_id, "unchanged", record=record)
+            if self.version_column:
+                base = base if base is not None else record.get(self.version_column)
+                if not _same(base, record.get(self.version_column)):
+                    # Someone committed since this edit started (seen by our own cache)
+                    return self._conflict(club_id, list(changed))
+
+            payload = dict(changed)
+            params = {"id": f"eq.{club_id}"}
+            if self.version_column:
+                payload[self.version_column] = self._next_version(record)
+                params[self.version_column] = f"eq.{base}"
+            # Not retried: if a lost reply had applied the update, the retry would report a conflict
+            rows = self.pool.request_sync("PATCH", "clubs", params=params, json=payload,
+                                          prefer="return=representation")
+            if not rows:
+                return self._conflict(club_id, list(changed))
+            self._count(commits=1, columns_sent=len(changed))
+            self.on_commit(club_id)
+            self.records.set(club_id, {**record, **rows[0]})
+            return self._result(club_id, "applied", changed, {**record, **rows[0]})
+        except Exception as e:
+            print(f"Error updating club with ID {club_id}: {e}")
+            self._count(errors=1)
+            return self._result(club_id, "error", pending_fields(updates))
+
+    def commit_many(self, changes):
+        """
+        Apply several clubs' updates in one request (admin bulk edits).
+
+        Args:
+            changes: List of (club_id, updates, base) tuples; base may be None.
+
+        Returns:
+            List of commit results, one per change, in input order. Two changes
+            to the same club are applied in order, so the second one conflicts
+            if it was based on the version the first one replaced. Without the
+            bulk database function, clubs are committed one by one.
+        """
+        results, batch = [None] * len(changes), []
+        for i, (club_id, updates, base) in enumerate(changes):
+            record = self.current(club_id)
+            if record is None:
+                results[i] = self._result(club_id, "error", pending_fields(updates))
+                continue
+            changed = self.diff(club_id, updates, record)
+            self._count(columns_skipped=len(pending_fields(updates)) - len(changed))
+            if not changed:
+                self._count(unchanged=1)
+                results[i] = self._result(club_id, "unchanged", record=record)
+                continue
+            if base is None and self.version_column:
+                base = record.get(self.version_column)
+            batch.append((i, club_id, changed, base))
+        if batch:
+            try:
+                rows = self.pool.request_sync("POST", f"rpc/{CLUB_BULK_UPDATE_RPC}", json={"changes": [
+                    {"id": str(club_id), "fields": changed, "base": base} for _, club_id, changed, base in batch
+                ]}) or []
+            except Exception as e:
+                print(f"Bulk club update unavailable, committing one by one: {e}")
+                for i, club_id, changed, base in batch:
+                    results[i] = self.commit(club_id, changed, base)
+            else:
+                self._count(batches=1)
+                # The function returns one row per change, in the order the changes were sent
+                for (i, club_id, changed, base), row in zip(batch, rows + [{}] * (len(batch) - len(rows))):
+                    if not row.get("applied") or str(row.get("club_id")) != str(club_id):
+                        results[i] = self._conflict(club_id, list(changed))
+                        continue
+                    self._count(commits=1, columns_sent=len(changed))
+                    self.on_commit(club_id)
+                    results[i] = self._result(club_id, "applied", changed, {self.version_column: row.get("version")})
+        return results
+
+    def on_commit(self, club_id):
+        """Drop everything derived from the club's old values (including its cached record)."""
+        from club_context import invalidate_club_context
+        from club_index import club_index
+        invalidate_club_context(club_id)
+        club_index.invalidate()
+
+    def invalidate(self, club_id=None):
+        if club_id is None:
+            self.records.clear()
+        else:
+            self.records.delete(club_id)
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "version_column": self.version_column, "records": self.records.get_stats()}
+
+
+# Shared engine used by the manager edit flow
+club_updates = ClubUpdateEngine()
+
+
+def get_club_update_stats():
+    return club_updates.get_stats()
@@ -1,10 +1,59 @@
-from supabase_client import save_state, clear_state, edit_clubs_by_id, load_state
-from ai_init import query_gemini_llm
-from cleaner import parse_llm_json_response
+from state_store import state_store
+from ai_init import query_gemini_json
 from classifier import classify_edit
 from faq_formatter import history_parser
+from club_updates import club_updates, pending_fields, BASE_KEY
+from edit_parser import parse_edit_command, detect_edit_intent, record, EDITABLE_FIELDS
 
-def handle_club_edit(question, state, gemini_api_key):
+# Response schema for LLM field extraction: any subset of the editable fields, as strings
+EDIT_UPDATES_SCHEMA = {
+    "type": "object",
+    "properties": {field: {"type": "string"} for field in EDITABLE_FIELDS},
+}
+
+def _snapshot(club_id):
+    try:
+        return club_updates.snapshot(club_id)
+    except Exception as e:
+        print(f"Error reading club {club_id} before editing: {e}")
+        return None
+
+def describe_updates(updates):
+    """Echo pending field values back to the manager ("name: Chess Society; location: Room 3")."""
+    return "; ".join(f"{field}: {value}" for field, value in pending_fields(updates).items())
+
+def commit_club_edit(question, club_id, updates, note=""):
+    """
+    Commit an edit session's changed fields and build the reply.
+
+    On a conflict with another manager's commit the session stays open,
+    rebased onto the latest version, so saying "done" again applies the
+    changes knowingly.
+    """
+    result = club_updates.commit(club_id, updates, base=updates.get(BASE_KEY))
+    if result["status"] == "conflict":
+        state_store.save(
+            question.session_id,
+            question.user_id,
+            action="editing",
+            club_id=club_id,
+            updates={**pending_fields(updates), BASE_KEY: result["version"]}
+        )
+        current = "; ".join(f"{field}: {value}" for field, value in result["conflicts"].items())
+        return {
+            "answer": (
+                f"Heads up—someone else updated this club while you were editing (now {current}). "
+                "Say 'done' again to apply your changes on top, or change them first."
+            )
+        }
+    state_store.clear(question.session_id, question.user_id)
+    if result["status"] == "applied":
+        return {"answer": f"All set! Updated fields: {', '.join(result['fields'])}.{note}"}
+    if result["status"] == "unchanged":
+        return {"answer": "Nothing to save—those values are already up to date."}
+    return {"answer": "Oops—couldn't save your updates. Please try again"}
+
+def handle_club_edit(question, state, gemini_api_key, history=None):
     """
     Handle club editing functionality for club managers.
     
@@ -12,26 +61,45 @@ def handle_club_edit(question, state, gemini_api_key):
         question: The Question object containing user input and metadata
         state: The current state from the database for this session/user
         gemini_api_key: API key for Gemini LLM
+        history: Chat history already loaded by the caller ("" when the question
+            needs none); fetched here when omitted
         
     Returns:
         dict: Response with answer and any other required fields
         None: If the input doesn't match an editing operation
     """
-    # Get chat history for context
-    history = history_parser(question.user_id, question.session_id, limit=3)
-    
-    # Check if starting a new edit flow
-    intent = classify_edit(question.user_question, prefix=history)
-    
+    editing = bool(state) and state.get("action") == "editing"
+
+    # Check if starting a new edit flow; the local parser decides common phrasings,
+    # history and the LLM are only needed for ambiguous messages
+    if not editing:
+        intent = detect_edit_intent(question.user_question)
+        record("intent", question.user_question, intent is not None, intent)
+        if intent is None:
+            if history is None:
+                history = history_parser(question.user_id, question.session_id, limit=3)
+            intent = classify_edit(question.user_question, prefix=history)
+
     # Start new editing session
-    if intent == "edit" and (not state or state.get("action") != "editing"):
-        save_state(
+    if not editing and intent == "edit":
+        # "Change the name to X" starts the session with its update already collected
+        updates = parse_edit_command(question.user_question)
+        # Remember the version the edit starts from for the commit's conflict check
+        base = _snapshot(question.club_id)
+        state_store.save(
             question.session_id,
             question.user_id,
             action="editing",
             club_id=question.club_id,
-            updates={}
+            updates={**updates, BASE_KEY: base} if base is not None else updates
         )
+        if updates:
+            return {
+                "answer": (
+                    f"Got it. I'll update {describe_updates(updates)}. "
+                    "Anything else? Say 'done' when you're finished."
+                )
+            }
         return {
             "answer": (
                 "Sure—what would you like to change? "
@@ -40,45 +108,42 @@ def handle_club_edit(question, state, gemini_api_key):
         }
 
     # Handle in-progress editing
-    if state and state.get("action") == "editing":
+    if editing:
         existing = state.get("updates", {}) or {}
+        new_updates = parse_edit_command(question.user_question)
 
-        # Handle completion
-        if "done" in question.user_question.lower():
-            result = edit_clubs_by_id(state["club_id"], **existing)
-            clear_state(question.session_id, question.user_id)
-            if result and result.data:
-                fields = ", ".join(existing.keys())
-                return {"answer": f"All set! Updated fields: {fields}. Please refresh your page to see the changes."}
-            else:
-                return {"answer": "Oops—couldn't save your updates. Please try again"}
-
-        # Extract new updates from user input
-        prompt = f"""
-        We are updating club ID {state['club_id']}. Current pending updates:
-        {existing}
-
-        Manager says:
-        \"\"\"
-        {question.user_question}
-        \"\"\"
-
-        Extract any of these fields (if mentioned): 
-        name, description, category, location, meeting_time, website_url, leader_name, leader_contact.
-        Return a pure JSON object of only the newly specified field:value pairs.
-        """
-        raw = query_gemini_llm(prompt, "", gemini_api_key)
-        print(f"Raw LLM response: {raw}")
-        
-        try:
-            new_updates = parse_llm_json_response(raw)
-        except ValueError:
-            return {
-                "answer": (
-                    "Sorry, I couldn’t parse your update. "
-                    "Please mention something like “set the description to …” or “update the leader_contact.”"
-                )
-            }
+        # Handle completion ("set the description to Get things done" is an update, not completion)
+        if not new_updates and "done" in question.user_question.lower():
+            return commit_club_edit(question, state["club_id"], existing,
+                                    " Please refresh your page to see the changes.")
+
+        # Extract new updates from user input; the LLM only sees messages the parser could not read
+        record("extract", question.user_question, bool(new_updates), new_updates or None)
+        if not new_updates:
+            prompt = f"""
+            We are updating club ID {state['club_id']}. Current pending updates:
+            {pending_fields(existing)}
+
+            Manager says:
+            \"\"\"
+            {question.user_question}
+            \"\"\"
+
+            Extract any of these fields (if mentioned): 
+            name, description, category, location, meeting_time, website_url, leader_name, leader_contact.
+            Return a pure JSON object of only the newly specified field:value pairs.
+            """
+            try:
+                new_updates = query_gemini_json(prompt, "", gemini_api_key, EDIT_UPDATES_SCHEMA, call_site="edit_extract")
+                new_updates = {field: value for field, value in new_updates.items() if str(value).strip()}
+            except ValueError as e:
+                print(f"Edit extraction failed: {e}")
+                return {
+                    "answer": (
+                        "Sorry, I couldn’t parse your update. "
+                        "Please mention something like “set the description to …” or “update the leader_contact.”"
+                    )
+                }
 
         if not new_updates:
             return {
@@ -91,7 +156,7 @@ def handle_club_edit(question, state, gemini_api_key):
 
         # Merge and save updates
         merged = {**existing, **new_updates}
-        save_state(
+        state_store.save(
             question.session_id,
             question.user_id,
             action="editing",
@@ -100,19 +165,12 @@ def handle_club_edit(question, state, gemini_api_key):
         )
 
         # Auto-save if all fields are filled or continue collecting updates
-        if len(merged) == 7:
-            result = edit_clubs_by_id(state["club_id"], **merged)
-            clear_state(question.session_id, question.user_id)
-            if result and result.data:
-                fields = ", ".join(merged.keys())
-                return {"answer": f"All set! Updated fields: {fields}."}
-            else:
-                return {"answer": "Oops—couldn't save your updates. Please try again."}
+        if len(pending_fields(merged)) == 7:
+            return commit_club_edit(question, state["club_id"], merged)
         else:
-            fields = ", ".join(merged.keys())
             return {
                 "answer": (
-                    f"Got it. I'll update: {fields}. "
+                    f"Got it. I'll update {describe_updates(merged)}. "
                     "Anything else? Say 'done' when you're finished."
                 )
             }
@@ -0,0 +1,67 @@
+import re
+from state_store import state_store
+
+# Follow-up prompts the assistant can leave outstanding for a guest
+AWAITING_INTERESTS = "awaiting_interests"
+AWAITING_ALL_CLUBS = "awaiting_all_clubs"
+PENDING_PROMPTS = (AWAITING_INTERESTS, AWAITING_ALL_CLUBS)
+
+# The assistant's wording for each prompt
+INTERESTS_PROMPT = "Could you tell me about your hobbies or interests so I can recommend clubs for you?"
+ALL_CLUBS_PROMPT = "Would you like to see all available clubs?"
+
+# First words that mark a reply as a new question rather than an answer
+QUESTION_STARTERS = {
+    "what", "when", "where", "who", "whom", "which", "why", "how",
+    "is", "are", "can", "could", "do", "does", "did", "will", "would", "should", "may",
+}
+
+
+def state_user_id(user_id):
+    # Guests send user_id "none"; chat_state.user_id is a uuid column, so store them as NULL
+    return None if user_id == "none" else user_id
+
+
+def is_interests_answer(reply):
+    """
+    True if `reply` reads as an answer to INTERESTS_PROMPT.
+
+    A reply that asks something new ("when is the chess club meeting?") is
+    left to the normal pipeline instead of being fed to the recommender.
+    """
+    words = re.findall(r"[a-z']+", reply.lower())
+    if not words:
+        return False
+    return not (reply.strip().endswith("?") or words[0] in QUESTION_STARTERS)
+
+
+def get_pending_prompt(session_id, user_id):
+    """
+    Return which follow-up prompt (if any) is waiting for this session's answer.
+
+    The value is kept in the same cached chat state as club edits, so
+    checking it costs no database round trip when nothing is pending.
+
+    Returns:
+        AWAITING_INTERESTS, AWAITING_ALL_CLUBS or None.
+    """
+    state = state_store.load(session_id, state_user_id(user_id))
+    action = state.get("action") if state else None
+    return action if action in PENDING_PROMPTS else None
+
+
+def set_pending_prompt(session_id, user_id, prompt):
+    """Record that the assistant just asked `prompt` and expects an answer next turn."""
+    user_id = state_user_id(user_id)
+    state = state_store.load(session_id, user_id)
+    # Never overwrite an in-progress club edit
+    if state and state.get("action") not in PENDING_PROMPTS:
+        return
+    state_store.save(session_id, user_id, action=prompt, club_id=None, updates={})
+
+
+def clear_pending_prompt(session_id, user_id):
+    """Mark the outstanding prompt as answered."""
+    if get_pending_prompt(session_id, user_id):
+        state_store.clear(session_id, state_user_id(user_id))
+
@@ -0,0 +1,174 @@
+import re
+import argparse
+import threading
+from local_classifier import normalize
+from traffic_log import log_event, read_events
+
+# Editable club fields and the ways managers refer to them (longest alias wins)
+FIELD_ALIASES = {
+    "name": ["name", "club name", "title"],
+    "description": ["description", "desc", "bio", "summary", "about section"],
+    "category": ["category", "club category", "type"],
+    "location": ["location", "venue", "place", "meeting place", "meeting location", "room", "address"],
+    "meeting_time": ["meeting_time", "meeting time", "meeting times", "meeting schedule", "meeting day",
+                     "meeting days", "schedule", "time"],
+    "website_url": ["website_url", "website url", "website", "web site", "site", "url", "link", "homepage",
+                    "webpage", "web page"],
+    "leader_name": ["leader_name", "leader name", "leader", "club leader", "president", "leader's name"],
+    "leader_contact": ["leader_contact", "leader contact", "leader's contact", "leader email", "leader's email",
+                       "contact", "contact email", "contact info", "email", "phone", "phone number"],
+}
+EDITABLE_FIELDS = list(FIELD_ALIASES)
+ALIAS_TO_FIELD = {alias: field for field, aliases in FIELD_ALIASES.items() for alias in aliases}
+
+_FIELD = "|".join(re.escape(a) for a in sorted(ALIAS_TO_FIELD, key=len, reverse=True))
+_VERB = r"(?:please\s+)?(?:(?:can|could|would)\s+you\s+)?(?:change|set|update|make|modify|edit|replace|switch)"
+_OWNER = r"(?:(?:the|our|my)\s+)?(?:club(?:'s|s)?\s+)?"
+
+# "change the name to X", "set location: Y", "update meeting_time to Tuesdays at 5pm", "leader = Ann"
+ASSIGNMENT = re.compile(
+    rf"^(?P<verb>{_VERB}\s+)?{_OWNER}(?P<field>{_FIELD})\s*(?P<sep>to\b|:|=|->|\bshould be\b|\bis\b|\bas\b)\s*(?P<value>.+)$",
+    re.IGNORECASE | re.DOTALL,
+)
+# "rename the club to X"
+RENAME = re.compile(r"^(?:please\s+)?rename\s+(?:(?:the|our|my)\s+club|it|us)?\s*(?:to|as)\s+(?P<value>.+)$",
+                    re.IGNORECASE | re.DOTALL)
+# Separators that make an assignment explicit without an edit verb ("location: Gym")
+EXPLICIT_SEPS = (":", "=", "->")
+# Start of a further assignment inside one message ("... and set the location to Y"); a ";"
+# or line break only splits when another assignment follows, so values may contain them
+_NEXT_ASSIGNMENT = rf"(?=(?:{_VERB}\s+)?{_OWNER}(?:{_FIELD})\s*(?:to\b|:|=))"
+CLAUSE_BREAK = re.compile(
+    rf"\s*(?:[;\n]|,?\s+and\s+|,)\s*{_NEXT_ASSIGNMENT}",
+    re.IGNORECASE,
+)
+
+# Intent cues for the start of an edit session
+EDIT_VERBS = {"edit", "change", "update", "modify", "set", "rename", "fix", "correct", "revise", "replace", "switch"}
+EDIT_OBJECTS = {"club", "details", "detail", "info", "information", "profile", "page", "fields", "field"}
+HOW_QUESTION = re.compile(r"^(how|where|what|why|when|which|who|is it possible|is there)\b")
+
+_lock = threading.Lock()
+_stats = {"intent_local": 0, "intent_llm": 0, "extract_local": 0, "extract_llm": 0}
+
+
+def _clean_value(value):
+    # "update the description to: Fun club" -> "Fun club"
+    value = re.sub(r"^\s*(?:[:=]|->)", "", value)
+    value = value.strip().strip("\"'“”‘’").strip()
+    value = re.sub(r"(?:,?\s*please|,?\s*thanks?(?: you)?)[.!]*$", "", value, flags=re.IGNORECASE).strip()
+    value = value.rstrip("!")
+    # A final period ends the sentence, not the value (but keep abbreviations like "5 p.m.")
+    if value.endswith(".") and not re.search(r"\b\w\.\w\.$", value):
+        value = value[:-1]
+    return value.strip().strip("\"'“”‘’").strip()
+
+
+def parse_edit_command(text):
+    """
+    Extract field updates from a manager message without an LLM.
+
+    Args:
+        text: The manager's message, e.g. "Change the name to Chess Society
+            and set location: Library Room 201".
+
+    Returns:
+        dict: field -> new value for every recognised assignment ({} when none).
+    """
+    updates = {}
+    for clause in CLAUSE_BREAK.split((text or "").strip()):
+        clause = clause.strip()
+        if not clause:
+            continue
+        match = ASSIGNMENT.match(clause)
+        # Without an edit verb only an explicit separator makes an assignment:
+        # "email is a good way to reach us" is a statement, not an edit
+        if match and (match.group("verb") or match.group("sep") in EXPLICIT_SEPS):
+            field = ALIAS_TO_FIELD[match.group("field").lower()]
+        else:
+            match = RENAME.match(clause)
+            field = "name" if match else None
+        if field:
+            value = _clean_value(match.group("value"))
+            if value:
+                updates[field] = value
+    return updates
+
+
+def detect_edit_intent(text):
+    """
+    Decide locally whether a manager message starts an edit.
+
+    Returns:
+        "edit", "none", or None when the message is ambiguous and needs the LLM.
+    """
+    normalized = normalize(text)
+    if not normalized:
+        return "none"
+    words = set(normalized.split())
+    if HOW_QUESTION.match(normalized):
+        # "How do I edit club details?" asks for instructions, not an edit
+        return "none"
+    if parse_edit_command(text):
+        return "edit"
+    mentions_field = any(re.search(rf"\b{re.escape(a)}\b", normalized) for a in ALIAS_TO_FIELD if "_" not in a)
+    if words & EDIT_VERBS and (mentions_field or words & EDIT_OBJECTS):
+        return "edit"
+    if not words & EDIT_VERBS and not mentions_field:
+        return "none"
+    return None
+
+
+def record(stage, message, local, result=None):
+    """Count a parser decision ("intent" or "extract") and log the message for coverage reports."""
+    with _lock:
+        _stats[f"{stage}_{'local' if local else 'llm'}"] += 1
+    log_event("edit_command", stage=stage, message=message, local=local, result=result)
+
+
+def get_edit_parser_stats():
+    with _lock:
+        stats = dict(_stats)
+    for stage in ("intent", "extract"):
+        total = stats[f"{stage}_local"] + stats[f"{stage}_llm"]
+        stats[f"{stage}_coverage"] = round(stats[f"{stage}_local"] / total, 3) if total else 0.0
+    return stats
+
+
+def coverage_report(records):
+    """
+    Re-run the current parser over logged manager messages.
+
+    Args:
+        records: Records from logs/edit_command.jsonl.
+
+    Returns:
+        dict: per stage, the number of messages, how many the parser handles
+        locally, the coverage and a sample of messages it still sends to the LLM.
+    """
+    report = {}
+    for stage in ("intent", "extract"):
+        messages = [r["message"] for r in records if r.get("stage") == stage and r.get("message")]
+        if stage == "intent":
+            missed = [m for m in messages if detect_edit_intent(m) is None]
+        else:
+            missed = [m for m in messages if not parse_edit_command(m)]
+        report[stage] = {
+            "messages": len(messages),
+            "local": len(messages) - len(missed),
+            "coverage": round((len(messages) - len(missed)) / len(messages), 3) if messages else 0.0,
+            "unparsed_sample": missed[:10],
+        }
+    return report
+
+
+# Parser coverage on logged manager messages (needs TRAFFIC_LOG_ENABLED=1 in production):
+# python edit_parser.py [--log logs/edit_command.jsonl]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report edit-command parser coverage on logged manager messages.")
+    parser.add_argument("--log", default=None, help="Path to an edit_command.jsonl log")
+    args = parser.parse_args()
+    for stage, m in coverage_report(read_events("edit_command", path=args.log)).items():
+        print(f"{stage:<8} messages={m['messages']:<5} local={m['local']:<5} coverage={m['coverage']:.3f}")
+        for message in m["unparsed_sample"]:
+            print(f"    LLM: {message}")
@@ -0,0 +1,66 @@
+import os
+import numpy as np
+from dotenv import load_dotenv
+from shared_cache import create_cache
+from fork_safe import PerProcess
+
+# Load environment variables
+load_dotenv()
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "models/embedding-001")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_TTL_SECONDS = int(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "3600"))
+
+def _create_embedder():
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return GoogleGenerativeAIEmbeddings(
+        model=EMBEDDING_MODEL,
+        google_api_key=GEMINI_API_KEY
+    )
+
+
+# The client holds gRPC channels, so each worker process opens its own
+_embedder = PerProcess(_create_embedder)
+
+# Question embeddings, so routing and retrieval for the same question share one API call
+_query_cache = create_cache("query_embeddings", maxsize=EMBEDDING_CACHE_SIZE, ttl=EMBEDDING_CACHE_TTL_SECONDS)
+
+
+def get_embedder():
+    """Return the shared Google embeddings client (created on first use in each process)."""
+    return _embedder.get()
+
+
+def embed_query(text):
+    """
+    Embed a user question, reusing the cached vector if it was embedded recently.
+
+    Returns:
+        1-D float32 numpy array.
+    """
+    key = (text or "").strip()
+    vector = _query_cache.get(key)
+    if vector is None:
+        vector = np.asarray(get_embedder().embed_query(key), dtype=np.float32)
+        _query_cache.set(key, vector)
+    return vector
+
+
+def embed_texts(texts):
+    """Embed a batch of texts. Returns a 2-D float32 array with one row per text."""
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.asarray(get_embedder().embed_documents(list(texts)), dtype=np.float32)
+
+
+def normalize_rows(matrix):
+    """Scale vectors (rows) to unit length so dot products are cosine similarities."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def get_embedding_stats():
+    return _query_cache.get_stats()
@@ -0,0 +1,90 @@
+import os
+from datetime import date, timedelta
+from dotenv import load_dotenv
+from supabase_client import fetch_event_by_club
+from shared_cache import create_cache
+
+# Load environment variables
+load_dotenv()
+
+# How far ahead events are loaded into the index
+EVENT_INDEX_HORIZON_DAYS = int(os.getenv("EVENT_INDEX_HORIZON_DAYS", "180"))
+# Upper bound on events loaded per club
+EVENT_INDEX_MAX_EVENTS = int(os.getenv("EVENT_INDEX_MAX_EVENTS", "50"))
+# How long a club's index is trusted before it is reloaded
+EVENT_INDEX_TTL_SECONDS = int(os.getenv("EVENT_INDEX_TTL_SECONDS", "300"))
+# Maximum number of clubs whose events are kept
+EVENT_INDEX_SIZE = int(os.getenv("EVENT_INDEX_SIZE", "1024"))
+# Number of events placed into a club prompt
+EVENT_CONTEXT_LIMIT = int(os.getenv("EVENT_CONTEXT_LIMIT", "5"))
+
+
+def _day(value):
+    """Normalize a date or timestamp string to its YYYY-MM-DD prefix for ordering."""
+    return str(value)[:10] if value else ""
+
+
+class ClubEventIndex:
+    """
+    Per-club index of current and upcoming events, sorted by start date.
+
+    Each club's events are loaded once with a date window pushed down to the
+    database and cached until the TTL lapses, so answering "what's next"
+    never touches past events or makes a round trip per question. The cache
+    is shared by all workers, so an invalidation reaches every one of them.
+    """
+
+    def __init__(self, horizon_days=EVENT_INDEX_HORIZON_DAYS, max_events=EVENT_INDEX_MAX_EVENTS,
+                 ttl=EVENT_INDEX_TTL_SECONDS, maxsize=EVENT_INDEX_SIZE):
+        self.horizon_days = horizon_days
+        self.max_events = max_events
+        self.ttl = ttl
+        # club_id -> (loaded_for_day, events)
+        self._clubs = create_cache("club_events", maxsize=maxsize, ttl=ttl)
+
+    def _load(self, club_id, today):
+        events = fetch_event_by_club(
+            club_id,
+            from_date=today,
+            to_date=(date.fromisoformat(today) + timedelta(days=self.horizon_days)).isoformat(),
+            limit=self.max_events
+        )
+        events = sorted(events, key=lambda e: _day(e.get("start_date")))
+        entry = (today, events)
+        self._clubs.set(club_id, entry)
+        return entry
+
+    def _entry(self, club_id, today):
+        entry = self._clubs.get(club_id)
+        # Reload on expiry (the cache drops the entry) or when the window start has moved to a new day
+        if entry is None or entry[0] != today:
+            entry = self._load(club_id, today)
+        return entry
+
+    def upcoming(self, club_id, limit=EVENT_CONTEXT_LIMIT, today=None):
+        """
+        Return ongoing and upcoming events for a club, soonest first.
+
+        Args:
+            club_id: ID of the club.
+            limit: Maximum number of events to return.
+            today: ISO date to treat as today (default: the current date).
+
+        Returns:
+            List of event dicts.
+        """
+        today = today or date.today().isoformat()
+        _, events = self._entry(club_id, today)
+        current = [e for e in events if _day(e.get("end_date") or e.get("start_date")) >= today]
+        return current[:limit]
+
+    def invalidate(self, club_id=None):
+        """Drop cached events for one club, or for every club when club_id is None."""
+        if club_id is None:
+            self._clubs.clear()
+        else:
+            self._clubs.delete(club_id)
+
+
+# Shared index
+event_index = ClubEventIndex()
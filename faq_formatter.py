@@ -1,87 +1,152 @@
-from supabase_client import fetch_faqs_by_club, get_club_info_by_id, fetch_event_by_club,fetch_username_by_id, get_last_chats
+from supabase_client import fetch_faqs_by_club, get_club_info_by_id, fetch_username_by_id, get_last_chats
+from event_index import event_index
+from club_context import club_context_cache, username_cache
+from datetime import date
+from faq_index import FaqIndex, FaqMatcher, record_match, FAQ_CONTEXT_MODE, FAQ_MATCH_EMBEDDING_THRESHOLD
+from token_budget import apply_budget
+
+# Static closing part of every club context; the answer rules stay after the club details
+CLUB_CONTEXT_TAIL = (
+    "ADDITIONAL NOTES:\n"
+    "- To contact the club manager, press contact club in the clubs page.\n"
+    "----CONTEXT END----\n"
+    """STRICT MODE:
+        - Greet the user by name if available.
+        - Only answer using the information provided in the context.
+        - Keep replies under 3 short sentences.
+        - Do not make up information not found in the context.
+        """
+)
+
+def render_club_details(club_info):
+    """Render the opening of a club context: instructions and club details."""
+    return "".join([
+        """
+        ----CONTEXT START----
+        You are a Club Information Assistant. Use ONLY the information below.
+        If the question is about another club, respond with: please select another club from the list, to query about other clubs.
+
+        CLUB DETAILS:
+        """,
+        f"- Club Name: {club_info['name']}\n",
+        f"- Description: {club_info['description']}\n",
+        f"- Category: {club_info['category']}\n",
+        f"- Location: {club_info['location']}\n",
+        f"- Website: {club_info['website_url']}\n",
+        f"- Club Leader: {club_info['leader_name']}\n",
+        f"- Club Leader Contact: {club_info['leader_contact']}\n",
+    ])
+
+def render_faqs(faqs):
+    """Render FAQs as numbered Q/A pairs."""
+    parts = ["FREQUENTLY ASKED QUESTIONS:\n"]
+    if not faqs:
+        parts.append("- No FAQs available for this club.\n")
+    else:
+        for i, faq in enumerate(faqs, 1):
+            parts.append(f"Q{i}: {faq['question']}\nA{i}: {faq['answer']}\n")
+    return "".join(parts)
+
+def render_events(events):
+    """Render upcoming events."""
+    parts = ["UPCOMING EVENTS:\n"]
+    if not events:
+        parts.append("- No upcoming events scheduled for this club.\n")
+    else:
+        for i, event in enumerate(events, 1):
+            parts.append(
+                f"Event {i}:\n"
+                f"- Title: {event['title']}\n"
+                f"- Description: {event['description']}\n"
+                f"- Location: {event['location']}\n"
+                f"- Time Range: {event['time_range']}\n"
+                f"- Start Date: {event['start_date']}\n"
+                f"- End Date: {event['end_date']}\n"
+                f"- Status: {event['status']}\n"
+            )
+    return "".join(parts)
+
+def get_club_context(club_id):
+    """
+    Return the cached club context entry, rendering it on a miss.
 
-def format_faqs_for_llm_club(club_id, user_id):
+    Returns:
+        dict with the rendered "details", "faqs_text" (every FAQ) and
+        "events_text" segments, the raw "faqs" rows, their "faq_index" and
+        "faq_matcher".
+    """
+    today = date.today().isoformat()
+    entry = club_context_cache.get(club_id, today)
+    if entry is None:
+        version = club_context_cache.version(club_id)
+        faqs = fetch_faqs_by_club(club_id) or []
+        club_info = get_club_info_by_id(club_id)
+        # Fetch the next few current/upcoming events (past events are never loaded)
+        events = event_index.upcoming(club_id, today=today)
+        entry = {
+            "details": render_club_details(club_info),
+            "faqs_text": render_faqs(faqs),
+            "events_text": render_events(events),
+            "faqs": faqs,
+            # Rebuilt whenever the club's content version changes
+            "faq_index": FaqIndex(faqs),
+            "faq_matcher": FaqMatcher(faqs),
+        }
+        club_context_cache.set(club_id, today, entry, version)
+    return entry
+
+def direct_faq_answer(club_id, question):
+    """
+    Return the stored answer when the question has exactly the words of one of
+    the club's FAQ questions, or None to go through the LLM.
+    """
+    try:
+        faq, score, method = get_club_context(club_id)["faq_matcher"].best_match(question)
+    except Exception as e:
+        print(f"FAQ match error for club ID '{club_id}': {e}")
+        return None
+    answered = faq is not None and (
+        method == "exact" or (method == "embedding" and score >= FAQ_MATCH_EMBEDDING_THRESHOLD)
+    )
+    record_match(club_id, question, faq, score, method, answered)
+    return faq["answer"] if answered else None
+
+def user_context(user_id):
+    """Small per-user segment (username for personalization), cached separately."""
+    name = username_cache.get(user_id)
+    if name is None:
+        name = fetch_username_by_id(user_id)
+        username_cache.set(user_id, name)
+    return f"USER INFORMATION:\n- Username: {name}\n" if name else ""
+
+def format_faqs_for_llm_club(club_id, user_id, question=None, mode=FAQ_CONTEXT_MODE):
     """
     Fetch and format club info, FAQs, and events for a given club in a format suitable for Groq LLM.
 
+    The club segments are rendered once per content version and shared by
+    every user; only the username line is added per request. Only the FAQ and
+    event segment is trimmed to the "club_context" token budget (later FAQs
+    and events go first); the club details, username and answer rules are
+    always kept whole.
+
     Args:
         club_id: ID of the club to fetch FAQs, info, and events for.
         user_id: ID of the user making the request.
+        question: The user's question; with mode "relevant", only the FAQs
+            that match it (top-k within a token budget) are included.
+        mode: "relevant" or "all" (every FAQ, also used when question is None).
 
     Returns:
         Formatted string with club information, FAQs, and events.
     """
     try:
-        # Fetch FAQs
-        faqs = fetch_faqs_by_club(club_id)
-        
-        # Fetch club info
-        club_info = get_club_info_by_id(club_id)
-
-        # Fetch events
-        events = fetch_event_by_club(club_id)
-
-        # Fetch user name
-        name = fetch_username_by_id(user_id)
-
-        # Build context with consistent formatting
-        context_text = """
-        ----CONTEXT START----
-        You are a Club Information Assistant. Use ONLY the information below.
-        If the question is about another club, respond with: please select another club from the list, to query about other clubs.
-
-        CLUB DETAILS:
-        """
-        context_text += f"- Club Name: {club_info['name']}\n"
-        context_text += f"- Description: {club_info['description']}\n"
-        context_text += f"- Category: {club_info['category']}\n"
-        context_text += f"- Location: {club_info['location']}\n"
-        context_text += f"- Website: {club_info['website_url']}\n"
-        context_text += f"- Club Leader: {club_info['leader_name']}\n"
-        context_text += f"- Club Leader Contact: {club_info['leader_contact']}\n"
-        
-        # Add FAQs
-        context_text += "FREQUENTLY ASKED QUESTIONS:\n"
-        if not faqs:
-            context_text += "- No FAQs available for this club.\n"
+        entry = get_club_context(club_id)
+        if mode == "relevant" and question:
+            faqs_text = render_faqs(entry["faq_index"].select(question))
         else:
-            for i, faq in enumerate(faqs, 1):
-                context_text += f"Q{i}: {faq['question']}\n"
-                context_text += f"A{i}: {faq['answer']}\n"
-        
-        # Add events
-        context_text += "UPCOMING EVENTS:\n"
-        if not events:
-            context_text += "- No upcoming events scheduled for this club.\n"
-        else:
-            for i, event in enumerate(events, 1):
-                context_text += f"Event {i}:\n"
-                context_text += f"- Title: {event['title']}\n"
-                context_text += f"- Description: {event['description']}\n"
-                context_text += f"- Location: {event['location']}\n"
-                context_text += f"- Time Range: {event['time_range']}\n"
-                context_text += f"- Start Date: {event['start_date']}\n"
-                context_text += f"- End Date: {event['end_date']}\n"
-                context_text += f"- Status: {event['status']}\n"
-
-        # Add user information for personalization
-        if name:
-            context_text += f"USER INFORMATION:\n- Username: {name}\n"
-        
-        context_text += "ADDITIONAL NOTES:\n"
-        context_text += "- To contact the club manager, press contact club in the clubs page.\n"
-        
-        context_text += "----CONTEXT END----\n"
-        
-        # Add strict mode instruction like other contexts
-        context_text += """STRICT MODE:
-        - Greet the user by name if available.
-        - Only answer using the information provided in the context.
-        - Keep replies under 3 short sentences.
-        - Do not make up information not found in the context.
-        """
-
-        return context_text
+            faqs_text = entry["faqs_text"]
+        body, _ = apply_budget("club_context", faqs_text + entry["events_text"])
+        return entry["details"] + body + user_context(user_id) + CLUB_CONTEXT_TAIL
     
     except Exception as e:
         print(f"Error formatting FAQs, club info, and events for club ID '{club_id}': {e}")
@@ -172,6 +237,17 @@ def context_website_manager():
         
     return context_text
 
+def format_chat_history(chat_history):
+    """Render chat turns ({"question", "answer"}, oldest first) as prompt history."""
+    formatted_history = "PREVIOUS CONVERSATION:\n"
+    if not chat_history:
+        formatted_history += "No previous conversation found.\n"
+    else:
+        for entry in chat_history:
+            formatted_history += f"User: {entry['question']}\n"
+            formatted_history += f"Assistant: {entry['answer']}\n\n"
+    return formatted_history
+
 def history_parser(user_id, session_id, limit=3):
     """
     Parse the chat history of a user session to extract previous conversations.
@@ -186,24 +262,15 @@ def history_parser(user_id, session_id, limit=3):
     """
     try:
         # Fetch user chat history
-        chat_history = get_last_chats(user_id, session_id, limit)
-        
-        # Format the chat history
-        formatted_history = "PREVIOUS CONVERSATION:\n"
-        if not chat_history:
-            formatted_history += "No previous conversation found.\n"
-        else:
-            for i, entry in enumerate(chat_history, 1):
-                formatted_history += f"User: {entry['question']}\n"
-                formatted_history += f"Assistant: {entry['answer']}\n\n"
-        
-        return formatted_history
+        return format_chat_history(get_last_chats(user_id, session_id, limit))
     
     except Exception as e:
         print(f"Error parsing chat history for user ID '{user_id}': {e}")
         import traceback
         traceback.print_exc()
         return "Error retrieving conversation history."
-    
 
-    
\ No newline at end of file
+async def history_parser_async(user_id, session_id, limit=3):
+    """history_parser for async callers: reads through the shared PostgREST pool instead of blocking."""
+    from supabase_pool import get_last_chats as get_last_chats_async
+    return format_chat_history(await get_last_chats_async(user_id, session_id, limit))
@@ -0,0 +1,213 @@
+import os
+import math
+import difflib
+import threading
+from collections import Counter
+from dotenv import load_dotenv
+from local_classifier import normalize
+from token_budget import estimate_tokens, get_token_usage
+from traffic_log import log_event
+
+# Load environment variables
+load_dotenv()
+
+# "relevant" (default) puts only the FAQs that match the question into the prompt; "all" dumps every FAQ
+FAQ_CONTEXT_MODE = os.getenv("FAQ_CONTEXT_MODE", "relevant")
+FAQ_CONTEXT_TOP_K = int(os.getenv("FAQ_CONTEXT_TOP_K", "5"))
+FAQ_CONTEXT_MAX_TOKENS = int(os.getenv("FAQ_CONTEXT_MAX_TOKENS", "1200"))
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "is", "are", "was", "were", "be", "to", "of", "in", "on", "at", "for",
+    "with", "about", "do", "does", "did", "can", "could", "would", "should", "will", "i", "me", "my", "you",
+    "your", "we", "our", "it", "this", "that", "there", "any", "what", "how", "please", "club",
+}
+
+
+def tokenize(text):
+    return [t for t in normalize(text).split() if t not in STOPWORDS]
+
+
+class FaqIndex:
+    """
+    BM25 index over one club's FAQs, built when the club's FAQs are loaded.
+
+    The FAQ question counts twice as much as the answer, since users phrase
+    their questions like the stored ones.
+    """
+
+    def __init__(self, faqs, k1=1.2, b=0.75):
+        self.faqs = list(faqs or [])
+        self.k1 = k1
+        self.b = b
+        self.docs = [
+            Counter(tokenize(faq.get("question", "")) * 2 + tokenize(faq.get("answer", "")))
+            for faq in self.faqs
+        ]
+        self.lengths = [sum(doc.values()) for doc in self.docs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        df = Counter(term for doc in self.docs for term in doc)
+        n = len(self.docs)
+        self.idf = {term: math.log(1 + (n - freq + 0.5) / (freq + 0.5)) for term, freq in df.items()}
+        self.tokens = [estimate_tokens(f"Q: {faq.get('question', '')}\nA: {faq.get('answer', '')}\n") for faq in self.faqs]
+
+    def scores(self, question):
+        terms = tokenize(question)
+        results = []
+        for doc, length in zip(self.docs, self.lengths):
+            score = 0.0
+            for term in terms:
+                tf = doc.get(term)
+                if tf:
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+                    score += self.idf[term] * tf * (self.k1 + 1) / norm
+            results.append(score)
+        return results
+
+    def select(self, question, top_k=FAQ_CONTEXT_TOP_K, max_tokens=FAQ_CONTEXT_MAX_TOKENS):
+        """
+        Pick the FAQs most relevant to a question, best first, within a token budget.
+
+        When no FAQ shares a term with the question (e.g. "tell me more"), the
+        first FAQs are used so the model still sees the club's basics.
+        """
+        scores = self.scores(question)
+        order = sorted((i for i, s in enumerate(scores) if s > 0), key=lambda i: -scores[i])
+        if not order:
+            order = list(range(len(self.faqs)))
+        selected, used = [], 0
+        for i in order[:top_k]:
+            if selected and used + self.tokens[i] > max_tokens:
+                break
+            selected.append(self.faqs[i])
+            used += self.tokens[i]
+        return selected
+
+
+# Direct-answer fast path: return the stored FAQ answer when a question has exactly the words of a
+# FAQ question (ignoring order, punctuation and FILLER_WORDS); anything else goes through the LLM
+FAQ_DIRECT_ANSWER = os.getenv("FAQ_DIRECT_ANSWER", "1") == "1"
+# Set FAQ_MATCH_EMBEDDINGS=1 to also accept matches by embedding similarity
+FAQ_MATCH_EMBEDDINGS = os.getenv("FAQ_MATCH_EMBEDDINGS", "0") == "1"
+FAQ_MATCH_EMBEDDING_THRESHOLD = float(os.getenv("FAQ_MATCH_EMBEDDING_THRESHOLD", "0.95"))
+
+# Extra per-process counters for the fast path
+_match_lock = threading.Lock()
+_match_stats = {"checked": 0, "answered": 0, "by_embedding": 0, "score_histogram": {}}
+
+
+# Words that never change what a question asks
+FILLER_WORDS = {"a", "an", "the", "please"}
+# Words that change what a question asks even when the rest is identical
+WH_WORDS = {"who", "what", "when", "where", "why", "which", "whom", "whose", "how"}
+NEGATIONS = {"no", "not", "never", "none", "nobody", "nothing", "nor", "without", "cannot", "cant"}
+
+
+def _words(text):
+    return set(text.split()) - FILLER_WORDS
+
+
+def _negations(words):
+    return {w for w in words if w in NEGATIONS or w.endswith("n't")}
+
+
+def _conflicts(a, b):
+    """True when two questions differ in their wh-word or in a negation (a hard mismatch)."""
+    wa, wb = _words(a), _words(b)
+    return (wa & WH_WORDS) != (wb & WH_WORDS) or _negations(wa) != _negations(wb)
+
+
+def _similarity(a, b):
+    """
+    Max of character-level ratio and word-set overlap between two normalized
+    questions. Only logged for analysis: a direct answer needs an exact match.
+    """
+    if not a or not b:
+        return 0.0
+    ratio = difflib.SequenceMatcher(None, a, b).ratio()
+    wa, wb = set(a.split()), set(b.split())
+    overlap = len(wa & wb) / len(wa | wb)
+    return max(ratio, overlap)
+
+
+def is_same_question(a, b):
+    """Exact word-set equality of two normalized questions (filler words aside)."""
+    return bool(a) and _words(a) == _words(b) and not _conflicts(a, b)
+
+
+class FaqMatcher:
+    """
+    Finds the stored FAQ a question is a near-verbatim copy of.
+
+    A text match ("exact") needs the same set of words after normalization
+    (case, punctuation, filler words). Near-misses such as "Where are the
+    meetings?" against "When are the meetings?" are reported as "fuzzy" and
+    never answered directly. Optionally the question embedding is compared
+    with embeddings of the FAQ questions (computed once per FAQ set), but a
+    different wh-word or negation still rules the FAQ out.
+    """
+
+    def __init__(self, faqs, use_embeddings=FAQ_MATCH_EMBEDDINGS):
+        self.faqs = list(faqs or [])
+        self.questions = [normalize(faq.get("question", "")) for faq in self.faqs]
+        self.use_embeddings = use_embeddings
+        self._vectors = None
+
+    def _embedding_scores(self, question):
+        from embeddings import embed_query, embed_texts, normalize_rows
+        if self._vectors is None:
+            self._vectors = normalize_rows(embed_texts([faq.get("question", "") for faq in self.faqs]))
+        return self._vectors @ normalize_rows(embed_query(question))
+
+    def best_match(self, question):
+        """
+        Returns:
+            (faq or None, score, method) for the closest stored FAQ question;
+            method is "exact", "fuzzy" (closest text, not a match) or "embedding".
+        """
+        if not self.faqs:
+            return None, 0.0, None
+        text = normalize(question)
+        for faq, stored in zip(self.faqs, self.questions):
+            if is_same_question(text, stored):
+                return faq, 1.0, "exact"
+        scores = [_similarity(text, q) for q in self.questions]
+        best = max(range(len(scores)), key=scores.__getitem__)
+        if not self.use_embeddings:
+            return self.faqs[best], scores[best], "fuzzy"
+        try:
+            vector_scores = self._embedding_scores(question)
+        except Exception as e:
+            print(f"FAQ embedding match error: {e}")
+            return self.faqs[best], scores[best], "fuzzy"
+        best_vec = int(vector_scores.argmax())
+        if _conflicts(text, self.questions[best_vec]):
+            return self.faqs[best], scores[best], "fuzzy"
+        return self.faqs[best_vec], float(vector_scores[best_vec]), "embedding"
+
+
+def record_match(club_id, question, faq, score, method, answered):
+    """Count a fast-path check and log it for threshold tuning."""
+    bucket = f"{min(int(score * 10), 9) / 10:.1f}"
+    with _match_lock:
+        _match_stats["checked"] += 1
+        _match_stats["answered"] += int(answered)
+        _match_stats["by_embedding"] += int(answered and method == "embedding")
+        _match_stats["score_histogram"][bucket] = _match_stats["score_histogram"].get(bucket, 0) + 1
+    log_event("faq_match", club_id=club_id, question=question, faq_question=(faq or {}).get("question"),
+              score=round(score, 4), method=method, answered=answered)
+
+
+def get_faq_match_stats():
+    """Fast-path counters plus the LLM time saved, estimated from recorded call latencies."""
+    usage = get_token_usage()
+    per_question = sum(usage.get(site, {}).get("avg_seconds", 0.0) for site in ("classify_question", "answer_club"))
+    with _match_lock:
+        checked = _match_stats["checked"]
+        return {
+            **_match_stats,
+            "score_histogram": dict(sorted(_match_stats["score_histogram"].items())),
+            "embedding_threshold": FAQ_MATCH_EMBEDDING_THRESHOLD if FAQ_MATCH_EMBEDDINGS else None,
+            "match_rate": round(_match_stats["answered"] / checked, 3) if checked else 0.0,
+            "llm_calls_saved": _match_stats["answered"] * 2,
+            "est_seconds_saved": round(_match_stats["answered"] * per_question, 2),
+        }
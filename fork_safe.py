@@ -0,0 +1,54 @@
+import os
+import threading
+
+
+class PerProcess:
+    """
+    A value created lazily, once per process.
+
+    Clients that own sockets, threads or open database files (Supabase/httpx,
+    ChromaDB's SQLite store, gRPC channels) must not be shared between forked
+    gunicorn workers. Wrapping their factory here means the preloaded parent
+    never opens them, and each worker opens its own on first use after fork.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._value = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._value = self.factory()
+                    self._pid = pid
+        return self._value
+
+    def reset(self):
+        """Drop this process's value; the next get() creates a new one."""
+        with self._lock:
+            self._value = None
+            self._pid = None
+
+
+class ForkSafeProxy:
+    """
+    Stand-in for a module-level client that forwards attribute access to
+    the current process's instance, so `from module import client` keeps
+    working unchanged for callers.
+    """
+
+    def __init__(self, factory):
+        object.__setattr__(self, "_per_process", PerProcess(factory))
+
+    def __getattr__(self, name):
+        return getattr(self._per_process.get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._per_process.get(), name, value)
+
+    def __repr__(self):
+        return f"<ForkSafeProxy pid={os.getpid()} of {self._per_process.factory!r}>"
@@ -0,0 +1,23 @@
+import os
+
+# Gunicorn settings (read automatically from ./gunicorn.conf.py)
+
+# Worker processes; Heroku sets WEB_CONCURRENCY. 1 keeps the single-worker deployment.
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+keepalive = 300
+# Import the app once in the parent so workers share its memory copy-on-write. Clients that
+# hold sockets or files (Supabase, ChromaDB, embeddings) are opened per worker after fork.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+
+def when_ready(server):
+    """Map the read-only club index in the parent so every worker forks with it loaded."""
+    if preload_app:
+        from club_index import club_index
+        club_index.load_snapshot()
+
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} forked")
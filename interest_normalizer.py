@@ -0,0 +1,163 @@
+import os
+import difflib
+import threading
+from dotenv import load_dotenv
+from local_classifier import normalize
+from traffic_log import log_event, read_events
+
+# Load environment variables
+load_dotenv()
+
+# Minimum difflib ratio for a misspelled word to count as a lexicon entry
+INTEREST_FUZZY_CUTOFF = float(os.getenv("INTEREST_FUZZY_CUTOFF", "0.85"))
+
+# Interest phrase -> fixed club category. Extended at startup from logs/interests.jsonl.
+LEXICON = {
+    "Engineering": [
+        "engineering", "engineer", "robotics", "robot", "robots", "mechanics", "mechanical", "electronics",
+        "electrical", "civil engineering", "building things", "cars", "automotive", "drones", "3d printing",
+    ],
+    "Arts": [
+        "art", "arts", "drawing", "painting", "sketching", "photography", "photo", "photos", "design",
+        "theatre", "theater", "drama", "acting", "film", "films", "movies", "filmmaking", "dance", "dancing",
+        "writing", "poetry", "crafts", "anime", "manga",
+    ],
+    "Music": [
+        "music", "musical", "singing", "sing", "choir", "band", "bands", "guitar", "piano", "drums",
+        "violin", "rap", "dj", "concerts", "orchestra", "karaoke",
+    ],
+    "Sports": [
+        "sports", "sport", "basketball", "football", "soccer", "volleyball", "badminton", "tennis",
+        "table tennis", "swimming", "running", "gym", "fitness", "workout", "martial arts", "taekwondo",
+        "karate", "boxing", "cycling", "hiking", "climbing", "baseball", "esports", "yoga",
+    ],
+    "Academics": [
+        "academics", "academic", "studying", "study", "research", "science", "math", "maths", "mathematics",
+        "physics", "chemistry", "biology", "debate", "debating", "reading", "books", "languages",
+        "economics", "finance", "business", "entrepreneurship",
+    ],
+    "Cultural": [
+        "culture", "cultural", "traditions", "traditional", "history", "heritage", "international",
+        "language exchange", "cooking", "food", "religion", "festivals",
+    ],
+    "Technology": [
+        "technology", "tech", "coding", "programming", "code", "software", "computers", "computer",
+        "ai", "artificial intelligence", "machine learning", "data science", "web development",
+        "app development", "hacking", "cybersecurity", "gaming", "game development",
+    ],
+    "Social": [
+        "social", "socializing", "making friends", "friends", "meeting people", "volunteering",
+        "volunteer", "community service", "charity", "parties", "networking", "board games", "hanging out",
+    ],
+}
+
+# Words that carry no interest ("I would like to join a club")
+FILLER_WORDS = {
+    "i", "im", "i'm", "me", "my", "a", "an", "the", "and", "or", "to", "of", "in", "on", "for", "with", "about",
+    "what", "which", "any", "some", "do", "does", "you", "your", "can", "could", "would", "should", "is", "are",
+    "am", "be", "like", "love", "enjoy", "into", "interested", "interest", "interests", "hobby", "hobbies",
+    "want", "wanna", "join", "joining", "club", "clubs", "recommend", "recommendation", "recommendations",
+    "suggest", "suggestion", "suggestions", "please", "really", "also", "too", "lot", "much", "very", "things",
+    "stuff", "something", "related", "there", "available", "good", "fun", "doing", "playing", "play",
+    "listening", "watching", "learning", "making", "yes", "sure", "well", "so", "just", "maybe", "kind", "sort",
+    "hi", "hello", "hey", "thanks", "thank", "know", "tell", "give", "show", "find", "get", "that", "it",
+    "this", "them", "they", "have", "has", "am", "myself", "mostly", "mainly", "other", "others",
+}
+
+_lock = threading.Lock()
+_stats = {"local": 0, "llm": 0, "empty": 0}
+
+
+class InterestNormalizer:
+    """
+    Maps free-text interests onto the fixed club categories without an LLM.
+
+    Phrases are matched longest-first (up to three words) against the
+    synonym lexicon; remaining words get a fuzzy match so small typos
+    ("basketbal", "progamming") still map. Whatever is left is reported as
+    unmapped so the caller can decide whether the LLM is needed.
+    """
+
+    def __init__(self, lexicon=LEXICON, learned=None, fuzzy_cutoff=INTEREST_FUZZY_CUTOFF):
+        self.phrases = {}
+        for category, phrases in lexicon.items():
+            for phrase in phrases:
+                self.phrases[normalize(phrase)] = category
+        for phrase, category in (learned or {}).items():
+            self.phrases.setdefault(normalize(phrase), category)
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._single_words = [p for p in self.phrases if " " not in p]
+
+    def normalize(self, text):
+        """
+        Returns:
+            (categories, unmapped): categories in first-mention order, and the
+            leftover content words no lexicon entry matched.
+        """
+        tokens = normalize(text).split()
+        categories, unmapped = [], []
+        i = 0
+        while i < len(tokens):
+            for size in (3, 2, 1):
+                phrase = " ".join(tokens[i:i + size])
+                if len(tokens[i:i + size]) == size and phrase in self.phrases:
+                    category = self.phrases[phrase]
+                    if category not in categories:
+                        categories.append(category)
+                    i += size
+                    break
+            else:
+                word = tokens[i]
+                i += 1
+                if word in FILLER_WORDS or word.isdigit():
+                    continue
+                match = difflib.get_close_matches(word, self._single_words, n=1, cutoff=self.fuzzy_cutoff) \
+                    if len(word) >= 5 else []
+                if match:
+                    category = self.phrases[match[0]]
+                    if category not in categories:
+                        categories.append(category)
+                else:
+                    unmapped.append(word)
+        return categories, unmapped
+
+
+def _learned_synonyms():
+    """Phrase -> category pairs recorded when the LLM mapped a word the lexicon missed."""
+    learned = {}
+    for record in read_events("interests"):
+        if record.get("phrase") and record.get("category") in LEXICON:
+            learned[record["phrase"]] = record["category"]
+    return learned
+
+
+_normalizer = None
+
+
+def get_interest_normalizer():
+    global _normalizer
+    with _lock:
+        if _normalizer is None:
+            _normalizer = InterestNormalizer(learned=_learned_synonyms())
+        return _normalizer
+
+
+def record_llm_interests(unmapped, llm_interests):
+    """
+    Log unmapped words the LLM resolved to exactly one fixed category, so the
+    lexicon can learn them (picked up on the next restart).
+    """
+    categories = [i for i in llm_interests if i.title() in LEXICON]
+    if len(categories) == 1 and len(unmapped) == 1:
+        log_event("interests", phrase=unmapped[0], category=categories[0].title())
+
+
+def count(outcome):
+    with _lock:
+        _stats[outcome] += 1
+
+
+def get_interest_stats():
+    with _lock:
+        total = sum(_stats.values())
+        return {**_stats, "local_rate": round((_stats["local"] + _stats["empty"]) / total, 3) if total else 0.0}
@@ -0,0 +1,317 @@
+import os
+import re
+import math
+import threading
+from dotenv import load_dotenv
+from traffic_log import read_events
+
+# Load environment variables
+load_dotenv()
+
+# Set LOCAL_CLASSIFIER_ENABLED=0 to always use the LLM classifiers
+LOCAL_CLASSIFIER_ENABLED = os.getenv("LOCAL_CLASSIFIER_ENABLED", "1") == "1"
+
+ROUTES = ("question", "noid", "catcher")
+
+# Minimum confidence for a local answer, per route. Lower = fewer LLM calls, more risk.
+DEFAULT_THRESHOLDS = {
+    "question": float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD_QUESTION", "0.9")),
+    "noid": float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD_NOID", "0.9")),
+    # Higher: a yes/no model guess on a reply that also asks for something ("ok show me sports clubs") scores ~0.98
+    "catcher": float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD_CATCHER", "0.99")),
+}
+
+# Confidence reported for a keyword-rule hit; above every default threshold, so rules must stay narrow
+RULE_CONFIDENCE = 0.995
+
+# Minimum share of a question's content words the model has seen in training. Below it the
+# question is outside what the examples cover ("Where can I eat on campus?") and the model's
+# confidence means nothing, so the LLM decides
+LOCAL_CLASSIFIER_MIN_KNOWN_SHARE = float(os.getenv("LOCAL_CLASSIFIER_MIN_KNOWN_SHARE", "0.75"))
+
+# Function words ignored when measuring how much of a question the model knows
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "am", "was", "be", "do", "does", "did", "can", "could", "would",
+    "should", "will", "i", "i'm", "me", "my", "you", "your", "we", "us", "there", "here", "what",
+    "which", "who", "when", "where", "why", "how", "any", "some", "to", "of", "in", "on", "at", "for",
+    "with", "about", "and", "or", "it", "this", "that", "tell", "please", "so", "if", "not",
+}
+
+# Labelled examples taken from the LLM classifier prompts in classifier.py
+SEED_EXAMPLES = {
+    "question": {
+        "Website": [
+            "Where do I sign up online?",
+            "How do I reset my password?",
+            "Is there a website to join?",
+            "How do I find my profile?",
+            "How do I change my email address?",
+            "How do I log in?",
+            "How do I register an account?",
+            "Where are the settings?",
+            "How do I change the language of the website?",
+        ],
+        "Club": [
+            "What does the club do?",
+            "When are the meetings?",
+            "Who can join?",
+            "What are the benefits of joining?",
+            "Where does the club meet?",
+            "Who is the club leader?",
+            "Are there any upcoming events?",
+            "How can I contact the club leader?",
+            "What is the club about?",
+        ],
+        "General": [
+            "What is NDHU",
+            "How do I report bugs?",
+            "How do I contact administration?",
+            "How do i create new clubs?",
+            "Where is the library?",
+            "What time does the university office open?",
+        ],
+    },
+    "noid": {
+        "single": [
+            "Tell me about the Chess Club",
+            "When does the Robotics Club meet?",
+            "What does the Photography Club do?",
+            "What are the benefits of joining the Debate Club?",
+            "Who leads the Music Club?",
+        ],
+        "clublist": [
+            "What clubs are there?",
+            "Show me all the clubs",
+            "What organizations can I join?",
+            "List the clubs on campus",
+            "Which clubs are available?",
+        ],
+        "recommendation": [
+            "What clubs would you recommend for a CS major?",
+            "Which clubs are good for beginners?",
+            "I'm interested in art, what clubs should I join?",
+            "I'm looking for something fun to join",
+            "Any suggestions for clubs related to volunteering?",
+            "Are there clubs for shy people?",
+            "Is there any club I can join that helps with public speaking?",
+            "I'm new and not sure what club to join",
+            "What club should I join?",
+            "I like music and sports",
+        ],
+        "general": [
+            "Where is the library?",
+            "How to report bugs?",
+            "What can the chatbot do?",
+            "How do I view announcments?",
+            "What is NDHU?",
+            "How do I join clubs?",
+            "How do I reset my password?",
+        ],
+    },
+    "catcher": {
+        "yes": [
+            "Yes, I would like to see.",
+            "Show me.",
+            "Alright, sure.",
+            "That would be great.",
+            "Yes",
+            "Okay, please show me.",
+        ],
+        "no": [
+            "No.",
+            "No, I don't want to see all available clubs.",
+            "I'm not interested in seeing the full list.",
+        ],
+        "continue": [
+            "What clubs would you recommend for a CS major?",
+            "Which clubs are good for beginners?",
+            "I'm interested in art; what clubs should I join?",
+            "Are there any volunteering clubs?",
+            "Do you have clubs for shy people?",
+            "I'm looking for something fun to join.",
+            "Is there any club to help with public speaking?",
+            "I'm new and not sure what club to join.",
+        ],
+    },
+}
+
+# High-precision keyword rules, checked in order before the model
+RULES = {
+    "question": [
+        (re.compile(r"\b(password|log ?in|sign ?up|register|registration|my profile|my account|account settings)\b"), "Website"),
+        (re.compile(r"\b(ndhu|university|library|administration|report (a )?bugs?|create (a )?new clubs?)\b"), "General"),
+    ],
+    "noid": [
+        (re.compile(r"\b(recommend|suggest|suggestions?|interested in|looking for|should i join|not sure what club"
+                    r"|(best|right|perfect|ideal|good) clubs? for|clubs? for me)\b"), "recommendation"),
+        (re.compile(r"^(what|which) (clubs|organizations) (are there|exist|do you have|are available)\b"
+                    r"|\b(list|show)( me)? (all )?(the )?(clubs|organizations)\b|\ball (the )?(available )?clubs\b"), "clublist"),
+        (re.compile(r"\b(library|ndhu|university|chatbot|announcements?|report bugs?|password)\b"), "general"),
+        (re.compile(r"\b(the|about)\s+(?!(any|best|right|perfect|ideal|good|next|other|same|new)\b)\w+(\s+\w+)?\s+club\b"), "single"),
+    ],
+    "catcher": [
+        (re.compile(r"^$"), "no"),
+        (re.compile(r"^((yes|yeah|yep|yup|sure|ok|okay|alright|please|of course|go ahead|why not|show me|show them|that would be great)\s*)+$"), "yes"),
+        (re.compile(r"^((no|nope|nah|no thanks|no thank you|not now|not really|maybe later)\s*)+$"), "no"),
+    ],
+}
+
+# Keyword rules that only hold when the question is not about a club. A question with
+# both cues ("register for the club's next event", "is the club room near the library?")
+# is ambiguous, so it goes to the LLM
+RULE_EXCLUSIONS = {
+    "question": re.compile(r"\b((?<!new )clubs?|events?|meetings?)\b"),
+}
+
+# A catcher reply that opens with a refusal is never a plain "yes" ("no, show me music clubs")
+CATCHER_REFUSAL = re.compile(r"^(no|nope|nah|not)\b")
+
+# Questions that lean on earlier turns; the LLM sees the history, so defer to it
+FOLLOW_UP_PATTERN = re.compile(
+    r"\b(it|its|they|them|their|this|that|those|these|tell me more|explain more|more about|what about|the other)\b"
+)
+
+# Routes where a follow-up cue must go to the LLM (catcher answers are follow-ups by design)
+FOLLOW_UP_ROUTES = ("question", "noid")
+
+
+def normalize(text):
+    text = (text or "").lower().replace("’", "'")
+    text = re.sub(r"[^\w\s']", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _features(text):
+    tokens = normalize(text).split()
+    return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class NaiveBayesModel:
+    """Multinomial naive Bayes over unigrams and bigrams (a linear model in log space)."""
+
+    def __init__(self, examples, alpha=0.5):
+        self.labels = sorted(examples)
+        total = sum(len(v) for v in examples.values())
+        self.log_prior = {label: math.log(len(examples[label]) / total) for label in self.labels}
+        counts = {label: {} for label in self.labels}
+        for label, texts in examples.items():
+            for text in texts:
+                for f in _features(text):
+                    counts[label][f] = counts[label].get(f, 0) + 1
+        vocab = {f for c in counts.values() for f in c}
+        self.vocab = vocab
+        self.log_likelihood = {}
+        for label in self.labels:
+            denom = sum(counts[label].values()) + alpha * len(vocab)
+            self.log_likelihood[label] = {f: math.log((counts[label].get(f, 0) + alpha) / denom) for f in vocab}
+
+    def known_share(self, text):
+        """Share of the content words in text that occur in the training examples (1.0 if none)."""
+        words = [w for w in normalize(text).split() if w not in STOPWORDS]
+        if not words:
+            return 1.0
+        return sum(w in self.vocab for w in words) / len(words)
+
+    def predict(self, text):
+        """Return (label, probability) for the most likely label."""
+        features = [f for f in _features(text) if f in self.vocab]
+        if not features:
+            return None, 0.0
+        scores = {
+            label: self.log_prior[label] + sum(self.log_likelihood[label][f] for f in features)
+            for label in self.labels
+        }
+        best = max(scores, key=scores.get)
+        z = sum(math.exp(s - scores[best]) for s in scores.values())
+        return best, 1.0 / z
+
+
+class LocalClassifier:
+    """
+    CPU-only intent classifier for one route: keyword rules first, then a
+    naive Bayes model trained on the seed examples plus logged LLM decisions.
+    Returns None when it is not confident, so the caller falls back to the LLM.
+    """
+
+    def __init__(self, route, threshold=None, examples=None, min_known_share=LOCAL_CLASSIFIER_MIN_KNOWN_SHARE):
+        self.route = route
+        self.threshold = DEFAULT_THRESHOLDS[route] if threshold is None else threshold
+        self.min_known_share = min_known_share
+        examples = examples or _training_examples(route)
+        self.model = NaiveBayesModel(examples)
+        self.stats = {"local_rule": 0, "local_model": 0, "llm_fallback": 0}
+        self._lock = threading.Lock()
+
+    def predict(self, text):
+        """Return (label, confidence, source) without applying the threshold."""
+        normalized = normalize(text)
+        exclusion = RULE_EXCLUSIONS.get(self.route)
+        for pattern, label in RULES.get(self.route, []):
+            if pattern.search(normalized):
+                if exclusion and exclusion.search(normalized):
+                    return None, 0.0, "conflict"
+                return label, RULE_CONFIDENCE, "rule"
+        if self.route in FOLLOW_UP_ROUTES and FOLLOW_UP_PATTERN.search(normalized):
+            return None, 0.0, "follow_up"
+        if self.model.known_share(normalized) < self.min_known_share:
+            return None, 0.0, "unknown_words"
+        label, confidence = self.model.predict(normalized)
+        if self.route == "catcher" and label == "yes" and CATCHER_REFUSAL.search(normalized):
+            return None, 0.0, "conflict"
+        return label, confidence, "model"
+
+    def classify(self, text):
+        """Return a label when confident enough, otherwise None (use the LLM)."""
+        label, confidence, source = self.predict(text)
+        with self._lock:
+            if label is not None and confidence >= self.threshold:
+                self.stats["local_rule" if source == "rule" else "local_model"] += 1
+                return label
+            self.stats["llm_fallback"] += 1
+        return None
+
+    def get_stats(self):
+        with self._lock:
+            total = sum(self.stats.values())
+            return {
+                **self.stats,
+                "threshold": self.threshold,
+                "fallback_rate": round(self.stats["llm_fallback"] / total, 3) if total else 0.0,
+            }
+
+
+def _training_examples(route):
+    examples = {label: list(texts) for label, texts in SEED_EXAMPLES[route].items()}
+    for record in read_events("classifier"):
+        if record.get("route") == route and record.get("label") in examples and record.get("question"):
+            examples[record["label"]].append(record["question"])
+    return examples
+
+
+_classifiers = {}
+_classifiers_lock = threading.Lock()
+
+
+def get_local_classifier(route):
+    with _classifiers_lock:
+        if route not in _classifiers:
+            _classifiers[route] = LocalClassifier(route)
+        return _classifiers[route]
+
+
+def local_classify(route, user_question):
+    """
+    Classify with the local model for a route, or return None to defer to the LLM.
+
+    Args:
+        route: "question", "noid" or "catcher".
+        user_question: The raw user question.
+    """
+    if not LOCAL_CLASSIFIER_ENABLED:
+        return None
+    return get_local_classifier(route).classify(user_question)
+
+
+def get_local_classifier_stats():
+    with _classifiers_lock:
+        return {route: clf.get_stats() for route, clf in _classifiers.items()}
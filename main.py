@@ -1,21 +1,61 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header
 from pydantic import BaseModel
 import os
 import json
+import asyncio
+import hmac
 from dotenv import load_dotenv
-from classifier import classify_question, classify_question_noid, classify_return_recommendation, classify_return_all_clubs, classify_edit
-from faq_formatter import format_faqs_for_llm_club,history_parser
+from micro_batcher import classify_async, get_batcher_stats
+from faq_formatter import format_faqs_for_llm_club,history_parser_async,direct_faq_answer
+from faq_index import FAQ_CONTEXT_MODE, FAQ_DIRECT_ANSWER, get_faq_match_stats
 from ai_init import query_gemini_llm
-from protection import is_question_safe
-from supabase_client import save_chat_history, get_all_clubs, load_state
+from token_budget import estimate_tokens, get_token_usage
+from protection import is_question_safe, get_safety_stats
+from supabase_pool import get_all_clubs, get_pool_stats, pool as supabase_pool
+from session_summary import save_chat_history, history_context, get_summary_stats
+from state_store import state_store
+from dialogue_state import AWAITING_INTERESTS, AWAITING_ALL_CLUBS, get_pending_prompt, clear_pending_prompt, is_interests_answer, state_user_id
 from create_edit_funcs import handle_club_edit
 from vector_db import query_pdf
 from recommender import recommend_clubs
+from local_classifier import get_local_classifier_stats
+from centroid_router import get_centroid_router_stats
+from embeddings import get_embedding_stats
+from need_history import needs_history, follow_up_reason, get_history_detector_stats
+from club_index import club_index, get_club_index_stats, CLUB_INDEX_REFRESH_SECONDS
+from recommendation_cache import get_recommendation_cache_stats
+from interest_normalizer import get_interest_stats
+from club_context import invalidate_club_context, get_club_context_stats
+from prompt_cache import get_prompt_cache_stats
+from edit_parser import get_edit_parser_stats
+from club_updates import get_club_update_stats
+from structured_output import get_structured_output_stats
+from shared_cache import get_shared_cache_stats
 load_dotenv()
 
 # Get Groq API key from environment variable
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Shared secret for /cache/invalidate (e.g. sent by a Supabase database webhook); unset = route disabled
+CACHE_INVALIDATION_TOKEN = os.getenv("CACHE_INVALIDATION_TOKEN")
+
+# Fixed instructions for club answers, sent as a static prompt prefix (see prompt_cache.py). The
+# STRICT MODE answer rules are not part of it: they close the club context, after the dynamic part.
+CLUB_ANSWER_PREFIX = """\n\nIMPORTANT: Keep your answers concise and to the point. Avoid lengthy explanations.
+        STRICTLY FOLLOW CONTEXT RULES!\n\n 
+        STRICTLY FOLLOW THIS: If the question uses vague pronouns (like "it", "they", "this", "that", etc.) or refers implicitly to something already discussed (e.g., previous messages or the current state of the club), always use the most recent Q&A to determine what the user is asking.\n\n
+        Examples:\n
+
+        "Can I join it?" → Ask: Join what? → If the previous message said "no events", then reply that there’s nothing to join right now.\n
+
+        "When does it start?" → Check what “it” refers to in the last message.\n
+
+        "Is that available online?" → Identify what “that” is from earlier replies.\n
+
+        Only use FAQs directly if the current conversation clearly clarify the intent \n\n
+
+        GREET BACK IF ITS A GREETING QUESTION OR THANK YOU QUESTION. Examples: "Thank you!", "Hi, how are you?", "Hello, can you help me?", "Thanks for your assistance!", "I appreciate your help!", "Goodbye!", "See you later!", "Take care!".\n\n
+        """
 
 app = FastAPI()
 
@@ -26,6 +66,10 @@ class Question(BaseModel):
     logged_role: str
     session_id: str
 
+class CacheInvalidation(BaseModel):
+    club_id: str = None
+    kind: str = "club"
+
 @app.post("/ask")
 async def ask_question(question: Question):
     try:
@@ -40,19 +84,23 @@ async def ask_question(question: Question):
 
 
             ##########CATCHERRRR##########
-            # Fetch the latest chat history (1 or 3 entries as you prefer)
-            chat_history = history_parser(question.user_id, question.session_id, limit=1)
-            print(f"Chat history: {chat_history}")
-            # Check for recommender triggers in history
-            if classify_return_recommendation(chat_history):
+            # Only run a follow-up classifier when the last answer left a prompt open. Sync Supabase
+            # reads run in worker threads so they never block the event loop
+            pending_prompt = await asyncio.to_thread(get_pending_prompt, question.session_id, question.user_id)
+            print(f"Pending prompt: {pending_prompt}")
+            if pending_prompt:
+                await asyncio.to_thread(clear_pending_prompt, question.session_id, question.user_id)
+
+            if pending_prompt == AWAITING_INTERESTS and is_interests_answer(question.user_question):
                 print(f"classify_return_reccomendation:)")
                 # Go straight to recommendation
-                result = recommend_clubs(
+                result = await asyncio.to_thread(
+                    recommend_clubs,
                     question.user_question,
                     question.user_id,
                     question.session_id
                 )
-                save_chat_history(
+                await save_chat_history(
                     question.session_id,
                     question.user_id,
                     question.user_question,
@@ -61,17 +109,21 @@ async def ask_question(question: Question):
                 return {
                     "answer": result["answer"],
                 }
-            
-            classify_return_all_clubs_store = classify_return_all_clubs(chat_history,question.user_question)
+
+            classify_return_all_clubs_store = "continue"
+            if pending_prompt == AWAITING_ALL_CLUBS:
+                chat_history = await history_parser_async(question.user_id, question.session_id, limit=1)
+                print(f"Chat history: {chat_history}")
+                classify_return_all_clubs_store = await classify_async("catcher", question.user_question, prefix=chat_history)
             
 
             if (classify_return_all_clubs_store == "yes"):
                 
 
-                context_text = get_all_clubs()
+                context_text = await get_all_clubs()
                 context_text += "Parse this data of clubs in to a description of what clubs are there and what they do. And act as a chatbot when displaying the data."
-                llm_response = query_gemini_llm(question.user_question, context_text, GEMINI_API_KEY)
-                save_chat_history(
+                llm_response = query_gemini_llm(question.user_question, context_text, GEMINI_API_KEY, call_site="answer_clublist", route="all_clubs")
+                await save_chat_history(
                     question.session_id,
                     question.user_id,
                     question.user_question,
@@ -86,7 +138,7 @@ async def ask_question(question: Question):
 
                 
 
-                save_chat_history(
+                await save_chat_history(
                     question.session_id,
                     question.user_id,
                     question.user_question,
@@ -103,16 +155,19 @@ async def ask_question(question: Question):
             # If not triggered, continue as normal    
             # 
 
-            history = history_parser(question.user_id, question.session_id, limit=3)
+            # Self-contained questions skip the chat_history read and the extra prompt tokens
+            history = ""
+            if needs_history(question.user_question, question.session_id, question.user_id):
+                history = await history_context(question.session_id, question.user_id, limit=3)
  
             history += "Current Question: " + question.user_question + "\n"
             
-            classification_noid = classify_question_noid(question.user_question,prefix=history)
+            classification_noid = await classify_async("noid", question.user_question, prefix=history)
             print(f"Classification noid: {classification_noid}")
 
             if(classification_noid == "single"):
 
-                save_chat_history(
+                await save_chat_history(
                     question.session_id,
                     question.user_id,
                     question.user_question,
@@ -126,11 +181,11 @@ async def ask_question(question: Question):
             if(classification_noid == "clublist"):
                 print(f"clublist)")
                 
-                context_text = get_all_clubs()
+                context_text = await get_all_clubs()
                 context_text += "Parse this data of clubs in to a description of what clubs are there and what they do."
-                llm_response = query_gemini_llm(question.user_question, context_text, GEMINI_API_KEY)
+                llm_response = query_gemini_llm(question.user_question, context_text, GEMINI_API_KEY, call_site="answer_clublist", route="clublist")
 
-                save_chat_history(
+                await save_chat_history(
                     question.session_id,
                     question.user_id,
                     question.user_question,
@@ -146,13 +201,14 @@ async def ask_question(question: Question):
             if(classification_noid == "recommendation"):
                 #print(f"Context for recommendation: {context_text}")
                 print(f"reccommendation)")
-                result = recommend_clubs(
+                result = await asyncio.to_thread(
+                    recommend_clubs,
                     question.user_question,
                     question.user_id,
                     question.session_id
                 )
                 llm_response = result["answer"]
-                save_chat_history(
+                await save_chat_history(
                     question.session_id,
                     question.user_id,
                     question.user_question,
@@ -168,7 +224,7 @@ async def ask_question(question: Question):
                 # Use the vector database implementation with Gemini
                 llm_response = query_pdf(question.user_question,mode="general_club", context_prefix="")
 
-                save_chat_history(
+                await save_chat_history(
                     question.session_id,
                     question.user_id,
                     question.user_question,
@@ -186,33 +242,38 @@ async def ask_question(question: Question):
 
         ###############Section when the user has selected a club###############
 
-        # For Answering, enhance the context with specific instructions
-        context_text = """\n\nIMPORTANT: Keep your answers concise and to the point. Avoid lengthy explanations.
-        STRICTLY FOLLOW CONTEXT RULES!\n\n 
-        STRICTLY FOLLOW THIS: If the question uses vague pronouns (like "it", "they", "this", "that", etc.) or refers implicitly to something already discussed (e.g., previous messages or the current state of the club), always use the most recent Q&A to determine what the user is asking.\n\n
-        Examples:\n
-
-        "Can I join it?" → Ask: Join what? → If the previous message said "no events", then reply that there’s nothing to join right now.\n
-
-        "When does it start?" → Check what “it” refers to in the last message.\n
-
-        "Is that available online?" → Identify what “that” is from earlier replies.\n
-
-        Only use FAQs directly if the current conversation clearly clarify the intent \n\n
+        # Near-verbatim copy of a stored FAQ: answer it directly, no classifier or answer LLM call.
+        # Follow-ups ("when is it?") depend on earlier turns, so they always go to the LLM.
+        if question.logged_role != "clubmanager" and FAQ_DIRECT_ANSWER and not follow_up_reason(question.user_question):
+            faq_answer = await asyncio.to_thread(direct_faq_answer, question.club_id, question.user_question)
+            if faq_answer:
+                await save_chat_history(
+                    question.session_id,
+                    question.user_id,
+                    question.user_question,
+                    faq_answer
+                )
+                return {
+                    "answer": faq_answer,
+                }
 
-        GREET BACK IF ITS A GREETING QUESTION OR THANK YOU QUESTION. Examples: "Thank you!", "Hi, how are you?", "Hello, can you help me?", "Thanks for your assistance!", "I appreciate your help!", "Goodbye!", "See you later!", "Take care!".\n\n
-        """
+        # For Answering, the fixed instructions are sent as the static prompt prefix (CLUB_ANSWER_PREFIX)
+        context_text = ""
 
         #Add history to context
         
-        history= history_parser(question.user_id, question.session_id,limit=3)
+        history = ""
+        if needs_history(question.user_question, question.session_id, question.user_id):
+            history = await history_context(question.session_id, question.user_id, limit=3)
         context_text += history
 
         classification = ""
+        club_context = ""
         # Step 1: Classify the question
         if question.logged_role != "clubmanager":
-            history += "\n" + format_faqs_for_llm_club(question.club_id, question.user_id)
-            classification = classify_question(question.user_question,"gemini",prefix=history)
+            club_context = await asyncio.to_thread(format_faqs_for_llm_club, question.club_id, question.user_id,
+                                                   question=question.user_question)
+            classification = await classify_async("question", question.user_question, prefix=history, context=club_context)
             print(f"Classification: {classification}")
         
 
@@ -220,13 +281,14 @@ async def ask_question(question: Question):
         if(classification == "Club" and question.logged_role != "clubmanager"):
         
             # Step 2: Format FAQs and get context
-            context_text += format_faqs_for_llm_club(question.club_id, question.user_id)
+            context_text += club_context
 
-            print(f"Context for club: {context_text}")
+            print(f"Context for club: ~{estimate_tokens(context_text)} tokens")
             
             # Step 3: Query Groq LLM
-            llm_response = query_gemini_llm(question.user_question, context_text, GEMINI_API_KEY)
-            save_chat_history(
+            llm_response = query_gemini_llm(question.user_question, context_text, GEMINI_API_KEY, call_site="answer_club", route=f"club_faqs_{FAQ_CONTEXT_MODE}",
+                                            static_prefix=CLUB_ANSWER_PREFIX)
+            await save_chat_history(
             question.session_id,
             question.user_id,
             question.user_question,
@@ -245,7 +307,7 @@ async def ask_question(question: Question):
             # Step 2: Format FAQs and get context
             llm_response = query_pdf(question.user_question,mode="website_student", context_prefix="{context_text}")
             
-            save_chat_history(
+            await save_chat_history(
             question.session_id,
             question.user_id,
             question.user_question,
@@ -259,7 +321,7 @@ async def ask_question(question: Question):
         
         if(classification == "General" and question.logged_role != "clubmanager"):
 
-            save_chat_history(
+            await save_chat_history(
             question.session_id,
             question.user_id,
             question.user_question,
@@ -276,9 +338,9 @@ async def ask_question(question: Question):
         # Handle the case where the question is about the website, role clubmanager
         if question.logged_role == "clubmanager":
         # load existing edit state (if any)
-            state = load_state(question.session_id, question.user_id)
+            state = await asyncio.to_thread(state_store.load, question.session_id, question.user_id)
 
-            edit_response = handle_club_edit(question, state, GEMINI_API_KEY)
+            edit_response = await asyncio.to_thread(handle_club_edit, question, state, GEMINI_API_KEY, history=history)
             if edit_response:
                 return edit_response
             
@@ -289,7 +351,7 @@ async def ask_question(question: Question):
                 mode="website_manager",
                 context_prefix=history  # or your own prefix
             )
-            save_chat_history(
+            await save_chat_history(
                 question.session_id,
                 question.user_id,
                 question.user_question,
@@ -302,6 +364,13 @@ async def ask_question(question: Question):
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Persist this turn's edit/dialogue state changes as a single write; a failed
+        # write must not replace the answer (or the original error) with a new 500
+        try:
+            await asyncio.to_thread(state_store.flush, question.session_id, state_user_id(question.user_id))
+        except Exception as e:
+            print(f"Error saving chat state: {e}")
 
 @app.get("/")
 async def root():
@@ -311,6 +380,65 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/stats")
+async def stats():
+    return {
+        "db_pool": get_pool_stats(),
+        "chat_state": state_store.get_stats(),
+        "local_classifier": get_local_classifier_stats(),
+        "safety": get_safety_stats(),
+        "centroid_router": get_centroid_router_stats(),
+        "query_embeddings": get_embedding_stats(),
+        "tokens": get_token_usage(),
+        "classifier_batching": get_batcher_stats(),
+        "history_detector": get_history_detector_stats(),
+        "club_index": get_club_index_stats(),
+        "interests": get_interest_stats(),
+        "recommendation_sets": get_recommendation_cache_stats(),
+        "club_context": get_club_context_stats(),
+        "faq_direct_answers": get_faq_match_stats(),
+        "session_summaries": get_summary_stats(),
+        "prompt_cache": get_prompt_cache_stats(),
+        "edit_parser": get_edit_parser_stats(),
+        "club_updates": get_club_update_stats(),
+        "structured_output": get_structured_output_stats(),
+        "shared_cache": get_shared_cache_stats(),
+        "worker": {"pid": os.getpid()},
+    }
+
+@app.post("/cache/invalidate")
+async def invalidate_cache(body: CacheInvalidation, x_cache_token: str = Header(None)):
+    """Hook for club, FAQ ("faqs") and event ("events") changes made outside this service."""
+    if not CACHE_INVALIDATION_TOKEN:
+        raise HTTPException(status_code=503, detail="Cache invalidation is disabled: CACHE_INVALIDATION_TOKEN is not set")
+    if not hmac.compare_digest(x_cache_token or "", CACHE_INVALIDATION_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid cache token")
+    if body.kind not in ("club", "faqs", "events"):
+        raise HTTPException(status_code=400, detail="kind must be 'club', 'faqs' or 'events'")
+    invalidate_club_context(body.club_id, body.kind)
+    if body.kind == "club":
+        club_index.invalidate()
+    return {"status": "invalidated", "club_id": body.club_id, "kind": body.kind}
+
+async def refresh_club_index():
+    """Re-check the club catalog periodically; a change rebuilds the index and the recommendation sets."""
+    while True:
+        try:
+            await asyncio.to_thread(club_index.build)
+        except Exception as e:
+            print(f"Club index refresh error: {e}")
+        await asyncio.sleep(CLUB_INDEX_REFRESH_SECONDS)
+
+@app.on_event("startup")
+async def startup():
+    # First build precomputes the recommendation sets before traffic needs them
+    app.state.club_index_refresh = asyncio.create_task(refresh_club_index())
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.club_index_refresh.cancel()
+    await supabase_pool.close()
+
 
 
 # For testing directly
@@ -0,0 +1,245 @@
+import os
+import asyncio
+from dotenv import load_dotenv
+from ai_init import query_gemini_llm
+from cleaner import parse_llm_json_response
+from classifier import classify_locally, classify_question, classify_question_noid, classify_catcher_all_clubs
+from token_budget import truncate_to_budget
+
+# Load environment variables
+load_dotenv()
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+# Set CLASSIFIER_BATCHING=1 to merge concurrent classifier LLM calls into one request
+CLASSIFIER_BATCHING = os.getenv("CLASSIFIER_BATCHING", "0") == "1"
+CLASSIFIER_BATCH_MAX_SIZE = int(os.getenv("CLASSIFIER_BATCH_MAX_SIZE", "16"))
+CLASSIFIER_BATCH_MAX_WAIT_MS = float(os.getenv("CLASSIFIER_BATCH_MAX_WAIT_MS", "15"))
+# Per-item history kept in a batched prompt (tokens, most recent lines kept)
+CLASSIFIER_BATCH_ITEM_CONTEXT_TOKENS = int(os.getenv("CLASSIFIER_BATCH_ITEM_CONTEXT_TOKENS", "300"))
+# Per-item club context kept in a batched prompt (tokens, opening club details kept)
+CLASSIFIER_BATCH_ITEM_CLUB_TOKENS = int(os.getenv("CLASSIFIER_BATCH_ITEM_CLUB_TOKENS", "300"))
+
+# Labels and one-line definitions per route, condensed from the single-item prompts
+ROUTE_SPECS = {
+    "question": {
+        "labels": ["Website", "Club", "General"],
+        "default": "Club",
+        "single": classify_question,
+        "instructions": (
+            "Website: how to use the website (sign up, log in, password, profile, navigation).\n"
+            "Club: the selected club's purpose, schedule, membership, events or contacts.\n"
+            "General: the university or anything not about the website or the club."
+        ),
+    },
+    "noid": {
+        "labels": ["single", "clublist", "recommendation", "general"],
+        "default": "general",
+        "single": classify_question_noid,
+        "instructions": (
+            "single: about one specific, named club.\n"
+            "clublist: asks for a list or overview of all clubs.\n"
+            "recommendation: wants suggestions, or states interests/preferences for choosing a club.\n"
+            "general: the university, the website or the chatbot itself."
+        ),
+    },
+    "catcher": {
+        "labels": ["yes", "no", "continue"],
+        "default": "continue",
+        "single": classify_catcher_all_clubs,
+        "instructions": (
+            "The assistant last asked: \"Would you like to see all available clubs?\"\n"
+            "yes: the user agrees to see the full list.\n"
+            "no: the user declines.\n"
+            "continue: anything else (a specific interest, question or request)."
+        ),
+    },
+}
+
+
+def build_batch_prompt(route, items):
+    """
+    Build one numbered multi-item classification prompt.
+
+    Args:
+        route: Route key in ROUTE_SPECS.
+        items: List of (user_question, prefix, context) tuples: the history is
+            cut to its most recent lines, the club context to its opening.
+    """
+    spec = ROUTE_SPECS[route]
+    prompt = (
+        "You are a classifier. Classify EACH numbered user message below into exactly one label.\n"
+        "If a message uses vague pronouns or refers to earlier turns, use that item's history.\n\n"
+        f"Labels:\n{spec['instructions']}\n\n"
+    )
+    for i, (user_question, prefix, context) in enumerate(items, 1):
+        history, _ = truncate_to_budget(prefix or "", CLASSIFIER_BATCH_ITEM_CONTEXT_TOKENS, "tail")
+        club, _ = truncate_to_budget(context or "", CLASSIFIER_BATCH_ITEM_CLUB_TOKENS, "head")
+        prompt += f"### Item {i}\n"
+        if history.strip():
+            prompt += f"History:\n{history.strip()}\n"
+        if club.strip():
+            prompt += f"Club:\n{club.strip()}\n"
+        prompt += f"Message: {user_question}\n\n"
+    prompt += (
+        "Respond with ONLY a JSON object mapping each item number to its label, e.g. "
+        + "{" + ", ".join(f'"{i}": "{spec["labels"][0]}"' for i in range(1, min(len(items), 2) + 1)) + "}"
+    )
+    return prompt
+
+
+def batch_schema(route, count):
+    """Response schema for a batched reply: item number -> one of the route's labels."""
+    labels = ROUTE_SPECS[route]["labels"]
+    return {
+        "type": "object",
+        "properties": {str(i): {"type": "string", "enum": labels} for i in range(1, count + 1)},
+        "required": [str(i) for i in range(1, count + 1)],
+    }
+
+
+def parse_batch_reply(route, raw, count):
+    """Map a JSON reply back to labels; items with a missing or invalid label get None."""
+    labels = ROUTE_SPECS[route]["labels"]
+    try:
+        data = parse_llm_json_response(raw)
+    except (ValueError, TypeError):
+        return [None] * count
+    results = []
+    for i in range(1, count + 1):
+        value = str(data.get(str(i), "")).strip().lower() if isinstance(data, dict) else ""
+        results.append(next((label for label in labels if label.lower() == value), None))
+    return results
+
+
+class ClassificationBatcher:
+    """
+    Collects classifier LLM requests for one route that arrive within a few
+    milliseconds of each other and sends them as a single numbered prompt.
+
+    The first request in a window starts a timer; the batch is sent when it
+    reaches `max_batch_size` or `max_wait_ms` elapses. Each caller awaits its
+    own future. A batch of one, or any item the batched reply leaves
+    unlabelled, goes through the normal single-item classifier instead.
+    """
+
+    def __init__(self, route, max_batch_size=CLASSIFIER_BATCH_MAX_SIZE, max_wait_ms=CLASSIFIER_BATCH_MAX_WAIT_MS):
+        self.route = route
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = []
+        self._timer = None
+        # Batches being sent (kept referenced until done, or they could be collected mid-flight)
+        self._running = set()
+        self.stats = {"items": 0, "batches": 0, "llm_calls": 0, "single_fallbacks": 0}
+
+    async def classify(self, user_question, prefix="", context=""):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((user_question, prefix, context, future))
+        self.stats["items"] += 1
+        if len(self._queue) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._queue = self._queue[:self.max_batch_size], self._queue[self.max_batch_size:]
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+        if self._queue:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+
+    async def _run(self, batch):
+        spec = ROUTE_SPECS[self.route]
+        self.stats["batches"] += 1
+        try:
+            if len(batch) == 1:
+                labels = [None]
+            else:
+                prompt = build_batch_prompt(self.route, [(q, p, c) for q, p, c, _ in batch])
+                self.stats["llm_calls"] += 1
+                # Schema-constrained JSON; items still left unlabelled fall back to single calls below
+                raw = await asyncio.to_thread(
+                    query_gemini_llm, prompt, "", GEMINI_API_KEY, call_site=f"classify_{self.route}_batch",
+                    response_schema=batch_schema(self.route, len(batch))
+                )
+                labels = parse_batch_reply(self.route, raw, len(batch))
+
+            # Items the batched reply left unlabelled go through the single-item classifier
+            missing = [i for i, label in enumerate(labels) if label is None]
+            self.stats["single_fallbacks"] += len(missing)
+            self.stats["llm_calls"] += len(missing)
+            retried = await asyncio.gather(*[
+                asyncio.to_thread(spec["single"], batch[i][0], prefix=_single_prefix(batch[i][1], batch[i][2]),
+                                  local_first=False)
+                for i in missing
+            ])
+            for i, label in zip(missing, retried):
+                labels[i] = label
+
+            for (_, _, _, future), label in zip(batch, labels):
+                if not future.done():
+                    future.set_result(label)
+        except Exception as e:
+            print(f"Batched classification error ({self.route}): {e}")
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_result(spec["default"])
+
+    def get_stats(self):
+        batches = self.stats["batches"]
+        return {
+            **self.stats,
+            "avg_batch_size": round(self.stats["items"] / batches, 2) if batches else 0.0,
+            "calls_saved": self.stats["items"] - self.stats["llm_calls"],
+        }
+
+
+def _single_prefix(prefix, context):
+    # The single-item classifiers take one prefix: history first, then the club context
+    return f"{prefix}\n{context}" if context else prefix
+
+
+_batchers = {}
+
+
+def get_batcher(route):
+    if route not in _batchers:
+        _batchers[route] = ClassificationBatcher(route)
+    return _batchers[route]
+
+
+async def classify_async(route, user_question, prefix="", context=""):
+    """
+    Classify a question for a route without blocking the event loop.
+
+    The local classifier answers first (in a worker thread, since the
+    centroid router may embed the question); otherwise the request joins the
+    route's micro-batch (CLASSIFIER_BATCHING=1) or runs the single-item
+    LLM classifier in a worker thread.
+
+    Args:
+        route: Route key in ROUTE_SPECS.
+        user_question: The question to classify.
+        prefix: Conversation history.
+        context: Club context for the "question" route, kept apart from the
+            history so batching can shorten it without losing the history.
+    """
+    local = await asyncio.to_thread(classify_locally, route, user_question)
+    if local:
+        return local
+    if CLASSIFIER_BATCHING:
+        return await get_batcher(route).classify(user_question, prefix, context)
+    return await asyncio.to_thread(ROUTE_SPECS[route]["single"], user_question, prefix=_single_prefix(prefix, context),
+                                   local_first=False)
+
+
+def get_batcher_stats():
+    return {route: batcher.get_stats() for route, batcher in _batchers.items()}
@@ -1,62 +1,115 @@
-import os
-from dotenv import load_dotenv
-from ai_init import query_groq_llm, query_gemini_llm
+import re
+import threading
+from local_classifier import normalize
+from supabase_pool import get_last_turn
 
+# Pronouns and ellipsis phrases that only make sense with an earlier turn
+REFERENCE_PATTERN = re.compile(
+    r"\b(it|its|it's|they|them|their|theirs|he|she|him|her|this|that|those|these|then|"
+    r"one|ones|same|other|another|else|former|latter|above|again)\b"
+)
+ELLIPSIS_PATTERN = re.compile(
+    r"\b(tell me more|explain more|more about|more info|more details|what about|how about|what else|"
+    r"why not|how so|such as|like what|for example|the first|the second|the last)\b"
+)
+# Follow-ups that start mid-sentence ("and on weekends?", "also the fee?")
+CONTINUATION_START = re.compile(r"^(and|but|or|so|also|then|plus|what if|only|just)\b")
+# "this club", "that website" name their own subject
+SELF_CONTAINED_REFERENCE = re.compile(
+    r"\b(this|that|these|those) (club|clubs|website|site|page|university|campus|chatbot|app|year|semester|week|weekend|month)\b"
+)
+# Short messages that need no history (greetings and thanks are answered directly)
+SOCIAL_PATTERN = re.compile(
+    r"^(hi|hello|hey|good (morning|afternoon|evening)|thanks|thank you|thx|bye|goodbye|see you|cheers)\b"
+)
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "is", "are", "was", "were", "be", "to", "of", "in", "on", "at",
+    "for", "with", "about", "what", "when", "where", "who", "how", "why", "which", "do", "does", "did",
+    "can", "could", "would", "should", "will", "i", "me", "my", "you", "your", "we", "our", "there",
+    "any", "some", "have", "has", "tell", "please", "club", "clubs", "like", "want", "know",
+}
+# Replies this short are treated as answers to the previous turn
+SHORT_REPLY_TOKENS = 2
+# Questions up to this length that reuse a content word from the last answer continue its topic
+CONTINUITY_MAX_TOKENS = 8
 
-# Load environment variables from .env file
-load_dotenv()
+_lock = threading.Lock()
+_stats = {"checked": 0, "needed": 0, "reasons": {}}
 
-# Get API keys from environment variables
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
-def need_history(user_question: str, provider: str = "gemini") -> str:
+def _content_words(text):
+    return {w for w in normalize(text).split() if len(w) > 3 and w not in STOPWORDS}
+
+
+def follow_up_reason(user_question: str, last_turn: dict = None):
     """
-    Determine whether the chat history is needed based on the user's question.
-    
+    Decide locally whether a question depends on earlier turns.
+
+    Checks, in order: pronoun/ellipsis cues, a sentence that starts mid-thought,
+    very short replies, and (when the previous turn is known) topic continuity
+    with the last answer.
+
     Args:
-        user_question: The question text to determine
-        provider: Which LLM provider to use - "openrouter" or "groq" (default: "openrouter")
-        
+        user_question: The question text.
+        last_turn: The session's previous {"question", "answer"}, if known.
+
     Returns:
-        str: Classification result ('Yes' or 'No').
+        str: The cue that fired ("reference", "ellipsis", "continuation",
+            "short_reply", "topic"), or None for a self-contained question.
     """
-    try:
-        # Classification prompt
-        context_text = """
-    You are a classifier. Your task is to analyze a user question and determine if previous chat history is needed to fully understand and answer the question.
+    text = normalize(user_question)
+    if not text or SOCIAL_PATTERN.match(text):
+        return None
+    tokens = text.split()
 
-    Respond with:
-    1. Yes: If the question contains pronouns (it, they, this, that, these, those) without clear referents, refers to previous topics implicitly, or seems to be a follow-up question. Examples: "Can I join it?", "When does it start?", "What about the other option?", "Is that available online?"
+    if ELLIPSIS_PATTERN.search(text):
+        return "ellipsis"
+    if REFERENCE_PATTERN.search(SELF_CONTAINED_REFERENCE.sub(" ", text)):
+        return "reference"
+    if CONTINUATION_START.match(text):
+        return "continuation"
+    if len(tokens) <= SHORT_REPLY_TOKENS:
+        return "short_reply"
+    if last_turn and len(tokens) <= CONTINUITY_MAX_TOKENS:
+        if _content_words(user_question) & _content_words(last_turn.get("answer", "")):
+            return "topic"
+    return None
 
-    2. No: If the question is self-contained and can be understood without any prior context. Examples: "What is the purpose of this club?", "How do I reset my password?", "Where can I find information about membership fees?"
 
-    **STRICTLY respond with one word only:** Yes or No
+def needs_history(user_question: str, session_id: str = None, user_id: str = None) -> bool:
+    """
+    Whether chat history should be fetched and put in the prompts for this question.
 
-    Now classify the following question:
+    Runs on the CPU only; the previous turn for the topic check comes from the
+    in-process cache kept by supabase_pool, so no database read happens here.
     """
-        
-        # Choose provider based on parameter
-        if provider.lower() == "groq":
-            classification = query_groq_llm(user_question, context_text, GROQ_API_KEY)
-        else:
-            classification = query_gemini_llm(user_question, context_text, OPENROUTER_API_KEY)
-        
-        # Clean up response to ensure it's just the classification
-        classification = classification.strip()
-        
-        # Validate the result
-        valid_classifications = ["Yes", "No"]
-        if classification not in valid_classifications:
-            # If response contains unexpected content, attempt to extract correct value
-            for valid in valid_classifications:
-                if valid.lower() in classification.lower():
-                    return valid
-            # Default to "Club" if we can't determine the classification
-            return "Yes"
-        
-        return classification
-    except Exception as e:
-        print(f"Classification error with {provider} provider: {str(e)}")
-        # Default to Club if there's an error
-        return "Yes"
\ No newline at end of file
+    last_turn = get_last_turn(session_id, user_id) if session_id else None
+    reason = follow_up_reason(user_question, last_turn)
+    with _lock:
+        _stats["checked"] += 1
+        if reason:
+            _stats["needed"] += 1
+            _stats["reasons"][reason] = _stats["reasons"].get(reason, 0) + 1
+    return reason is not None
+
+
+def need_history(user_question: str, provider: str = "gemini") -> str:
+    """
+    Determine whether the chat history is needed based on the user's question.
+
+    Kept for callers of the old LLM classifier; `provider` is ignored.
+
+    Returns:
+        str: Classification result ('Yes' or 'No').
+    """
+    return "Yes" if follow_up_reason(user_question) else "No"
+
+
+def get_history_detector_stats():
+    with _lock:
+        checked = _stats["checked"]
+        return {
+            **_stats,
+            "reasons": dict(_stats["reasons"]),
+            "skip_rate": round((checked - _stats["needed"]) / checked, 3) if checked else 0.0,
+        }
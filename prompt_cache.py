@@ -0,0 +1,163 @@
+import os
+import time
+import hashlib
+import threading
+from datetime import timedelta
+from dotenv import load_dotenv
+from token_budget import estimate_tokens
+from shared_cache import create_cache
+
+# Load environment variables
+load_dotenv()
+
+# Set PROMPT_CACHE_ENABLED=0 to always send the full prompt
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "1") == "1"
+# Lifetime of a cached prefix at the provider; handles are recreated shortly before expiry
+PROMPT_CACHE_TTL_SECONDS = int(os.getenv("PROMPT_CACHE_TTL_SECONDS", "3600"))
+# Providers refuse to cache short contents; smaller prefixes are sent inline without trying.
+# Every prefix in use today (classifiers, club answers) is below this, so caching is currently inert
+PROMPT_CACHE_MIN_TOKENS = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "1024"))
+# After a failed registration, wait this long before trying the same prefix again
+PROMPT_CACHE_RETRY_SECONDS = int(os.getenv("PROMPT_CACHE_RETRY_SECONDS", "600"))
+# Recreate a handle when less than this many seconds of its TTL are left
+PROMPT_CACHE_REFRESH_MARGIN_SECONDS = 60
+
+
+class GeminiCacheBackend:
+    """Gemini context caching: the prefix is stored as the cached system instruction."""
+
+    def create(self, model, static_text, ttl_seconds):
+        from google.generativeai import caching
+        return caching.CachedContent.create(
+            model=model,
+            display_name=f"prefix-{hashlib.sha256(static_text.encode('utf-8')).hexdigest()[:16]}",
+            system_instruction=static_text,
+            ttl=timedelta(seconds=ttl_seconds),
+        )
+
+    def model_for(self, handle):
+        import google.generativeai as genai
+        return genai.GenerativeModel.from_cached_content(cached_content=handle)
+
+    def delete(self, handle):
+        handle.delete()
+
+
+class PromptPrefixCache:
+    """
+    Provider-side cache handles for static prompt prefixes.
+
+    Each distinct (model, prefix) pair is registered once with the backend and
+    its handle reused until shortly before the TTL runs out. A prefix the
+    provider refuses (too short, unsupported model, no caching at all) is
+    remembered for PROMPT_CACHE_RETRY_SECONDS, so callers simply send the full
+    prompt inline in the meantime.
+
+    Handles and refusals are kept in the shared cache, so every worker on the
+    host reuses one registration per prefix instead of creating its own.
+    """
+
+    def __init__(self, backend=None, ttl=PROMPT_CACHE_TTL_SECONDS, min_tokens=PROMPT_CACHE_MIN_TOKENS,
+                 retry_seconds=PROMPT_CACHE_RETRY_SECONDS, enabled=PROMPT_CACHE_ENABLED):
+        self.backend = backend if backend is not None else GeminiCacheBackend()
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.retry_seconds = retry_seconds
+        self.enabled = enabled
+        # (model, digest) -> (handle, expires_at)
+        self._handles = create_cache("prompt_prefixes", maxsize=256,
+                                     ttl=max(ttl - PROMPT_CACHE_REFRESH_MARGIN_SECONDS, 1))
+        # (model, digest) -> retry_at
+        self._failed = create_cache("prompt_prefix_failures", maxsize=256, ttl=retry_seconds)
+        # (model, digest) -> handle, for the prefixes registered by this process
+        self._created = {}
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "hits": 0, "inline": 0, "errors": 0, "dropped": 0, "cached_tokens": 0}
+
+    @staticmethod
+    def key(model, static_text):
+        return model, hashlib.sha256(static_text.encode("utf-8")).hexdigest()
+
+    def handle(self, model, static_text):
+        """
+        Return a cache handle for the prefix, registering it if needed.
+
+        Returns:
+            The backend handle, or None when the prefix must be sent inline.
+        """
+        if not self.enabled or not static_text or estimate_tokens(static_text) < self.min_tokens:
+            self._count("inline")
+            return None
+        key = self.key(model, static_text)
+        now = time.time()
+        with self._lock:
+            cached = self._handles.get(key)
+            if cached and cached[1] - PROMPT_CACHE_REFRESH_MARGIN_SECONDS > now:
+                self.stats["hits"] += 1
+                return cached[0]
+            if (self._failed.get(key) or 0) > now:
+                self.stats["inline"] += 1
+                return None
+            # Create under the lock so concurrent requests register a prefix only once
+            try:
+                handle = self.backend.create(model, static_text, self.ttl)
+            except Exception as e:
+                print(f"Prompt prefix caching unavailable for {model}: {e}")
+                self._failed.set(key, now + self.retry_seconds)
+                self._handles.delete(key)
+                self._created.pop(key, None)
+                self.stats["errors"] += 1
+                self.stats["inline"] += 1
+                return None
+            self._handles.set(key, (handle, now + self.ttl))
+            self._failed.delete(key)
+            self._created[key] = handle
+            self.stats["created"] += 1
+            return handle
+
+    def drop(self, model, static_text):
+        """Forget a handle the provider no longer accepts (e.g. it expired early)."""
+        key = self.key(model, static_text)
+        with self._lock:
+            if self._handles.get(key) is not None:
+                self.stats["dropped"] += 1
+            self._handles.delete(key)
+            self._created.pop(key, None)
+
+    def record_cached_tokens(self, count):
+        self._count("cached_tokens", count or 0)
+
+    def clear(self):
+        """Delete every prefix this process registered at the provider (best effort)."""
+        with self._lock:
+            handles = list(self._created.values())
+            self._created.clear()
+            self._handles.clear()
+            self._failed.clear()
+        for handle in handles:
+            try:
+                self.backend.delete(handle)
+            except Exception as e:
+                print(f"Error deleting cached prompt prefix: {e}")
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def get_stats(self):
+        with self._lock:
+            calls = self.stats["hits"] + self.stats["created"] + self.stats["inline"]
+            return {
+                **self.stats,
+                "enabled": self.enabled,
+                "prefixes": len(self._created),
+                "hit_rate": round(self.stats["hits"] / calls, 3) if calls else 0.0,
+            }
+
+
+# Shared cache of Gemini prefix handles
+prompt_prefix_cache = PromptPrefixCache()
+
+
+def get_prompt_cache_stats():
+    return prompt_prefix_cache.get_stats()
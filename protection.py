@@ -1,6 +1,11 @@
 import os
+import re
+import time
+import threading
+import unicodedata
 from dotenv import load_dotenv
 from ai_init import query_gemini_llm, query_groq_llm
+from shared_cache import create_cache
 
 # Load environment variables
 load_dotenv()
@@ -9,9 +14,116 @@ load_dotenv()
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+SAFETY_CACHE_SIZE = int(os.getenv("SAFETY_CACHE_SIZE", "5000"))
+SAFETY_CACHE_TTL_SECONDS = int(os.getenv("SAFETY_CACHE_TTL_SECONDS", "86400"))
+SAFETY_MAX_QUESTION_CHARS = int(os.getenv("SAFETY_MAX_QUESTION_CHARS", "1000"))
+# Questions reaching the LLM already passed the deny-list, so by default an
+# LLM outage lets them through instead of blocking every user.
+SAFETY_FAIL_OPEN = os.getenv("SAFETY_FAIL_OPEN", "1") == "1"
+
+# Greetings, thanks and short answers to a previous question
+ALLOW_PATTERN = re.compile(
+    r"^((hi|hello|hey|hiya|good (morning|afternoon|evening)|thanks|thank you|thx|ty|"
+    r"yes|yeah|yep|yup|no|nope|nah|ok|okay|sure|alright|maybe|not sure|i don't know|dont know|idk|"
+    r"bye|goodbye|see you|see you later|take care|please|help|can you help me|how are you)"
+    r"( there| so much| a lot| please| thanks| again)?\s*)+$"
+)
+
+# Prompt-injection, system-probing and abuse patterns
+DENY_PATTERNS = [
+    re.compile(r"\b(ignore|disregard|forget|override)\b.{0,40}\b(previous|prior|above|earlier|all|your)\b.{0,20}\b(instructions?|rules|prompts?|guidelines)\b"),
+    re.compile(r"\b(system|hidden|initial|original|developer)\s+(prompt|message|instructions?)\b"),
+    re.compile(r"\b(context|prompt|instructions?|rules|configuration)\s+of\s+(the|this|your)\s+(system|bot|chatbot|model|assistant|ai)\b"),
+    re.compile(r"\b(reveal|show|print|repeat|leak|tell me)\b.{0,30}\b(your\s+(prompt|instructions|system|context|rules|configuration|api keys?)|system\s+prompt)\b"),
+    re.compile(r"\b(jailbreak|developer mode|dan mode|do anything now|you are now|pretend (to be|you are)|act as (an? )?(unfiltered|evil|hacker))\b"),
+    re.compile(r"\b(api[_ ]?key|secret key|supabase[_ ]?key|access token|password of)\b"),
+    re.compile(r"<\s*script|\bdrop\s+table\b|\bunion\s+(all\s+)?select\b|\{\{.*\}\}"),
+    re.compile(r"\b(fuck|shit|bitch|cunt|nigg\w*|fag\w*|retard\w*|kill (yourself|urself)|kys)\b"),
+]
+
+# SQL needs its punctuation (*, commas, ;), so this is matched against the raw lower-cased question.
+# It requires statement syntax: "select a club from the list?" stays allowed.
+SQL_PATTERN = re.compile(r"\bselect\s+[\w*,.\s]+?\s+from\s+[\w.]+\s*(\bwhere\b|;|--|$)")
+
+# Verdicts for normalized questions that needed the LLM
+_verdict_cache = create_cache("safety_verdicts", maxsize=SAFETY_CACHE_SIZE, ttl=SAFETY_CACHE_TTL_SECONDS)
+
+_stats_lock = threading.Lock()
+_stats = {
+    layer: {"checked": 0, "allowed": 0, "blocked": 0, "total_ms": 0.0}
+    for layer in ("local", "cache", "llm")
+}
+
+
+def _record(layer, decision, started):
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with _stats_lock:
+        entry = _stats[layer]
+        entry["checked"] += 1
+        entry["total_ms"] += elapsed_ms
+        if decision is True:
+            entry["allowed"] += 1
+        elif decision is False:
+            entry["blocked"] += 1
+
+
+def get_safety_stats():
+    """Per-layer counts of questions seen/decided and average latency."""
+    with _stats_lock:
+        stats = {
+            layer: {
+                "checked": v["checked"],
+                "allowed": v["allowed"],
+                "blocked": v["blocked"],
+                "avg_ms": round(v["total_ms"] / v["checked"], 3) if v["checked"] else 0.0,
+            }
+            for layer, v in _stats.items()
+        }
+    stats["cache"]["size"] = len(_verdict_cache)
+    return stats
+
+
+def normalize_question(user_question: str) -> str:
+    text = unicodedata.normalize("NFKC", user_question or "").lower().replace("’", "'")
+    text = re.sub(r"[^\w\s'<>{}]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def local_safety_check(user_question: str):
+    """
+    Fast deterministic stage of the safety filter.
+
+    Returns:
+        True for clearly safe input, False for clearly unsafe input,
+        None when the question is ambiguous and needs the next layer.
+    """
+    raw = user_question or ""
+    if len(raw) > SAFETY_MAX_QUESTION_CHARS:
+        return False
+    if any(unicodedata.category(ch) == "Cc" and ch not in "\n\r\t" for ch in raw):
+        return False
+
+    text = normalize_question(raw)
+    if not text:
+        return True
+    if any(pattern.search(text) for pattern in DENY_PATTERNS) or SQL_PATTERN.search(raw.lower().strip()):
+        return False
+    if ALLOW_PATTERN.match(text):
+        return True
+
+    # Mostly symbols/digits rather than words looks like an encoded payload
+    letters = sum(ch.isalpha() for ch in raw)
+    if len(raw) >= 20 and letters / len(raw) < 0.4:
+        return False
+    return None
+
+
 def is_question_safe(user_question: str, api_key: str = None, provider: str = "gemini") -> bool:
     """
     Determine if a user question is safe and relevant to the application.
+
+    The check is layered: a local allow/deny stage, then a cache of earlier
+    verdicts, and only ambiguous questions are sent to the LLM.
     
     Args:
         user_question: The question to check
@@ -21,6 +133,32 @@ def is_question_safe(user_question: str, api_key: str = None, provider: str = "g
     Returns:
         bool: True if the question is safe and relevant, False otherwise
     """
+    started = time.perf_counter()
+    verdict = local_safety_check(user_question)
+    _record("local", verdict, started)
+    if verdict is not None:
+        if not verdict:
+            print(f"Filtered unsafe query (local): {user_question}")
+        return verdict
+
+    started = time.perf_counter()
+    key = normalize_question(user_question)
+    verdict = _verdict_cache.get(key)
+    _record("cache", verdict, started)
+    if verdict is not None:
+        return verdict
+
+    started = time.perf_counter()
+    verdict = _llm_safety_check(user_question, api_key, provider)
+    _record("llm", verdict, started)
+    if verdict is None:
+        return SAFETY_FAIL_OPEN
+    _verdict_cache.set(key, verdict)
+    return verdict
+
+
+def _llm_safety_check(user_question: str, api_key: str = None, provider: str = "gemini"):
+    """Ask the LLM; returns True/False, or None if the call failed."""
     # Safety prompt
     protection_prompt = """
 You are a safety filter designed to evaluate user questions. Your goal is to determine if the question is safe and relevant to the context of the club or website topics. 
@@ -44,10 +182,15 @@ Be cautious but not overly restrictive. Err on the side of allowing questions un
         
         # Query the appropriate LLM
         if provider.lower() == "groq":
-            result = query_groq_llm(user_question, protection_prompt, api_key).strip()
+            result = query_groq_llm(user_question, protection_prompt, api_key, call_site="safety").strip()
         else:
-            result = query_gemini_llm(user_question, protection_prompt, api_key).strip()
+            result = query_gemini_llm(user_question, protection_prompt, api_key, call_site="safety").strip()
         
+        # query_gemini_llm reports failures as an "Error: ..." string rather than raising
+        if result.startswith("Error:"):
+            print(f"Safety check error: {result}")
+            return None
+
         # Check if result is safe
         is_safe = result.lower() == "yes"
         
@@ -59,8 +202,8 @@ Be cautious but not overly restrictive. Err on the side of allowing questions un
         
     except Exception as e:
         print(f"Safety check error: {str(e)}")
-        # Default to blocking the question if there's any error
-        return False
+        # No verdict; the caller applies SAFETY_FAIL_OPEN
+        return None
 
 # For testing
 if __name__ == "__main__":
@@ -0,0 +1,103 @@
+import os
+import time
+import threading
+from itertools import combinations
+from dotenv import load_dotenv
+from memory_cache import TTLCache
+from club_index import club_index
+
+# Load environment variables
+load_dotenv()
+
+# Maximum number of interest sets kept (precomputed sets plus ones computed on demand)
+RECOMMENDATION_CACHE_SIZE = int(os.getenv("RECOMMENDATION_CACHE_SIZE", "512"))
+
+
+def interest_key(interests):
+    """Normalized, order-independent key for a set of interests."""
+    return tuple(sorted({i.strip().lower() for i in interests if i and i.strip()}))
+
+
+class RecommendationCache:
+    """
+    Ranked club lists per interest set, versioned by the club catalog.
+
+    `precompute()` ranks every single category and every category pair up
+    front; it runs at startup and is registered as a club index listener so
+    it reruns whenever the catalog changes. Other interest sets are ranked on
+    first request and kept in the same bounded cache. An entry built for an
+    older catalog version is never served.
+    """
+
+    def __init__(self, index=club_index, categories=None, maxsize=RECOMMENDATION_CACHE_SIZE):
+        self.index = index
+        self.categories = categories
+        self.cache = TTLCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.precomputed_at = 0.0
+        self.precomputed_version = None
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "precomputed": 0}
+
+    def _categories(self):
+        if self.categories is None:
+            from recommender import CATEGORIES
+            self.categories = CATEGORIES
+        return self.categories
+
+    def precompute(self, index=None, top_k=None):
+        """Rank every single category and category pair for the current catalog."""
+        from recommender import RECOMMEND_TOP_K
+        top_k = top_k or RECOMMEND_TOP_K
+        categories = [c.lower() for c in self._categories()]
+        interest_sets = [(c,) for c in categories] + list(combinations(categories, 2))
+        start = time.perf_counter()
+        version = self.index.catalog_digest
+        for interests in interest_sets:
+            self.cache.set(interest_key(interests), (version, self.index.rank_categories(list(interests), top_k=top_k)))
+        with self._lock:
+            self.precomputed_at = time.time()
+            self.precomputed_version = version
+            self.stats["precomputed"] = len(interest_sets)
+        print(f"Precomputed {len(interest_sets)} recommendation sets in {time.perf_counter() - start:.3f}s")
+
+    def get_or_compute(self, interests, compute):
+        """
+        Return the ranked clubs for `interests`, computing (and caching) them on a miss.
+
+        Args:
+            interests: List of interest strings.
+            compute: Callable taking the interest list and returning the ranked list.
+        """
+        self.index.ensure_fresh()
+        key = interest_key(interests)
+        version = self.index.catalog_digest
+        entry = self.cache.get(key)
+        with self._lock:
+            if entry is not None and entry[0] == version:
+                self.stats["hits"] += 1
+                return entry[1]
+            self.stats["stale" if entry is not None else "misses"] += 1
+        ranked = compute(interests)
+        self.cache.set(key, (version, ranked))
+        return ranked
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"] + self.stats["stale"]
+            return {
+                **self.stats,
+                "size": len(self.cache),
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+                "age_seconds": round(time.time() - self.precomputed_at, 1) if self.precomputed_at else None,
+                "up_to_date": self.precomputed_version is not None
+                              and self.precomputed_version == self.index.catalog_digest,
+            }
+
+
+# Shared cache; recomputed whenever the club index sees a catalog change
+recommendation_cache = RecommendationCache()
+club_index.listeners.append(recommendation_cache.precompute)
+
+
+def get_recommendation_cache_stats():
+    return recommendation_cache.get_stats()
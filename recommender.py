@@ -2,12 +2,47 @@ import os
 from dotenv import load_dotenv
 from ai_init import query_gemini_llm
 from supabase_client import get_all_clubs
+from embeddings import embed_query
+from club_index import club_index
+from recommendation_cache import recommendation_cache
+from interest_normalizer import get_interest_normalizer, record_llm_interests, count as count_interest_outcome
+from dialogue_state import INTERESTS_PROMPT, ALL_CLUBS_PROMPT, AWAITING_INTERESTS, AWAITING_ALL_CLUBS, set_pending_prompt, clear_pending_prompt
 
 # Load environment variables
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# Fixed categories used by the clubs table
+CATEGORIES = ["Engineering", "Arts", "Music", "Sports", "Academics", "Cultural", "Technology", "Social"]
+# Number of clubs recommended and the minimum similarity for interests outside the fixed categories
+RECOMMEND_TOP_K = int(os.getenv("RECOMMEND_TOP_K", "3"))
+RECOMMEND_MIN_SCORE = float(os.getenv("RECOMMEND_MIN_SCORE", "0.6"))
+# Set RECOMMEND_PHRASE_WITH_LLM=1 to have Gemini phrase the answer (one call) instead of the template
+RECOMMEND_PHRASE_WITH_LLM = os.getenv("RECOMMEND_PHRASE_WITH_LLM", "0") == "1"
+
 def extract_interests(user_question: str) -> list:
+    """
+    Extract interests/hobbies from user question.
+
+    The local interest normalizer answers when it maps at least one phrase to
+    a category, or when the question holds no interest words at all; the LLM
+    only sees questions whose interest words the lexicon does not know.
+
+    Returns a list of extracted interests (lower case)
+    """
+    categories, unmapped = get_interest_normalizer().normalize(user_question)
+    if categories:
+        count_interest_outcome("local")
+        return [category.lower() for category in categories]
+    if not unmapped:
+        count_interest_outcome("empty")
+        return []
+    count_interest_outcome("llm")
+    interests = llm_extract_interests(user_question)
+    record_llm_interests(unmapped, interests)
+    return interests
+
+def llm_extract_interests(user_question: str) -> list:
     """
     Extract interests/hobbies from user question using LLM
     Returns a list of extracted interests
@@ -36,7 +71,7 @@ def extract_interests(user_question: str) -> list:
     """
     
     try:
-        result = query_gemini_llm(user_question, prompt, GEMINI_API_KEY)
+        result = query_gemini_llm(user_question, prompt, GEMINI_API_KEY, call_site="recommend_extract")
         if result and result.lower() != "none":
             # Convert comma-separated string to list and clean up items
             interests = [item.strip().lower() for item in result.split(',')]
@@ -72,34 +107,82 @@ Here is a list of clubs:
 From the list above, return ONLY the club names (one per line) that best match the user's interests.
 If no clubs match, respond with "none".
 """
-    result = query_gemini_llm("", prompt, GEMINI_API_KEY)
+    result = query_gemini_llm("", prompt, GEMINI_API_KEY, call_site="recommend_match")
     if not result or result.strip().lower() == "none":
         return []
     return [name.strip() for name in result.split('\n') if name.strip()]
 
+def rank_clubs(interests: list, top_k: int = RECOMMEND_TOP_K) -> list:
+    """
+    Rank clubs for a list of interests with the club embedding index.
+
+    When every interest is one of the fixed categories, the clubs in those
+    categories are ranked by how typical they are of the category (no API
+    call); otherwise the interests are embedded, the whole catalog is scored
+    and weak matches (below RECOMMEND_MIN_SCORE) are dropped.
+
+    Returns:
+        List of {"club": row, "score": float}, best first.
+    """
+    known = {c.lower() for c in CATEGORIES}
+    categories = [i for i in interests if i.lower() in known]
+    if categories and len(categories) == len(interests):
+        # Category inverted index; no embedding call needed
+        return club_index.rank_categories(categories, top_k=top_k)
+    query_embedding = embed_query("Interests: " + ", ".join(interests))
+    return club_index.rank(query_embedding, top_k=top_k, min_score=RECOMMEND_MIN_SCORE)
+
+def llm_rank_clubs(interests: list) -> list:
+    """Fallback when embeddings are unavailable: let the LLM pick names from the catalog."""
+    clubs = get_all_clubs(formatted=False)
+    by_name = {club.get("name"): club for club in clubs}
+    matched_names = llm_match_clubs(interests, format_clubs_for_llm(clubs))
+    return [{"club": by_name[name], "score": None} for name in matched_names if name in by_name]
+
+def phrase_recommendation(interests: list, ranked: list) -> str:
+    """Answer text for matched clubs; one optional LLM call when RECOMMEND_PHRASE_WITH_LLM=1."""
+    names = [r["club"].get("name", "Unknown") for r in ranked]
+    answer = f"Based on your interests {', '.join(interests)}, I recommend these clubs: {', '.join(names)}."
+    if not RECOMMEND_PHRASE_WITH_LLM:
+        return answer
+    prompt = f"""
+You are a friendly university club assistant. The user is interested in: {', '.join(interests)}.
+Recommend these clubs in 2-3 short sentences, saying briefly why each fits:
+
+{format_clubs_for_llm([r["club"] for r in ranked])}
+"""
+    result = query_gemini_llm("", prompt, GEMINI_API_KEY, call_site="recommend_phrase")
+    return answer if not result or result.startswith("Error") else result.strip()
+
 def recommend_clubs(user_question: str, user_id: str, session_id: str):
     interests = extract_interests(user_question)
     if not interests:
+        # The next message from this session is expected to list interests
+        set_pending_prompt(session_id, user_id, AWAITING_INTERESTS)
         return {
             "status": "clarify",
-            "answer": "Could you tell me about your hobbies or interests so I can recommend clubs for you?",
+            "answer": INTERESTS_PROMPT,
             "clubs": []
         }
-    clubs = get_all_clubs(formatted=False)
-    clubs_context = format_clubs_for_llm(clubs)
-    matched_names = llm_match_clubs(interests, clubs_context)
-    if matched_names:
+    try:
+        # Precomputed for single categories and pairs; other interest sets are cached on first use
+        ranked = recommendation_cache.get_or_compute(interests, rank_clubs)
+    except Exception as e:
+        print(f"Club index unavailable, matching with LLM: {e}")
+        ranked = llm_rank_clubs(interests)
+    if ranked:
         # Clubs found matching interest
-        matched_clubs = [club for club in clubs if club['name'] in matched_names]
+        clear_pending_prompt(session_id, user_id)
         return {
             "status": "matched",
-            "answer": f"Based on your interests {', '.join(interests)}, I recommend these clubs: {', '.join(matched_names)}.",
-            "clubs": matched_clubs
+            "answer": phrase_recommendation(interests, ranked),
+            "clubs": [{**r["club"], "score": r["score"]} for r in ranked]
         }
     else:
-        # Interest found, but no clubs match
+        # Interest found, but no clubs match; the next message should answer the yes/no prompt
+        set_pending_prompt(session_id, user_id, AWAITING_ALL_CLUBS)
         return {
             "status": "no_match",
-            "answer": f"Sorry, I couldn't find any clubs matching your interests {', '.join(interests)}. Would you like to see all available clubs?",
+            "answer": f"Sorry, I couldn't find any clubs matching your interests {', '.join(interests)}. {ALL_CLUBS_PROMPT}",
             "clubs": []
-        }
\ No newline at end of file
+        }
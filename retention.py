@@ -0,0 +1,125 @@
+import os
+import gzip
+import json
+import time
+import argparse
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from supabase_pool import pool
+
+# Load environment variables
+load_dotenv()
+
+CHAT_HISTORY_RETENTION_DAYS = int(os.getenv("CHAT_HISTORY_RETENTION_DAYS", "90"))
+CHAT_HISTORY_RETENTION_BATCH_SIZE = int(os.getenv("CHAT_HISTORY_RETENTION_BATCH_SIZE", "500"))
+CHAT_HISTORY_ARCHIVE_DIR = os.getenv("CHAT_HISTORY_ARCHIVE_DIR", "chat_history_archive")
+
+ARCHIVE_COLUMNS = "id,session_id,user_id,question,answer,created_at"
+
+
+def _archive_rows(rows, archive_dir):
+    """
+    Append rows to a gzip-compressed JSONL file, one JSON object per line.
+
+    Files are split by the day the job runs so each run appends to one file.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(
+        archive_dir,
+        f"chat_history_{datetime.now(timezone.utc).strftime('%Y%m%d')}.jsonl.gz"
+    )
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    return path
+
+
+def purge_chat_history(older_than_days=CHAT_HISTORY_RETENTION_DAYS,
+                       batch_size=CHAT_HISTORY_RETENTION_BATCH_SIZE,
+                       archive_dir=CHAT_HISTORY_ARCHIVE_DIR,
+                       archive=True,
+                       pause_seconds=0.0,
+                       max_batches=None):
+    """
+    Delete (and optionally archive) chat_history rows older than a cutoff.
+
+    Rows are processed oldest-first in batches of `batch_size`, each batch
+    being one select and one delete by primary key, so no statement holds
+    locks on more than a batch of rows.
+
+    Args:
+        older_than_days: Rows with created_at older than this many days are removed.
+        batch_size: Maximum rows selected and deleted per round trip.
+        archive_dir: Directory for the compressed JSONL archive.
+        archive: Write rows to the archive before deleting them.
+        pause_seconds: Sleep between batches to leave room for live traffic.
+        max_batches: Stop after this many batches (None = until done).
+
+    Returns:
+        dict with rows processed, batches, elapsed seconds and rows per second.
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=older_than_days)).isoformat()
+    processed = 0
+    batches = 0
+    archive_path = None
+    start = time.perf_counter()
+
+    while max_batches is None or batches < max_batches:
+        rows = pool.request_sync("GET", "chat_history", params={
+            "select": ARCHIVE_COLUMNS,
+            "created_at": f"lt.{cutoff}",
+            "order": "created_at.asc",
+            "limit": batch_size,
+        })
+        if not rows:
+            break
+
+        if archive:
+            archive_path = _archive_rows(rows, archive_dir)
+
+        ids = ",".join(str(row["id"]) for row in rows)
+        # Deleting by primary key is safe to repeat, so transient failures are retried
+        pool.request_sync("DELETE", "chat_history", params={"id": f"in.({ids})"}, retry=True)
+
+        processed += len(rows)
+        batches += 1
+        elapsed = time.perf_counter() - start
+        print(f"Retention batch {batches}: {len(rows)} rows ({processed / elapsed:.1f} rows/s)")
+
+        if len(rows) < batch_size:
+            break
+        if pause_seconds:
+            time.sleep(pause_seconds)
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "cutoff": cutoff,
+        "rows": processed,
+        "batches": batches,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(processed / elapsed, 1) if elapsed > 0 else 0.0,
+        "archive_path": archive_path,
+    }
+    print(f"Chat history retention finished: {stats}")
+    return stats
+
+
+# Run as a scheduled job: python retention.py --days 90
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive and delete old chat_history rows.")
+    parser.add_argument("--days", type=int, default=CHAT_HISTORY_RETENTION_DAYS)
+    parser.add_argument("--batch-size", type=int, default=CHAT_HISTORY_RETENTION_BATCH_SIZE)
+    parser.add_argument("--archive-dir", default=CHAT_HISTORY_ARCHIVE_DIR)
+    parser.add_argument("--no-archive", action="store_true", help="Delete without archiving")
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches")
+    parser.add_argument("--max-batches", type=int, default=None)
+    args = parser.parse_args()
+
+    purge_chat_history(
+        older_than_days=args.days,
+        batch_size=args.batch_size,
+        archive_dir=args.archive_dir,
+        archive=not args.no_archive,
+        pause_seconds=args.pause,
+        max_batches=args.max_batches,
+    )
@@ -0,0 +1,161 @@
+import os
+import re
+import asyncio
+from dotenv import load_dotenv
+from shared_cache import create_cache
+from token_budget import estimate_tokens, truncate_to_budget
+import supabase_pool
+
+# Load environment variables
+load_dotenv()
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+# "extractive" (default): one condensed line per turn; "llm": Gemini rewrites the summary
+# after each turn (in the background); "off": replay the raw last turns as before
+SESSION_SUMMARY_MODE = os.getenv("SESSION_SUMMARY_MODE", "extractive")
+# Hard bound on the summary placed into prompts
+SESSION_SUMMARY_MAX_TOKENS = int(os.getenv("SESSION_SUMMARY_MAX_TOKENS", "200"))
+# Per-turn clipping for the extractive summary (characters)
+SUMMARY_QUESTION_CHARS = 120
+SUMMARY_ANSWER_CHARS = 160
+SESSION_SUMMARY_CACHE_TTL_SECONDS = int(os.getenv("SESSION_SUMMARY_CACHE_TTL_SECONDS", "3600"))
+
+# (session_id, user_id) -> summary text
+_summaries = create_cache("session_summaries", maxsize=4096, ttl=SESSION_SUMMARY_CACHE_TTL_SECONDS,
+                          read_through=True)
+# Background LLM summary updates still running (kept referenced until done)
+_background = set()
+
+
+def _clip(text, limit):
+    text = re.sub(r"\s+", " ", text or "").strip()
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + "..."
+
+
+def extractive_update(summary, user_question, answer, max_tokens=SESSION_SUMMARY_MAX_TOKENS):
+    """
+    Append one condensed line for the latest turn and drop the oldest lines
+    until the summary fits `max_tokens`.
+
+    Only the first sentence of the answer is kept, so a long club list costs
+    the same as a one-line reply.
+    """
+    first_sentence = re.split(r"(?<=[.!?])\s+", (answer or "").strip(), maxsplit=1)[0]
+    line = f"- User: {_clip(user_question, SUMMARY_QUESTION_CHARS)} | Assistant: {_clip(first_sentence, SUMMARY_ANSWER_CHARS)}"
+    lines = [l for l in (summary or "").splitlines() if l.strip()] + [line]
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def llm_update(summary, user_question, answer, max_tokens=SESSION_SUMMARY_MAX_TOKENS):
+    """Have Gemini fold the latest turn into the summary; falls back to the extractive update."""
+    from ai_init import query_gemini_llm
+    prompt = f"""
+You maintain a short running summary of a chat between a university club assistant and a user.
+Update the summary with the latest turn. Keep names of clubs, events and the user's stated interests,
+and what the assistant last asked. Write at most {max_tokens * 3} characters as short "- " bullet lines.
+
+Current summary:
+{summary or "(empty)"}
+
+Latest turn:
+User: {user_question}
+Assistant: {answer}
+
+Respond with ONLY the updated summary.
+"""
+    result = query_gemini_llm(prompt, "", GEMINI_API_KEY, call_site="session_summary")
+    if not result or result.startswith("Error"):
+        return extractive_update(summary, user_question, answer, max_tokens)
+    return truncate_to_budget(result.strip(), max_tokens, "tail")[0]
+
+
+async def load_summary(session_id, user_id):
+    """
+    Return the session's summary, or None when it has none (a new session or
+    one that predates summaries) or it could not be loaded.
+    """
+    key = (session_id, user_id)
+    summary = _summaries.get(key)
+    if summary is not None:
+        return summary
+    try:
+        rows = await supabase_pool.pool.request("GET", "chat_summary", params={
+            "select": "summary",
+            "session_id": f"eq.{session_id}",
+            "user_id": supabase_pool._user_filter(user_id),
+            "limit": 1,
+        })
+    except Exception as e:
+        print(f"Error loading chat summary: {e}")
+        return None
+    if not rows:
+        return None
+    summary = rows[0]["summary"] or ""
+    _summaries.set(key, summary)
+    return summary
+
+
+async def _store_summary(session_id, user_id, summary):
+    _summaries.set((session_id, user_id), summary)
+    try:
+        # chat_summary has no primary key, so the upsert must name its unique (session_id, user_id) key
+        await supabase_pool.pool.request("POST", "chat_summary", params={"on_conflict": "session_id,user_id"}, json={
+            "session_id": session_id,
+            "user_id": user_id if user_id != "none" else None,
+            "summary": summary,
+        }, prefer="resolution=merge-duplicates,return=minimal")
+    except Exception as e:
+        print(f"Error saving chat summary: {e}")
+
+
+async def update_summary(session_id, user_id, user_question, answer):
+    """Fold one finished turn into the session's rolling summary."""
+    summary = await load_summary(session_id, user_id)
+    if SESSION_SUMMARY_MODE == "llm":
+        summary = await asyncio.to_thread(llm_update, summary, user_question, answer)
+    else:
+        summary = extractive_update(summary, user_question, answer)
+    await _store_summary(session_id, user_id, summary)
+
+
+async def save_chat_history(session_id, user_id, user_question, llm_response):
+    """
+    Save a turn to chat_history and update the session summary.
+
+    Drop-in replacement for supabase_pool.save_chat_history. The LLM summary
+    runs in the background so it never delays the reply.
+    """
+    if SESSION_SUMMARY_MODE == "off":
+        return await supabase_pool.save_chat_history(session_id, user_id, user_question, llm_response)
+    if SESSION_SUMMARY_MODE == "llm":
+        task = asyncio.create_task(update_summary(session_id, user_id, user_question, llm_response))
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+        return await supabase_pool.save_chat_history(session_id, user_id, user_question, llm_response)
+    # Extractive updates are cheap; write the turn and the summary concurrently
+    result, _ = await asyncio.gather(
+        supabase_pool.save_chat_history(session_id, user_id, user_question, llm_response),
+        update_summary(session_id, user_id, user_question, llm_response),
+    )
+    return result
+
+
+async def history_context(session_id, user_id, limit=3):
+    """
+    Conversation context for prompts: the rolling summary, bounded to
+    SESSION_SUMMARY_MAX_TOKENS. Falls back to the raw last `limit` turns when
+    summaries are off or the session has no summary.
+    """
+    summary = await load_summary(session_id, user_id) if SESSION_SUMMARY_MODE != "off" else None
+    if not summary:
+        from faq_formatter import history_parser_async
+        return await history_parser_async(user_id, session_id, limit=limit)
+    summary, _ = truncate_to_budget(summary, SESSION_SUMMARY_MAX_TOKENS, "tail")
+    return f"PREVIOUS CONVERSATION (summary, oldest first):\n{summary}\n"
+
+
+def get_summary_stats():
+    return {"mode": SESSION_SUMMARY_MODE, "max_tokens": SESSION_SUMMARY_MAX_TOKENS, "cache": _summaries.get_stats()}
@@ -0,0 +1,441 @@
+import os
+import json
+import time
+import pickle
+import sqlite3
+import threading
+from dotenv import load_dotenv
+from memory_cache import TTLCache
+from fork_safe import PerProcess
+
+# Load environment variables
+load_dotenv()
+
+# Second cache tier shared by every worker on the host (a SQLite file in WAL mode).
+# Disable to keep every cache in process only.
+SHARED_CACHE_ENABLED = os.getenv("SHARED_CACHE_ENABLED", "true").lower() == "true"
+# Directory of the shared cache file; must be on a local disk, not a network share
+SHARED_CACHE_DIR = os.getenv("SHARED_CACHE_DIR", "cache")
+# Size bound of the shared tier; least recently used entries are evicted beyond it
+SHARED_CACHE_MAX_MB = float(os.getenv("SHARED_CACHE_MAX_MB", "256"))
+# How often a worker picks up deletes and version bumps made by other workers (seconds)
+SHARED_CACHE_SYNC_SECONDS = float(os.getenv("SHARED_CACHE_SYNC_SECONDS", "1"))
+# How long a worker waits for the shared file's write lock before skipping the shared tier (ms)
+SHARED_CACHE_BUSY_TIMEOUT_MS = int(os.getenv("SHARED_CACHE_BUSY_TIMEOUT_MS", "200"))
+
+# Writes between two size checks
+EVICTION_CHECK_EVERY = 200
+# An entry's last-access time is refreshed at most this often (reads stay read-only in between)
+TOUCH_SECONDS = 60
+# Invalidation log rows kept for workers to catch up from
+INVALIDATION_LOG_SIZE = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    version INTEGER NOT NULL,
+    expires_at REAL,
+    size INTEGER NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+CREATE TABLE IF NOT EXISTS versions (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE TABLE IF NOT EXISTS invalidations (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    namespace TEXT NOT NULL,
+    key TEXT
+);
+"""
+
+
+def _key_text(key):
+    """Stable text form of a cache key (strings, numbers and tuples of them)."""
+    return json.dumps(key, sort_keys=True, default=str)
+
+
+class _Connection:
+    """One process's connection to the shared file, with its sync position."""
+
+    def __init__(self, path, busy_timeout_ms):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=busy_timeout_ms / 1000, isolation_level=None,
+                                  check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        # Start from the current end of the log; nothing is cached in this process yet
+        self.last_seq = self.db.execute("SELECT COALESCE(MAX(seq), 0) FROM invalidations").fetchone()[0]
+        self.synced_at = time.time()
+        self.writes = 0
+        self.lock = threading.Lock()
+
+
+class SharedStore:
+    """
+    Host-wide cache tier: one SQLite file in WAL mode under SHARED_CACHE_DIR.
+
+    Every worker process opens its own connection after fork. Readers never
+    block each other or the writer. Writes that cannot get the lock within
+    the busy timeout are skipped, because a cache write is optional. Deletes,
+    clears and version bumps are appended to an invalidation log. Each
+    worker replays that log at most every `sync_seconds` to drop its own
+    in-process copies, so an invalidation in one worker reaches all of them.
+    """
+
+    def __init__(self, path, max_bytes, sync_seconds=SHARED_CACHE_SYNC_SECONDS,
+                 busy_timeout_ms=SHARED_CACHE_BUSY_TIMEOUT_MS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.sync_seconds = sync_seconds
+        self._connection = PerProcess(lambda: _Connection(path, busy_timeout_ms))
+        # namespace -> SharedCache using this store in this process
+        self.caches = {}
+        self._stats_lock = threading.Lock()
+        self.stats = {"reads": 0, "writes": 0, "evicted": 0, "synced": 0, "errors": 0}
+
+    def register(self, cache):
+        self.caches[cache.namespace] = cache
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def _run(self, operation):
+        """Run operation(connection) under this process's connection lock; None on a SQLite error."""
+        try:
+            connection = self._connection.get()
+            with connection.lock:
+                return operation(connection)
+        except (sqlite3.Error, OSError) as e:
+            self._count("errors")
+            if self.stats["errors"] % 100 == 1:
+                print(f"Shared cache unavailable, using in-process tier only: {e}")
+            return None
+
+    def get(self, namespace, key):
+        """Return (value blob, version, expires_at) or None."""
+        def operation(connection):
+            row = connection.db.execute(
+                "SELECT value, version, expires_at, accessed_at FROM entries WHERE namespace = ? AND key = ?",
+                (namespace, key)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[3] > TOUCH_SECONDS:
+                connection.db.execute("UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                                      (now, namespace, key))
+            return row[:3]
+        self._count("reads")
+        return self._run(operation)
+
+    def set(self, namespace, key, value, version, expires_at):
+        def operation(connection):
+            connection.db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (namespace, key, value, version, expires_at, len(value), time.time()))
+            connection.writes += 1
+            if connection.writes % EVICTION_CHECK_EVERY == 0:
+                self._evict(connection.db)
+        self._count("writes")
+        self._run(operation)
+
+    def delete(self, namespace, key):
+        def operation(connection):
+            connection.db.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+            connection.db.execute("INSERT INTO invalidations (namespace, key) VALUES (?, ?)", (namespace, key))
+        self._run(operation)
+
+    def clear(self, namespace):
+        def operation(connection):
+            connection.db.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+            connection.db.execute("INSERT INTO invalidations (namespace, key) VALUES (?, NULL)", (namespace,))
+        self._run(operation)
+
+    def version(self, namespace, key):
+        """Current version of a key (0 if never bumped), or None if the store is unavailable."""
+        def operation(connection):
+            row = connection.db.execute("SELECT version FROM versions WHERE namespace = ? AND key = ?",
+                                        (namespace, key)).fetchone()
+            return row[0] if row else 0
+        return self._run(operation)
+
+    def bump(self, namespace, key):
+        """Increment a key's version for every worker; returns the new version (None if unavailable)."""
+        def operation(connection):
+            db = connection.db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT version FROM versions WHERE namespace = ? AND key = ?",
+                                 (namespace, key)).fetchone()
+                version = (row[0] if row else 0) + 1
+                db.execute("INSERT OR REPLACE INTO versions VALUES (?, ?, ?)", (namespace, key, version))
+                db.execute("INSERT INTO invalidations (namespace, key) VALUES (?, ?)", (namespace, key))
+                db.execute("COMMIT")
+                return version
+            except sqlite3.Error:
+                db.execute("ROLLBACK")
+                raise
+        return self._run(operation)
+
+    def _evict(self, db):
+        """Drop expired entries, then least recently used ones, until the file is under its size bound."""
+        now = time.time()
+        evicted = db.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at < ?", (now,)).rowcount
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        while total > self.max_bytes * 0.9:
+            rows = db.execute("SELECT namespace, key, size FROM entries ORDER BY accessed_at LIMIT 100").fetchall()
+            if not rows:
+                break
+            db.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", [r[:2] for r in rows])
+            total -= sum(r[2] for r in rows)
+            evicted += len(rows)
+        db.execute("DELETE FROM invalidations WHERE seq <= (SELECT MAX(seq) FROM invalidations) - ?",
+                   (INVALIDATION_LOG_SIZE,))
+        self._count("evicted", evicted)
+
+    def sync(self, force=False):
+        """Apply other workers' invalidations to this process's in-memory tiers (rate limited)."""
+        def operation(connection):
+            now = time.time()
+            if not force and now - connection.synced_at < self.sync_seconds:
+                return
+            connection.synced_at = now
+            db = connection.db
+            oldest = db.execute("SELECT MIN(seq) FROM invalidations").fetchone()[0]
+            rows = db.execute("SELECT seq, namespace, key FROM invalidations WHERE seq > ? ORDER BY seq",
+                              (connection.last_seq,)).fetchall()
+            if oldest is not None and oldest > connection.last_seq + 1 and connection.last_seq:
+                # Fell behind the kept log: forget everything rather than miss an invalidation
+                rows = [(rows[-1][0] if rows else connection.last_seq, namespace, None)
+                        for namespace in self.caches]
+            for seq, namespace, key in rows:
+                cache = self.caches.get(namespace)
+                if cache is not None:
+                    cache.forget(key)
+                connection.last_seq = max(connection.last_seq, seq)
+            self._count("synced", len(rows))
+        self._run(operation)
+
+    def get_stats(self):
+        def operation(connection):
+            return connection.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        entries, size = self._run(operation) or (None, None)
+        with self._stats_lock:
+            return {**self.stats, "path": self.path, "entries": entries,
+                    "size_mb": round(size / 2 ** 20, 2) if size is not None else None,
+                    "max_mb": round(self.max_bytes / 2 ** 20, 2)}
+
+
+class SharedCache:
+    """
+    Two-tier cache with the TTLCache interface (get/set/delete/clear).
+
+    L1 is this process's LRU, and L2 is the host-wide SharedStore, so an
+    entry computed by one worker is a hit for the others and survives
+    restarts. Values must be picklable.
+
+    Entries can be versioned. When `version_key(key)` is given, each entry
+    is stamped with the current version of that version key, for example
+    the club id for a club's rendered contexts. `bump()` invalidates every
+    entry of that version key in all workers at once. `set(..., version=v)`
+    is dropped if a bump happened after `v` was read, so a value computed
+    from old data is never stored.
+
+    Values that are rewritten under the same key (session summaries, last
+    turns, club records) need `read_through=True`. Their gets always go to
+    the shared tier and skip L1, because the invalidation log only carries
+    deletes and bumps, and an L1 copy would stay stale in other workers
+    until its TTL runs out.
+
+    Args:
+        namespace: Name of this cache in the shared store.
+        maxsize: Maximum L1 entries (the shared tier is bounded by size instead).
+        ttl: Seconds an entry stays valid in both tiers (None = no expiry).
+        store: The SharedStore, or None for an in-process cache only.
+        version_key: Maps a key to the key its version is tracked under.
+        read_through: Serve gets from the shared tier only (L1 is used only without a store).
+    """
+
+    def __init__(self, namespace, maxsize=1024, ttl=None, store=None, version_key=None, read_through=False):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.l1 = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.store = store
+        self.version_key = version_key
+        self.use_l1 = store is None or not read_through
+        # version key text -> version, as last read from the store
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "stale": 0, "stale_writes": 0}
+        if store is not None:
+            store.register(self)
+
+    @property
+    def maxsize(self):
+        return self.l1.maxsize
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def version(self, key):
+        """Current version of a version key, shared by all workers."""
+        text = _key_text(key)
+        with self._lock:
+            if text in self._versions:
+                return self._versions[text]
+        version = self.store.version(self.namespace, text) if self.store is not None else None
+        if version is None:
+            return self._versions.get(text, 0)
+        with self._lock:
+            if len(self._versions) > 10000:
+                self._versions.clear()
+            self._versions[text] = version
+        return version
+
+    def bump(self, key):
+        """Invalidate every entry stamped with this version key, in all workers."""
+        text = _key_text(key)
+        version = self.store.bump(self.namespace, text) if self.store is not None else None
+        with self._lock:
+            if version is None:
+                version = self._versions.get(text, 0) + 1
+            self._versions[text] = version
+        return version
+
+    def _entry_version(self, key):
+        return self.version(self.version_key(key)) if self.version_key else 0
+
+    def get(self, key, default=None):
+        if self.store is not None:
+            self.store.sync()
+        text = _key_text(key)
+        version = self._entry_version(key)
+        entry = self.l1.get(text) if self.use_l1 else None
+        if entry is not None:
+            if entry[1] == version:
+                self._count("l1_hits")
+                return entry[0]
+            self.l1.delete(text)
+            self._count("stale")
+        if self.store is not None:
+            row = self.store.get(self.namespace, text)
+            if row is not None:
+                blob, row_version, expires_at = row
+                now = time.time()
+                if row_version == version and (expires_at is None or expires_at > now):
+                    try:
+                        value = pickle.loads(blob)
+                    except Exception as e:
+                        print(f"Dropping unreadable shared cache entry {self.namespace}:{text}: {e}")
+                    else:
+                        if self.use_l1:
+                            self.l1.set(text, (value, version), ttl=expires_at - now if expires_at else None)
+                        self._count("l2_hits")
+                        return value
+                elif row_version != version:
+                    self._count("stale")
+        self._count("misses")
+        return default
+
+    def set(self, key, value, ttl=None, version=None):
+        current = self._entry_version(key)
+        if version is not None and version != current:
+            # Computed from data that changed meanwhile
+            self._count("stale_writes")
+            return
+        ttl = self.ttl if ttl is None else ttl
+        text = _key_text(key)
+        if self.use_l1:
+            self.l1.set(text, (value, current), ttl=ttl)
+        if self.store is not None:
+            try:
+                blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                print(f"Not sharing unpicklable cache value {self.namespace}:{text}: {e}")
+                return
+            self.store.set(self.namespace, text, blob, current, time.time() + ttl if ttl is not None else None)
+
+    def delete(self, key):
+        text = _key_text(key)
+        self.l1.delete(text)
+        if self.store is not None:
+            self.store.delete(self.namespace, text)
+
+    def clear(self):
+        self.l1.clear()
+        if self.store is not None:
+            self.store.clear(self.namespace)
+
+    def forget(self, key_text):
+        """Drop in-process copies after another worker's invalidation (None = all)."""
+        if key_text is None:
+            self.l1.clear()
+            with self._lock:
+                self._versions.clear()
+        else:
+            self.l1.delete(key_text)
+            with self._lock:
+                self._versions.pop(key_text, None)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self.l1)
+
+    def get_stats(self):
+        l1 = self.l1.get_stats()
+        with self._lock:
+            stats = dict(self.stats)
+        hits = stats["l1_hits"] + stats["l2_hits"]
+        lookups = hits + stats["misses"]
+        return {
+            "size": l1["size"],
+            "maxsize": l1["maxsize"],
+            "hits": hits,
+            "misses": stats["misses"],
+            "evictions": l1["evictions"],
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            **stats,
+            "shared": self.store is not None,
+        }
+
+
+_MISSING = object()
+
+
+def _create_store():
+    if not SHARED_CACHE_ENABLED:
+        return None
+    return SharedStore(os.path.join(SHARED_CACHE_DIR, "shared_cache.sqlite3"),
+                       max_bytes=int(SHARED_CACHE_MAX_MB * 2 ** 20))
+
+
+# Host-wide tier (opened lazily in each worker), or None when disabled
+shared_store = _create_store()
+
+
+def create_cache(namespace, maxsize=1024, ttl=None, version_key=None, read_through=False):
+    """
+    The cache every hot-path lookup uses: in-process, plus the host-wide
+    shared tier when SHARED_CACHE_ENABLED. Pass read_through=True for
+    values that are rewritten under the same key.
+    """
+    return SharedCache(namespace, maxsize=maxsize, ttl=ttl, store=shared_store, version_key=version_key,
+                       read_through=read_through)
+
+
+def get_shared_cache_stats():
+    if shared_store is None:
+        return {"enabled": False}
+    return {"enabled": True, **shared_store.get_stats(),
+            "namespaces": sorted(shared_store.caches)}
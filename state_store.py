@@ -0,0 +1,297 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from shared_cache import create_cache
+
+# Load environment variables
+load_dotenv()
+
+# How long an edit session may sit idle before it is treated as abandoned
+CHAT_STATE_TTL_SECONDS = int(os.getenv("CHAT_STATE_TTL_SECONDS", "1800"))
+# How long a "no state" answer is trusted before the backend is asked again
+CHAT_STATE_NEGATIVE_TTL_SECONDS = int(os.getenv("CHAT_STATE_NEGATIVE_TTL_SECONDS", "300"))
+CHAT_STATE_CACHE_SIZE = int(os.getenv("CHAT_STATE_CACHE_SIZE", "2048"))
+# "supabase" (default) or "file"
+CHAT_STATE_BACKEND = os.getenv("CHAT_STATE_BACKEND", "supabase")
+CHAT_STATE_FILE = os.getenv("CHAT_STATE_FILE", "chat_state.json")
+# Serve loads from the in-process cache (including cached "no state" answers). Only safe with a
+# single worker: writes made by other workers are invisible to it, so it is off when WEB_CONCURRENCY > 1.
+CHAT_STATE_CACHE_READS = os.getenv(
+    "CHAT_STATE_CACHE_READS", str(int(os.getenv("WEB_CONCURRENCY", "1")) <= 1)
+).lower() == "true"
+
+
+class SupabaseStateBackend:
+    """Durable backend that stores edit state in the Supabase `chat_state` table."""
+
+    def load(self, sess, user):
+        from supabase_client import load_state
+        return load_state(sess, user)
+
+    def save(self, sess, user, row):
+        from supabase_client import save_state
+        save_state(sess, user, row["action"], row["club_id"], row["updates"])
+
+    def delete(self, sess, user):
+        from supabase_client import clear_state
+        clear_state(sess, user)
+
+
+class FileStateBackend:
+    """
+    Local JSON-file backend with the same interface as SupabaseStateBackend.
+    Intended for tests and local development without a database.
+    """
+
+    def __init__(self, path=CHAT_STATE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error reading chat state file '{self.path}': {e}")
+            return {}
+
+    def _write(self, rows):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(rows, f)
+        os.replace(tmp_path, self.path)
+
+    def load(self, sess, user):
+        with self._lock:
+            return self._read().get(_state_key(sess, user))
+
+    def save(self, sess, user, row):
+        with self._lock:
+            rows = self._read()
+            rows[_state_key(sess, user)] = {
+                **row,
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            }
+            self._write(rows)
+
+    def delete(self, sess, user):
+        with self._lock:
+            rows = self._read()
+            if rows.pop(_state_key(sess, user), None) is not None:
+                self._write(rows)
+
+
+def _state_key(sess, user):
+    return f"{sess}|{user}"
+
+
+def _row_age_seconds(row):
+    """Age of a backend row based on its `updated_at`/`created_at` column, if present."""
+    stamp = row.get("updated_at") or row.get("created_at")
+    if not stamp:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(stamp).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - parsed).total_seconds()
+
+
+class ChatStateStore:
+    """
+    Edit-state store with an in-process fast path in front of a durable backend.
+
+    - Reads are served from memory, including cached "no state" answers, so a
+      manager message outside an edit session costs no database round trip.
+    - Writes update memory immediately and are queued per session; `flush()`
+      sends only the last pending operation, so a save followed by a clear in
+      the same turn becomes a single delete (or nothing at all).
+    - Sessions idle for longer than `ttl` are treated as abandoned and cleared.
+
+    Cached rows live in the "chat_state" namespace of the shared cache
+    (read through, since they are rewritten every turn), so a worker sees
+    the state another worker cached for the same session.
+
+    With `cache_reads=False` (several workers) every load reads the backend and
+    every clear is sent, since another worker may have written the row; only
+    the per-turn write coalescing is kept.
+    """
+
+    def __init__(self, backend, ttl=CHAT_STATE_TTL_SECONDS,
+                 negative_ttl=CHAT_STATE_NEGATIVE_TTL_SECONDS, max_entries=CHAT_STATE_CACHE_SIZE,
+                 cache_reads=CHAT_STATE_CACHE_READS):
+        self.backend = backend
+        self.cache_reads = cache_reads
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._lock = threading.RLock()
+        # key -> (row or None, cached_at, touched_at, durable), where durable is whether
+        # the backend currently holds a row for this key (None = unknown)
+        self._cache = create_cache("chat_state", maxsize=max_entries, ttl=ttl, read_through=True)
+        # key -> ("save", row) | ("clear", None)
+        self._pending = {}
+        self.stats = {
+            "hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "backend_reads": 0,
+            "backend_writes": 0,
+            "coalesced_writes": 0,
+            "expired": 0,
+        }
+
+    def load(self, sess, user):
+        """Return the current state row for a session/user, or None."""
+        key = _state_key(sess, user)
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(key) if self.cache_reads else None
+            if entry is not None:
+                row, cached_at, touched_at, _ = entry
+                if row is None and now - cached_at < self.negative_ttl:
+                    self.stats["negative_hits"] += 1
+                    return None
+                if row is not None:
+                    if now - touched_at > self.ttl:
+                        self._expire(sess, user, key)
+                        return None
+                    self.stats["hits"] += 1
+                    return row
+            self.stats["misses"] += 1
+
+        # Anything still queued for this key must reach the backend before we re-read it
+        self.flush(sess, user)
+        self.stats["backend_reads"] += 1
+        row = self.backend.load(sess, user)
+
+        with self._lock:
+            if row is not None:
+                age = _row_age_seconds(row)
+                if age is not None and age > self.ttl:
+                    self._remember(key, row, now, now, durable=True)
+                    self._expire(sess, user, key)
+                    return None
+                touched_at = now - (age or 0)
+            else:
+                touched_at = now
+            self._remember(key, row, now, touched_at, durable=row is not None)
+        return row
+
+    def save(self, sess, user, action, club_id, updates):
+        """Record new state for a session/user; persisted on the next flush."""
+        key = _state_key(sess, user)
+        row = {
+            "session_id": sess,
+            "user_id": user,
+            "action": action,
+            "club_id": club_id,
+            "updates": updates,
+        }
+        now = time.time()
+        with self._lock:
+            if key in self._pending:
+                self.stats["coalesced_writes"] += 1
+            self._pending[key] = ("save", row)
+            self._remember(key, row, now, now)
+
+    def clear(self, sess, user):
+        """Drop the state for a session/user; persisted on the next flush."""
+        key = _state_key(sess, user)
+        now = time.time()
+        with self._lock:
+            if key in self._pending:
+                self.stats["coalesced_writes"] += 1
+            self._pending[key] = ("clear", None)
+            self._remember(key, None, now, now)
+
+    def flush(self, sess=None, user=None):
+        """
+        Write queued operations to the backend.
+
+        Args:
+            sess, user: Flush only this session/user. Flushes everything when omitted.
+        """
+        with self._lock:
+            if sess is not None:
+                key = _state_key(sess, user)
+                ops = {key: self._pending.pop(key)} if key in self._pending else {}
+            else:
+                ops, self._pending = self._pending, {}
+
+        for key, (op, row) in ops.items():
+            key_sess, key_user = key.split("|", 1) if sess is None else (sess, user)
+            try:
+                if op == "save":
+                    self.backend.save(key_sess, key_user, row)
+                    durable = True
+                else:
+                    # Nothing to delete if the backend never had this row
+                    if self.cache_reads and self._durable(key) is False:
+                        self.stats["coalesced_writes"] += 1
+                        continue
+                    self.backend.delete(key_sess, key_user)
+                    durable = False
+                self.stats["backend_writes"] += 1
+                with self._lock:
+                    entry = self._cache.get(key)
+                    if entry is not None:
+                        self._cache.set(key, (*entry[:3], durable))
+            except Exception as e:
+                print(f"Error flushing chat state for '{key}': {e}")
+                with self._lock:
+                    # Keep the operation queued unless a newer one replaced it
+                    self._pending.setdefault(key, (op, row))
+                    self._cache.delete(key)
+                raise
+
+    def invalidate(self, sess=None, user=None):
+        """Forget cached state so the next load goes to the backend."""
+        with self._lock:
+            if sess is None:
+                self._cache.clear()
+            else:
+                self._cache.delete(_state_key(sess, user))
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "cache": self._cache.get_stats(), "pending": len(self._pending),
+                    "cache_reads": self.cache_reads}
+
+    def _expire(self, sess, user, key):
+        print(f"Chat state for session '{sess}' expired after {self.ttl}s of inactivity")
+        self.stats["expired"] += 1
+        self._pending[key] = ("clear", None)
+        self._remember(key, None, time.time(), time.time())
+
+    def _durable(self, key):
+        entry = self._cache.get(key)
+        return entry[3] if entry is not None else None
+
+    def _remember(self, key, row, cached_at, touched_at, durable=None):
+        """Cache a row; `durable` None keeps what is known about the backend row."""
+        if durable is None:
+            durable = self._durable(key)
+        # Evicted entries only cost a backend read: pending writes stay in _pending until flushed
+        self._cache.set(key, (row, cached_at, touched_at, durable))
+
+
+def create_state_store(backend=None):
+    """Build a state store for the configured backend ("supabase" or "file")."""
+    if backend is None:
+        if CHAT_STATE_BACKEND.lower() == "file":
+            backend = FileStateBackend(CHAT_STATE_FILE)
+        else:
+            backend = SupabaseStateBackend()
+    return ChatStateStore(backend)
+
+
+# Shared store
+state_store = create_state_store()
@@ -0,0 +1,201 @@
+import re
+import json
+import threading
+
+# Closing bracket for each opening bracket
+_CLOSERS = {"{": "}", "[": "]"}
+# Characters allowed outside strings in JSON (structure, numbers, true/false/null)
+_BARE = set(" \t\r\n{}[],:0123456789-+.eEtruefalsn")
+
+_lock = threading.Lock()
+_stats = {"parsed": 0, "repaired_locally": 0, "repair_calls": 0, "failed": 0}
+
+
+class IncrementalJsonParser:
+    """
+    Tracks a JSON value as it streams in, chunk by chunk.
+
+    Text before the first "{" or "[" (prose, a Markdown fence) is skipped.
+    After every chunk the parser knows whether the top-level value is
+    complete (`done`), whether the text can no longer become valid JSON
+    (`failed`), and can give a best-effort value for the prefix seen so far
+    (`partial()`, for progress only: a value that never reached `done` is
+    not a result). Anything after the complete value is ignored.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.done = False
+        self.failed = False
+        self.error = None
+
+    def feed(self, chunk):
+        """Consume a chunk of the reply. Returns True while the stream is still valid."""
+        for ch in chunk or "":
+            if self.done or self.failed:
+                break
+            if not self.stack and not self.text:
+                if ch in _CLOSERS:
+                    self.stack.append(_CLOSERS[ch])
+                    self.text = ch
+                continue
+            self.text += ch
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in _CLOSERS:
+                self.stack.append(_CLOSERS[ch])
+            elif ch in "}]":
+                if ch != self.stack.pop():
+                    self._fail(f"mismatched '{ch}'")
+                elif not self.stack:
+                    self.done = True
+            elif ch not in _BARE:
+                self._fail(f"unexpected character {ch!r}")
+        return not self.failed
+
+    def _fail(self, error):
+        self.failed = True
+        self.error = f"{error} at offset {len(self.text) - 1}"
+
+    def value(self):
+        """The parsed value once `done`, else None."""
+        if not self.done:
+            return None
+        try:
+            return json.loads(self.text)
+        except ValueError:
+            return None
+
+    def partial(self):
+        """Best-effort value of the prefix seen so far: open strings and brackets are closed."""
+        if self.done:
+            return self.value()
+        if not self.text or self.failed:
+            return None
+        text = re.sub(r"[,:\s]+$", "", self.text + ('"' if self.in_string else ""))
+        if self.stack[-1] == "}":
+            # A key still waiting for its value ('{"a": 1, "b"') is dropped
+            text = re.sub(r'([{,])\s*"(?:[^"\\]|\\.)*"$', r"\1", text)
+            text = re.sub(r"[,\s]+$", "", text)
+        try:
+            return json.loads(text + "".join(reversed(self.stack)))
+        except ValueError:
+            return None
+
+
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_OUTSIDE_STRINGS = re.compile(r'"(?:[^"\\]|\\.)*"|\bTrue\b|\bFalse\b|\bNone\b|,\s*([}\]])')
+
+
+def _strip_fences(text):
+    text = (text or "").strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else text[3:]
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+
+def repair_json(text):
+    """
+    Return the JSON value in a sloppy reply, fixing common LLM mistakes.
+
+    Handles surrounding prose and Markdown fences, trailing commas, smart
+    quotes, Python literals (True/False/None) and single-quoted strings. A
+    reply cut off before its value is complete is not repaired: its last
+    string may be truncated mid-word, so the caller has to ask again.
+
+    Raises:
+        ValueError: If no complete JSON value can be recovered.
+    """
+    text = _strip_fences(text)
+    text = text.replace("“", '"').replace("”", '"')
+    start = min([i for i in (text.find("{"), text.find("[")) if i >= 0], default=-1)
+    if start < 0:
+        raise ValueError("No JSON object in reply")
+    text = text[start:]
+    if '"' not in text:
+        text = text.replace("'", '"')
+    # Python literals and trailing commas, outside strings only
+    text = _OUTSIDE_STRINGS.sub(lambda m: _LITERALS.get(m.group(0), m.group(1) or m.group(0)), text)
+    parser = IncrementalJsonParser()
+    parser.feed(text)
+    if not parser.done:
+        raise ValueError(f"Unrepairable JSON reply: {parser.error or 'cut off before the value was complete'}")
+    value = parser.value()
+    if value is None:
+        raise ValueError("Unrepairable JSON reply: not valid JSON")
+    return value
+
+
+_TYPES = {"object": dict, "array": list, "string": str, "integer": int, "number": (int, float), "boolean": bool}
+
+
+def validate(value, schema, path="$"):
+    """
+    Check a value against the subset of JSON Schema used for response schemas
+    (type, properties, required, enum, items). Unknown object keys are dropped.
+
+    Returns:
+        The value, with unknown keys removed.
+
+    Raises:
+        ValueError: On the first mismatch.
+    """
+    if not schema:
+        return value
+    expected = _TYPES.get(str(schema.get("type", "")).lower())
+    if expected and not isinstance(value, expected):
+        raise ValueError(f"{path}: expected {schema['type']}, got {type(value).__name__}")
+    if "enum" in schema and value not in schema["enum"]:
+        raise ValueError(f"{path}: {value!r} is not one of {schema['enum']}")
+    if isinstance(value, dict) and "properties" in schema:
+        missing = [key for key in schema.get("required", []) if key not in value]
+        if missing:
+            raise ValueError(f"{path}: missing {', '.join(missing)}")
+        return {key: validate(v, schema["properties"][key], f"{path}.{key}")
+                for key, v in value.items() if key in schema["properties"]}
+    if isinstance(value, list) and "items" in schema:
+        return [validate(v, schema["items"], f"{path}[{i}]") for i, v in enumerate(value)]
+    return value
+
+
+def parse_json_reply(raw, schema=None):
+    """
+    Parse (and validate) a JSON reply, repairing it locally when needed.
+
+    Raises:
+        ValueError: If the reply cannot be recovered or does not fit the schema.
+    """
+    if not isinstance(raw, str):
+        raise ValueError(f"Expected a text reply, got {type(raw).__name__}")
+    parser = IncrementalJsonParser()
+    parser.feed(_strip_fences(raw))
+    value = parser.value()
+    repaired = value is None
+    if repaired:
+        value = repair_json(raw)
+    value = validate(value, schema)
+    count("repaired_locally" if repaired else "parsed")
+    return value
+
+
+def count(outcome):
+    with _lock:
+        _stats[outcome] += 1
+
+
+def get_structured_output_stats():
+    with _lock:
+        total = _stats["parsed"] + _stats["repaired_locally"] + _stats["failed"]
+        return {**_stats, "failure_rate": round(_stats["failed"] / total, 3) if total else 0.0}
@@ -1,95 +1,51 @@
-from supabase.client import create_client
-from dotenv import load_dotenv
-import os
+from supabase_pool import (
+    pool, _user_filter, club_info, club_info_params, format_clubs, event_params, state_params, state_row
+)
 
-# Load environment variables
-load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-
-
-
-# Initialize the Supabase client
-def get_supabase_client():
-    url = SUPABASE_URL 
-    key = SUPABASE_KEY
-    return create_client(url, key)
-
-# Shared client
-supabase_client = get_supabase_client()
+# Blocking versions of the supabase_pool helpers, for code that runs in worker threads
+# (club context, edit state, club updates) and for scripts. Both share the pool's
+# connection limits, retries, deadlines and stats.
 
 # Fetch club name
 # Fetch club info (name, description, category, location, website)
 def get_club_info_by_id(club_id):
-    data = supabase_client.table("clubs").select(
-        "name, description, category, location, website_url,leader_name,leader_contact"
-    ).eq("id", club_id).single().execute()
-    
-    if data.data:
-        return {
-            "name": data.data.get("name", "Unknown Club"),
-            "description": data.data.get("description", "No description available."),
-            "category": data.data.get("category", "Unknown category."),
-            "location": data.data.get("location", "Unknown location."),
-            "website_url": data.data.get("website_url", "No website available."),
-            "leader_name": data.data.get("leader_name", "Unknown"),
-            "leader_contact": data.data.get("leader_contact", "Unknown")
-        }
-    else:
-        return {
-            "name": "Unknown Club",
-            "description": "No description available.",
-            "category": "Unknown category.",
-            "location": "Unknown location.",
-            "website_url": "No website available.",
-            "leader_name": "Unknown",
-            "leader_contact": "Unknown"
-        }
-    
+    return club_info(pool.request_sync("GET", "clubs", params=club_info_params(club_id)))
+
 
 def get_all_clubs(formatted=True):
-    data = supabase_client.table("clubs").select(
-        "name, description, category"
-    ).execute()
-    
-    if not data.data:
+    rows = pool.request_sync("GET", "clubs", params={"select": "id,name,description,category"})
+
+    if not rows:
         return "No clubs found." if formatted else []
-    
-    if formatted:
-        result = ""
-        for club in data.data:
-            result += "----------------------------------------\n"
-            result += f"Club Name: {club.get('name', 'Unnamed Club')}\n"
-            result += f"Description: {club.get('description', 'No description available.')}\n"
-            result += f"Category: {club.get('category', 'Uncategorized')}\n"
-        result += "----------------------------------------"
-        return result
-    else:
-        return data.data
+    return format_clubs(rows) if formatted else rows
 
 
 # Fetch FAQs
 def fetch_faqs_by_club(club_id):
-    data = supabase_client.table("club_faqs").select("*").eq("club_id", club_id).execute()
-    return data.data
+    return pool.request_sync("GET", "club_faqs", params={"select": "*", "club_id": f"eq.{club_id}"}) or []
 
-def fetch_event_by_club(club_id):
+def fetch_event_by_club(club_id, from_date=None, to_date=None, statuses=None, limit=None):
     """
     Fetch events for a specific club ID with only essential information.
 
+    Past events are filtered out in the database: only events that have not
+    ended by `from_date` (today by default) are returned, ordered by start_date.
+
     Args:
         club_id: The ID of the club to fetch events for.
+        from_date: ISO date; events ending before this are skipped (default: today).
+        to_date: ISO date; events starting after this are skipped (default: no limit).
+        statuses: Optional list of status values to keep.
+        limit: Maximum number of events to return (default: no limit).
 
     Returns:
         A list of events with selected fields if found, or an empty list if no events exist.
     """
     try:
-        data = supabase_client.table("events").select(
-            "title, description, location, time_range, start_date, end_date, status"
-        ).eq("club_id", club_id).execute()
-        
-        if data.data:
-            return data.data
+        data = pool.request_sync("GET", "events", params=event_params(club_id, from_date, to_date, statuses, limit))
+
+        if data:
+            return data
         else:
             print(f"No events found for club ID: {club_id}")
             return []
@@ -102,44 +58,51 @@ def fetch_event_by_club(club_id):
 def fetch_username_by_id(user_id):
     if(user_id == "none"):
         return "Guest"
-    data = supabase_client.table("profiles").select("username").eq("id", user_id).execute()
     #if username doesnt exist, return "Guest"
-    return data.data
+    return pool.request_sync("GET", "profiles", params={"select": "username", "id": f"eq.{user_id}"})
 
 
-#to do context implementation 
+#to do context implementation
 
 def save_chat_history(session_id, user_id, user_question, llm_response):
     try:
-        response = supabase_client.table("chat_history").insert({
+        # An insert is not idempotent, so it is sent once (the pool only retries reads)
+        return pool.request_sync("POST", "chat_history", json={
             "session_id": session_id,
             "user_id": user_id if user_id != "none" else None,
             "question": user_question,
             "answer": llm_response
-        }).execute()
-        return response
+        }, prefer="return=minimal")
     except Exception as e:
         print(f"Error saving chat history: {e}")
         return None
 
 
-def drop_all_chat_history():
-    supabase_client.table("chat_history").delete().neq("id", 0).execute()
+def drop_all_chat_history(batch_size=1000):
+    # Delete in primary-key batches so no single statement locks the whole table
+    while True:
+        rows = pool.request_sync("GET", "chat_history", params={"select": "id", "order": "id.asc", "limit": batch_size})
+        if not rows:
+            break
+        ids = ",".join(str(row["id"]) for row in rows)
+        pool.request_sync("DELETE", "chat_history", params={"id": f"in.({ids})"}, retry=True)
+        if len(rows) < batch_size:
+            break
 
 def get_last_chats(user_id, session_id, limit=3):
     try:
-        res = supabase_client.table("chat_history") \
-            .select("question,answer") \
-            .eq("session_id", session_id) \
-            .eq("user_id", user_id if user_id != "none" else None) \
-            .order("created_at", desc=True) \
-            .limit(limit) \
-            .execute()
-        return list(reversed(res.data)) if res.data else []
+        rows = pool.request_sync("GET", "chat_history", params={
+            "select": "question,answer",
+            "session_id": f"eq.{session_id}",
+            "user_id": _user_filter(user_id),
+            "order": "created_at.desc",
+            "limit": limit,
+        })
+        return list(reversed(rows)) if rows else []
     except Exception as e:
         print(f"Error retrieving chat history: {e}")
         return []
-    
+
 
 def edit_clubs_by_id(club_id, **kwargs):
     if not kwargs:
@@ -147,38 +110,26 @@ def edit_clubs_by_id(club_id, **kwargs):
         return None
 
     try:
-        response = supabase_client.table("clubs").update(kwargs).eq("id", club_id).execute()
-        return response
+        return pool.request_sync("PATCH", "clubs", params={"id": f"eq.{club_id}"}, json=kwargs,
+                                 prefer="return=representation", retry=True)
     except Exception as e:
         print(f"Error updating club with ID {club_id}: {e}")
         return None
-    
+
 def load_state(sess, user):
-    try:
-        row = supabase_client.table("chat_state") \
-            .select("*").eq("session_id", sess).eq("user_id", user) \
-            .single().execute().data
-        return row
-    except Exception as e:
-        # Handle the "no rows returned" case gracefully
-        if "PGRST116" in str(e) or "no rows" in str(e):
-            return None
-        # Re-raise other exceptions
-        raise
+    # limit=1 so "no state" is an empty result rather than an error
+    rows = pool.request_sync("GET", "chat_state", params={"select": "*", **state_params(sess, user), "limit": 1})
+    return rows[0] if rows else None
 
 def save_state(sess, user, action, club_id, updates):
-    supabase_client.table("chat_state") \
-        .upsert({
-            "session_id": sess, 
-            "user_id": user,
-            "action": action, 
-            "club_id": club_id,
-            "updates": updates
-        }).execute()
+    row = state_row(sess, user, action, club_id, updates)
+    if user is None:
+        # NULLs never conflict in a unique key, so an upsert would add a row per save
+        clear_state(sess, user)
+        pool.request_sync("POST", "chat_state", json=row, prefer="return=minimal")
+        return
+    pool.request_sync("POST", "chat_state", params={"on_conflict": "session_id,user_id"}, json=row,
+                      prefer="resolution=merge-duplicates,return=minimal", retry=True)
 
 def clear_state(sess, user):
-    supabase_client.table("chat_state") \
-        .delete().eq("session_id", sess).eq("user_id", user) \
-        .execute()
-
-
+    pool.request_sync("DELETE", "chat_state", params=state_params(sess, user), retry=True)
@@ -0,0 +1,468 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import httpx
+from datetime import date
+from dotenv import load_dotenv
+from shared_cache import create_cache
+from fork_safe import PerProcess
+
+# Load environment variables
+load_dotenv()
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+# Maximum concurrent requests (and keep-alive connections) to PostgREST
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+# Seconds an idle keep-alive connection is kept open
+SUPABASE_POOL_KEEPALIVE_SECONDS = float(os.getenv("SUPABASE_POOL_KEEPALIVE_SECONDS", "60"))
+# Per-attempt timeout and overall deadline per call (seconds)
+SUPABASE_REQUEST_TIMEOUT = float(os.getenv("SUPABASE_REQUEST_TIMEOUT", "5"))
+SUPABASE_REQUEST_DEADLINE = float(os.getenv("SUPABASE_REQUEST_DEADLINE", "10"))
+SUPABASE_MAX_RETRIES = int(os.getenv("SUPABASE_MAX_RETRIES", "2"))
+# Seconds the most recent turn of a session is remembered in process
+LAST_TURN_TTL_SECONDS = int(os.getenv("LAST_TURN_TTL_SECONDS", "3600"))
+
+# Status codes worth retrying: timeouts, rate limiting and gateway errors
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# Methods retried by default. A retried write may be applied twice (an insert adds a second
+# row), so writes are only retried when the caller marks them idempotent with retry=True
+IDEMPOTENT_METHODS = {"GET", "HEAD"}
+
+
+class PostgrestPool:
+    """
+    PostgREST client over one shared, keep-alive HTTP connection pool.
+
+    Every Supabase call in the service goes through `request()` (async
+    handlers) or `request_sync()` (code running in worker threads and
+    scripts). Both bound concurrency to the pool size, apply a per-call
+    deadline, retry transient failures of idempotent requests with
+    jittered backoff, and record latency and saturation for `get_stats()`.
+    """
+
+    def __init__(self, url=SUPABASE_URL, key=SUPABASE_KEY, pool_size=SUPABASE_POOL_SIZE,
+                 timeout=SUPABASE_REQUEST_TIMEOUT, deadline=SUPABASE_REQUEST_DEADLINE,
+                 max_retries=SUPABASE_MAX_RETRIES, keepalive=SUPABASE_POOL_KEEPALIVE_SECONDS,
+                 transport=None):
+        self.base_url = f"{(url or '').rstrip('/')}/rest/v1"
+        self.key = key
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.keepalive = keepalive
+        self.transport = transport
+        self._client = None
+        self._semaphore = None
+        self._loop = None
+        # Clients of earlier event loops being closed (kept referenced until done)
+        self._closing = set()
+        # The blocking client owns sockets, so each forked worker opens its own
+        self._sync_client = PerProcess(lambda: httpx.Client(**self._client_options()))
+        self._sync_slots = threading.BoundedSemaphore(pool_size)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.stats = {
+            "requests": 0,
+            "errors": 0,
+            "retries": 0,
+            "timeouts": 0,
+            "max_in_flight": 0,
+            "saturated": 0,
+            "latency": {},
+        }
+
+    def _client_options(self):
+        return {
+            "base_url": self.base_url,
+            "headers": {
+                "apikey": self.key or "",
+                "Authorization": f"Bearer {self.key or ''}",
+                "Content-Type": "application/json",
+            },
+            "limits": httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+                keepalive_expiry=self.keepalive,
+            ),
+            "timeout": self.timeout,
+            "transport": self.transport,
+        }
+
+    def _ensure_client(self):
+        # httpx clients and semaphores are bound to the event loop that created them
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            if self._client is not None:
+                task = loop.create_task(_close_quietly(self._client))
+                self._closing.add(task)
+                task.add_done_callback(self._closing.discard)
+            self._client = httpx.AsyncClient(**self._client_options())
+            self._semaphore = asyncio.Semaphore(self.pool_size)
+            self._loop = loop
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _enter(self):
+        with self._lock:
+            self.in_flight += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.in_flight)
+
+    def _leave(self, op, seconds):
+        with self._lock:
+            self.in_flight -= 1
+            entry = self.stats["latency"].setdefault(op, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            ms = seconds * 1000
+            entry["count"] += 1
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+
+    def _wait(self, amount):
+        with self._lock:
+            self.waiting += amount
+
+    def _should_retry(self, error, method, retry, attempt):
+        """Whether a failed attempt is sent again (transient error, idempotent request, retries left)."""
+        if attempt >= self.max_retries:
+            return False
+        if not (method in IDEMPOTENT_METHODS if retry is None else retry):
+            return False
+        return isinstance(error, httpx.TransportError) or error.response.status_code in RETRYABLE_STATUS
+
+    @staticmethod
+    def _backoff(attempt):
+        return min(2.0, 0.1 * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+    @staticmethod
+    def _decode(response):
+        response.raise_for_status()
+        return response.json() if response.content else None
+
+    async def request(self, method, table, params=None, json=None, prefer=None, deadline=None, retry=None):
+        """
+        Send one PostgREST request and return the decoded JSON body (or None).
+
+        Args:
+            method: HTTP method (GET, POST, PATCH, DELETE).
+            table: Table name, e.g. "clubs" (or "rpc/<function>").
+            params: PostgREST query parameters, e.g. {"id": "eq.5", "select": "name"}.
+            json: Request body for inserts/updates.
+            prefer: Value for the Prefer header (e.g. "return=representation").
+            deadline: Overall seconds for all attempts (default: pool deadline).
+            retry: Retry transient failures (default: only for GET and HEAD). Pass True
+                for writes that are safe to repeat, such as upserts and filtered deletes.
+
+        Raises:
+            httpx.HTTPError or asyncio.TimeoutError once retries or the deadline are exhausted.
+        """
+        client = self._ensure_client()
+        headers = {"Prefer": prefer} if prefer else None
+        op = f"{method} {table}"
+        start = time.perf_counter()
+
+        if self._semaphore.locked():
+            self._count("saturated")
+        self._wait(1)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._wait(-1)
+        self._enter()
+        try:
+            return await asyncio.wait_for(
+                self._send_with_retries(client, method, table, params, json, headers, retry),
+                timeout=deadline or self.deadline,
+            )
+        except asyncio.TimeoutError:
+            self._count("timeouts")
+            self._count("errors")
+            raise
+        except Exception:
+            self._count("errors")
+            raise
+        finally:
+            self._semaphore.release()
+            self._leave(op, time.perf_counter() - start)
+
+    async def _send_with_retries(self, client, method, table, params, json, headers, retry):
+        attempt = 0
+        while True:
+            self._count("requests")
+            try:
+                response = await client.request(method, f"/{table}", params=params, json=json, headers=headers)
+                return self._decode(response)
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                if not self._should_retry(e, method, retry, attempt):
+                    raise
+                attempt += 1
+                self._count("retries")
+                await asyncio.sleep(self._backoff(attempt))
+
+    def request_sync(self, method, table, params=None, json=None, prefer=None, deadline=None, retry=None):
+        """
+        Blocking counterpart of `request()` with the same arguments, limits and retry policy.
+
+        Raises:
+            httpx.HTTPError or TimeoutError once retries or the deadline are exhausted.
+        """
+        client = self._sync_client.get()
+        headers = {"Prefer": prefer} if prefer else None
+        op = f"{method} {table}"
+        start = time.perf_counter()
+        ends_at = time.monotonic() + (deadline or self.deadline)
+
+        if not self._sync_slots.acquire(blocking=False):
+            self._count("saturated")
+            self._wait(1)
+            try:
+                acquired = self._sync_slots.acquire(timeout=max(ends_at - time.monotonic(), 0))
+            finally:
+                self._wait(-1)
+            if not acquired:
+                self._count("timeouts")
+                self._count("errors")
+                raise TimeoutError(f"{op}: no free connection before the deadline")
+        self._enter()
+        try:
+            attempt = 0
+            while True:
+                remaining = ends_at - time.monotonic()
+                if remaining <= 0:
+                    self._count("timeouts")
+                    raise TimeoutError(f"{op}: deadline exceeded after {attempt} retries")
+                self._count("requests")
+                try:
+                    response = client.request(method, f"/{table}", params=params, json=json, headers=headers,
+                                              timeout=min(self.timeout, remaining))
+                    return self._decode(response)
+                except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                    if not self._should_retry(e, method, retry, attempt):
+                        raise
+                    attempt += 1
+                    self._count("retries")
+                    time.sleep(min(self._backoff(attempt), max(ends_at - time.monotonic(), 0)))
+        except Exception:
+            self._count("errors")
+            raise
+        finally:
+            self._sync_slots.release()
+            self._leave(op, time.perf_counter() - start)
+
+    def get_stats(self):
+        with self._lock:
+            latency = {
+                op: {
+                    "count": v["count"],
+                    "avg_ms": round(v["total_ms"] / v["count"], 2) if v["count"] else 0.0,
+                    "max_ms": round(v["max_ms"], 2),
+                }
+                for op, v in self.stats["latency"].items()
+            }
+            return {
+                **{k: v for k, v in self.stats.items() if k != "latency"},
+                "pool_size": self.pool_size,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "utilization": round(self.in_flight / self.pool_size, 2) if self.pool_size else 0.0,
+                "latency": latency,
+            }
+
+
+async def _close_quietly(client):
+    try:
+        await client.aclose()
+    except Exception as e:
+        print(f"Error closing a PostgREST client of an earlier event loop: {e}")
+
+
+# Shared pool
+pool = PostgrestPool()
+
+# (session_id, user_id) -> most recent {"question", "answer"} written or read by any worker
+_last_turns = create_cache("last_turns", maxsize=4096, ttl=LAST_TURN_TTL_SECONDS, read_through=True)
+
+
+def get_pool_stats():
+    return pool.get_stats()
+
+
+def get_last_turn(session_id, user_id):
+    """Return the session's most recent turn if this process has seen it, else None (unknown)."""
+    return _last_turns.get((session_id, user_id))
+
+
+def _user_filter(user_id):
+    # Guest rows have a NULL user_id, which eq. cannot match
+    return "is.null" if user_id in (None, "none") else f"eq.{user_id}"
+
+
+CLUB_INFO_DEFAULTS = {
+    "name": "Unknown Club",
+    "description": "No description available.",
+    "category": "Unknown category.",
+    "location": "Unknown location.",
+    "website_url": "No website available.",
+    "leader_name": "Unknown",
+    "leader_contact": "Unknown",
+}
+
+
+def club_info_params(club_id):
+    return {"select": ",".join(CLUB_INFO_DEFAULTS), "id": f"eq.{club_id}", "limit": 1}
+
+
+def club_info(rows):
+    """Club info with a placeholder for every missing field."""
+    row = rows[0] if rows else {}
+    return {field: row.get(field, default) for field, default in CLUB_INFO_DEFAULTS.items()}
+
+
+def format_clubs(rows):
+    """Render the club catalog for the LLM prompts."""
+    result = ""
+    for club in rows:
+        result += "----------------------------------------\n"
+        result += f"Club Name: {club.get('name', 'Unnamed Club')}\n"
+        result += f"Description: {club.get('description', 'No description available.')}\n"
+        result += f"Category: {club.get('category', 'Uncategorized')}\n"
+    result += "----------------------------------------"
+    return result
+
+
+def event_params(club_id, from_date=None, to_date=None, statuses=None, limit=None):
+    """
+    Query for a club's events that have not ended by `from_date` (today by default),
+    ordered by start date. See supabase_client.fetch_event_by_club.
+    """
+    from_date = from_date or date.today().isoformat()
+    params = {
+        "select": "title,description,location,time_range,start_date,end_date,status",
+        "club_id": f"eq.{club_id}",
+        "or": f"(end_date.gte.{from_date},and(end_date.is.null,start_date.gte.{from_date}))",
+        "order": "start_date.asc",
+    }
+    if to_date:
+        params["start_date"] = f"lte.{to_date}"
+    if statuses:
+        params["status"] = f"in.({','.join(statuses)})"
+    if limit:
+        params["limit"] = limit
+    return params
+
+
+def state_row(sess, user, action, club_id, updates):
+    return {"session_id": sess, "user_id": user, "action": action, "club_id": club_id, "updates": updates}
+
+
+def state_params(sess, user):
+    return {"session_id": f"eq.{sess}", "user_id": _user_filter(user)}
+
+
+# Fetch club info (name, description, category, location, website)
+async def get_club_info_by_id(club_id):
+    return club_info(await pool.request("GET", "clubs", params=club_info_params(club_id)))
+
+
+async def get_all_clubs(formatted=True):
+    rows = await pool.request("GET", "clubs", params={"select": "id,name,description,category"})
+
+    if not rows:
+        return "No clubs found." if formatted else []
+    return format_clubs(rows) if formatted else rows
+
+
+async def fetch_faqs_by_club(club_id):
+    return await pool.request("GET", "club_faqs", params={"select": "*", "club_id": f"eq.{club_id}"}) or []
+
+
+async def fetch_event_by_club(club_id, from_date=None, to_date=None, statuses=None, limit=None):
+    try:
+        return await pool.request("GET", "events", params=event_params(club_id, from_date, to_date, statuses, limit)) or []
+    except Exception as e:
+        print(f"Error fetching events for club ID '{club_id}': {e}")
+        return []
+
+
+async def fetch_username_by_id(user_id):
+    if user_id == "none":
+        return "Guest"
+    return await pool.request("GET", "profiles", params={"select": "username", "id": f"eq.{user_id}"})
+
+
+async def save_chat_history(session_id, user_id, user_question, llm_response):
+    _last_turns.set((session_id, user_id), {"question": user_question, "answer": llm_response})
+    try:
+        # An insert is not idempotent, so it is sent once (the pool only retries reads)
+        return await pool.request("POST", "chat_history", json={
+            "session_id": session_id,
+            "user_id": user_id if user_id != "none" else None,
+            "question": user_question,
+            "answer": llm_response
+        }, prefer="return=minimal")
+    except Exception as e:
+        print(f"Error saving chat history: {e}")
+        return None
+
+
+async def get_last_chats(user_id, session_id, limit=3):
+    try:
+        rows = await pool.request("GET", "chat_history", params={
+            "select": "question,answer",
+            "session_id": f"eq.{session_id}",
+            "user_id": _user_filter(user_id),
+            "order": "created_at.desc",
+            "limit": limit,
+        })
+        rows = list(reversed(rows)) if rows else []
+        if rows:
+            _last_turns.set((session_id, user_id), rows[-1])
+        return rows
+    except Exception as e:
+        print(f"Error retrieving chat history: {e}")
+        return []
+
+
+async def edit_clubs_by_id(club_id, **kwargs):
+    if not kwargs:
+        print("No fields provided to update.")
+        return None
+    try:
+        return await pool.request("PATCH", "clubs", params={"id": f"eq.{club_id}"}, json=kwargs,
+                                  prefer="return=representation", retry=True)
+    except Exception as e:
+        print(f"Error updating club with ID {club_id}: {e}")
+        return None
+
+
+async def load_state(sess, user):
+    rows = await pool.request("GET", "chat_state", params={"select": "*", **state_params(sess, user), "limit": 1})
+    return rows[0] if rows else None
+
+
+async def save_state(sess, user, action, club_id, updates):
+    row = state_row(sess, user, action, club_id, updates)
+    if user is None:
+        # NULLs never conflict in a unique key, so an upsert would add a row per save
+        await clear_state(sess, user)
+        await pool.request("POST", "chat_state", json=row, prefer="return=minimal")
+        return
+    await pool.request("POST", "chat_state", params={"on_conflict": "session_id,user_id"}, json=row,
+                       prefer="resolution=merge-duplicates,return=minimal", retry=True)
+
+
+async def clear_state(sess, user):
+    await pool.request("DELETE", "chat_state", params=state_params(sess, user), retry=True)
@@ -0,0 +1,5 @@
+import os
+
+# Keep tests isolated from each other and from earlier runs: in-process caches only
+# (test_shared_cache.py builds its own shared store in a temporary directory)
+os.environ.setdefault("SHARED_CACHE_ENABLED", "false")
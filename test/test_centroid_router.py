@@ -0,0 +1,93 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import pytest
+from unittest.mock import patch
+
+import centroid_router
+from centroid_router import CentroidRouter, centroid_route_noid
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+# Each word points along one axis, a text embeds to the sum of its words
+AXES = {"chess": 0, "board": 0, "music": 1, "band": 1, "recommend": 2, "suggest": 2}
+
+BANK = {
+    "single": ["chess board", "chess"],
+    "general": ["music band", "band"],
+    "recommendation": ["recommend", "suggest"],
+}
+
+def embed(text):
+    vector = np.zeros(4, dtype=np.float32)
+    for word in text.split():
+        vector[AXES.get(word, 3)] += 1.0
+    return vector
+
+def fake_embed_fn(calls):
+    def embed_fn(texts):
+        calls.append(list(texts))
+        return np.stack([embed(text) for text in texts])
+    return embed_fn
+
+def test_routes_to_nearest_label():
+    calls = []
+    router = CentroidRouter(bank=BANK, min_margin=0.05, top_k=2, cache_path=None, embed_fn=fake_embed_fn(calls))
+    assert router.route("chess", query_embedding=embed("chess"))[0] == "single"
+    assert router.route("band", query_embedding=embed("music"))[0] == "general"
+    assert router.route("suggest", query_embedding=embed("suggest"))[0] == "recommendation"
+    assert router.get_stats()["routed"] == 3
+    assert len(calls) == 1
+    print(color_text("Questions route to the label of their nearest centroid.", "green"))
+
+def test_escalates_when_margin_is_small():
+    # Every example votes, so a question halfway between two labels scores them equally
+    router = CentroidRouter(bank=BANK, min_margin=0.05, top_k=6, cache_path=None, embed_fn=fake_embed_fn([]))
+    label, margin = router.route("chess music", query_embedding=embed("chess music"))
+    assert label is None and margin < 0.05
+    assert router.get_stats()["escalated"] == 1
+    print(color_text("An ambiguous question is escalated to the LLM.", "green"))
+
+def test_bank_embeddings_are_cached_on_disk(tmp_path):
+    path = str(tmp_path / "router" / "noid_router.npz")
+    first_calls, second_calls = [], []
+    CentroidRouter(bank=BANK, cache_path=path, embed_fn=fake_embed_fn(first_calls)).build()
+    assert os.path.exists(path) and len(first_calls) == 1
+
+    second = CentroidRouter(bank=BANK, cache_path=path, embed_fn=fake_embed_fn(second_calls))
+    assert second.route("chess", query_embedding=embed("chess"))[0] == "single"
+    assert second_calls == []
+
+    # A different bank does not reuse the cached vectors
+    changed = {**BANK, "general": BANK["general"] + ["music"]}
+    CentroidRouter(bank=changed, cache_path=path, embed_fn=fake_embed_fn(second_calls)).build()
+    assert len(second_calls) == 1
+    print(color_text("The embedded bank is reused from disk until the bank changes.", "green"))
+
+def test_default_cache_is_untracked():
+    assert centroid_router.CENTROID_ROUTER_CACHE_PATH.startswith("cache/") or "CENTROID_ROUTER_CACHE_PATH" in os.environ
+    print(color_text("The router cache defaults to the untracked cache/ directory.", "green"))
+
+def test_follow_ups_are_deferred():
+    router = CentroidRouter(bank=BANK, cache_path=None, embed_fn=fake_embed_fn([]))
+    with patch("centroid_router.get_centroid_router", return_value=router), \
+         patch("centroid_router.embed_query", side_effect=embed) as embed_query:
+        assert centroid_route_noid("tell me more about it") is None
+        embed_query.assert_not_called()
+        assert centroid_route_noid("chess") == "single"
+    print(color_text("Follow-up questions are deferred without embedding them.", "green"))
+
+def test_router_errors_defer_to_llm():
+    with patch("centroid_router.get_centroid_router", side_effect=RuntimeError("no embedder")):
+        assert centroid_route_noid("recommend some clubs") is None
+    print(color_text("A router failure falls back to the LLM.", "green"))
@@ -17,11 +17,18 @@ def color_text(text, color):
     }
     return f"{colors.get(color, '')}{text}{colors['reset']}"
 
+# The local classifier answers some of these questions itself; these tests cover the LLM path
+@pytest.fixture(autouse=True)
+def llm_only():
+    with patch("classifier.classify_locally", return_value=None):
+        yield
+
 # --- Test classify_question ---
 @patch("classifier.query_gemini_llm")
 def test_classify_question_club(mock_llm):
     mock_llm.return_value = "Club"
     result = classifier.classify_question("What does the club do?")
+    mock_llm.assert_called_once()
     print(color_text("test_classify_question_club passed", "green"))
     assert result == "Club"
 
@@ -29,6 +36,7 @@ def test_classify_question_club(mock_llm):
 def test_classify_question_website(mock_llm):
     mock_llm.return_value = "Website"
     result = classifier.classify_question("How do I reset my password?")
+    mock_llm.assert_called_once()
     print(color_text("test_classify_question_website passed", "yellow"))
     assert result == "Website"
 
@@ -36,6 +44,7 @@ def test_classify_question_website(mock_llm):
 def test_classify_question_unexpected(mock_llm):
     mock_llm.return_value = "This is about the club"
     result = classifier.classify_question("Tell me more")
+    mock_llm.assert_called_once()
     print(color_text("test_classify_question_unexpected passed", "blue"))
     assert result == "Club"
 
@@ -44,6 +53,7 @@ def test_classify_question_unexpected(mock_llm):
 def test_classify_question_noid_single(mock_llm):
     mock_llm.return_value = "single"
     result = classifier.classify_question_noid("Tell me about the Chess Club")
+    mock_llm.assert_called_once()
     print(color_text("test_classify_question_noid_single passed", "green"))
     assert result == "single"
 
@@ -51,6 +61,7 @@ def test_classify_question_noid_single(mock_llm):
 def test_classify_question_noid_clublist(mock_llm):
     mock_llm.return_value = "clublist"
     result = classifier.classify_question_noid("What clubs are there?")
+    mock_llm.assert_called_once()
     print(color_text("test_classify_question_noid_clublist passed", "yellow"))
     assert result == "clublist"
 
@@ -58,6 +69,7 @@ def test_classify_question_noid_clublist(mock_llm):
 def test_classify_question_noid_recommendation(mock_llm):
     mock_llm.return_value = "recommendation"
     result = classifier.classify_question_noid("What clubs would you recommend?")
+    mock_llm.assert_called_once()
     print(color_text("test_classify_question_noid_recommendation passed", "blue"))
     assert result == "recommendation"
 
@@ -65,6 +77,7 @@ def test_classify_question_noid_recommendation(mock_llm):
 def test_classify_question_noid_general(mock_llm):
     mock_llm.return_value = "general"
     result = classifier.classify_question_noid("Where is the library?")
+    mock_llm.assert_called_once()
     print(color_text("test_classify_question_noid_general passed", "red"))
     assert result == "general"
 
@@ -0,0 +1,79 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+
+import classifier_eval
+from classifier_eval import RecordedLLM, evaluate, load_dataset, _item_key
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+def gold_recordings(items):
+    """Recorded responses that echo the gold label in each LLM's reply format."""
+    replies = {"safe": "Yes", "unsafe": "No"}
+    return {_item_key(item): replies.get(item["label"], item["label"]) for item in items}
+
+@pytest.fixture(scope="module")
+def items():
+    return load_dataset()
+
+# --- Dataset sanity ---
+def test_dataset_covers_every_task(items):
+    assert {item["task"] for item in items} == set(classifier_eval.TASKS)
+    assert len({item["id"] for item in items}) == len(items)
+    print(color_text("test_dataset_covers_every_task passed", "green"))
+
+def test_dataset_is_held_out_from_seed_examples(items):
+    from local_classifier import SEED_EXAMPLES, normalize
+    for item in items:
+        seeds = {normalize(text) for texts in SEED_EXAMPLES.get(item["task"], {}).values() for text in texts}
+        assert normalize(item["question"]) not in seeds, item["id"]
+    print(color_text("test_dataset_is_held_out_from_seed_examples passed", "blue"))
+
+# --- Local router quality ---
+def test_local_router_is_precise_when_it_answers(items):
+    report = evaluate("local", items)
+    for task in ("question", "noid", "catcher", "safety"):
+        assert report[task]["accuracy_when_decided"] >= 0.9, report[task]["errors"]
+        assert report[task]["llm_calls"] == 0
+    print(color_text("test_local_router_is_precise_when_it_answers passed", "yellow"))
+
+# --- Offline replay of LLM-backed routers ---
+def test_replayed_llm_and_hybrid_routers(items):
+    recordings = gold_recordings(items)
+    llm_report = evaluate("llm", items, RecordedLLM(recordings))
+    hybrid_report = evaluate("hybrid", items, RecordedLLM(recordings))
+    for task in ("question", "noid", "catcher", "edit"):
+        assert llm_report[task]["accuracy"] == 1.0, llm_report[task]["errors"]
+        assert hybrid_report[task]["llm_calls"] < llm_report[task]["llm_calls"] or task == "edit"
+    print(color_text("test_replayed_llm_and_hybrid_routers passed", "blue"))
+
+def test_cached_router_skips_repeat_calls(items):
+    recordings = gold_recordings(items)
+    doubled = items + items
+    hybrid = evaluate("hybrid", doubled, RecordedLLM(recordings))
+    cached = evaluate("cached", doubled, RecordedLLM(recordings))
+    assert cached["question"]["llm_calls"] * 2 == hybrid["question"]["llm_calls"]
+    print(color_text("test_cached_router_skips_repeat_calls passed", "red"))
+
+def test_missing_recordings_are_not_scored(items):
+    recordings = gold_recordings(items)
+    dropped = [item for item in items if item["task"] == "question"][:3]
+    for item in dropped:
+        del recordings[_item_key(item)]
+    report = evaluate("llm", items, RecordedLLM(recordings))
+    question_items = [item for item in items if item["task"] == "question"]
+    assert report["question"]["missing"] == 3
+    assert report["question"]["missing_ids"] == [item["id"] for item in dropped]
+    assert report["question"]["n"] == len(question_items) - 3
+    assert report["question"]["accuracy"] == 1.0
+    print(color_text("test_missing_recordings_are_not_scored passed", "green"))
@@ -0,0 +1,125 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from unittest.mock import patch, MagicMock
+
+import faq_formatter
+from club_context import ClubContextCache
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+CLUB_INFO = {
+    "name": "Chess Club", "description": "We play chess", "category": "Academics", "location": "Room 1",
+    "website_url": "-", "leader_name": "Ann", "leader_contact": "ann@example.com",
+}
+
+@pytest.fixture
+def sources():
+    cache = ClubContextCache()
+    faqs = MagicMock(return_value=[{"question": "Who can join?", "answer": "Everyone"}])
+    info = MagicMock(return_value=CLUB_INFO)
+    events = MagicMock()
+    events.upcoming.return_value = []
+    with patch("faq_formatter.club_context_cache", cache), \
+         patch("faq_formatter.fetch_faqs_by_club", faqs), \
+         patch("faq_formatter.get_club_info_by_id", info), \
+         patch("faq_formatter.fetch_username_by_id", side_effect=lambda user_id: f"name-{user_id}"), \
+         patch("faq_formatter.event_index", events):
+        yield cache, faqs
+
+# --- Shared club portion ---
+def test_club_portion_is_shared_between_users(sources):
+    cache, faqs = sources
+    first = faq_formatter.format_faqs_for_llm_club("c1", "u1")
+    second = faq_formatter.format_faqs_for_llm_club("c1", "u2")
+    assert faqs.call_count == 1
+    assert "Username: name-u1" in first and "Username: name-u2" in second
+    assert first.split("USER INFORMATION")[0] == second.split("USER INFORMATION")[0]
+    print(color_text("test_club_portion_is_shared_between_users passed", "green"))
+
+# --- Invalidation ---
+def test_invalidation_bumps_version(sources):
+    cache, faqs = sources
+    faq_formatter.format_faqs_for_llm_club("c1", "u1")
+    cache.invalidate("c1")
+    faqs.return_value = [{"question": "Fees?", "answer": "None"}]
+    context = faq_formatter.format_faqs_for_llm_club("c1", "u1")
+    assert faqs.call_count == 2
+    assert "Q1: Fees?" in context
+    print(color_text("test_invalidation_bumps_version passed", "yellow"))
+
+def test_render_started_before_invalidation_is_not_cached():
+    cache = ClubContextCache()
+    version = cache.version("c1")
+    cache.invalidate("c1")
+    cache.set("c1", "2030-01-01", {"text": "old"}, version)
+    assert cache.get("c1", "2030-01-01") is None
+    print(color_text("test_render_started_before_invalidation_is_not_cached passed", "blue"))
+
+# --- Relevant FAQ subset ---
+def test_relevant_mode_selects_matching_faqs(sources):
+    cache, faqs = sources
+    faqs.return_value = [
+        {"question": "Who can join?", "answer": "Everyone"},
+        {"question": "When are the meetings?", "answer": "Fridays at 5pm"},
+        {"question": "Is there a membership fee?", "answer": "No fee"},
+    ]
+    context = faq_formatter.format_faqs_for_llm_club("c2", "u1", question="when do meetings happen", mode="relevant")
+    assert "Q1: When are the meetings?" in context
+    assert "Who can join?" not in context
+    full = faq_formatter.format_faqs_for_llm_club("c2", "u1", question="when do meetings happen", mode="all")
+    assert "Q3: Is there a membership fee?" in full
+    print(color_text("test_relevant_mode_selects_matching_faqs passed", "red"))
+
+# --- Direct FAQ answers ---
+def test_direct_answer_for_near_verbatim_faq(sources):
+    cache, faqs = sources
+    faqs.return_value = [
+        {"question": "Who can join?", "answer": "Everyone is welcome."},
+        {"question": "When are the meetings?", "answer": "Fridays at 5pm."},
+    ]
+    assert faq_formatter.direct_faq_answer("c3", "who can join") == "Everyone is welcome."
+    assert faq_formatter.direct_faq_answer("c3", "When are the meetings??") == "Fridays at 5pm."
+    assert faq_formatter.direct_faq_answer("c3", "How much does membership cost?") is None
+    print(color_text("test_direct_answer_for_near_verbatim_faq passed", "green"))
+
+@pytest.mark.parametrize("question", [
+    "Where are the meetings?",
+    "Why are the meetings?",
+    "who cannot join the club?",
+    "Is there no membership fee?",
+])
+def test_near_miss_questions_are_not_answered_directly(sources, question):
+    cache, faqs = sources
+    faqs.return_value = [
+        {"question": "When are the meetings?", "answer": "Fridays at 5pm."},
+        {"question": "Who can join the club?", "answer": "Everyone is welcome."},
+        {"question": "Is there a membership fee?", "answer": "No fee."},
+    ]
+    assert faq_formatter.direct_faq_answer("c4", question) is None
+    print(color_text(f"test_near_miss_questions_are_not_answered_directly passed for {question!r}", "yellow"))
+
+# --- Token budget ---
+def test_budget_trims_only_faqs_and_events(sources):
+    cache, faqs = sources
+    faqs.return_value = [
+        {"question": f"FAQ question {i}?", "answer": f"A long answer to FAQ {i}. " * 8} for i in range(1, 121)
+    ]
+    context = faq_formatter.format_faqs_for_llm_club("c3", "u1", mode="all")
+    assert "omitted to fit the prompt budget" in context
+    assert "Q1: FAQ question 1?" in context and "FAQ question 120?" not in context
+    assert "- Club Name: Chess Club" in context
+    assert "Username: name-u1" in context
+    assert context.endswith(faq_formatter.CLUB_CONTEXT_TAIL)
+    assert "STRICT MODE" in context and "----CONTEXT END----" in context
+    print(color_text("test_budget_trims_only_faqs_and_events passed", "green"))
@@ -0,0 +1,110 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+import numpy as np
+
+import club_index
+from club_index import ClubVectorIndex
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+VOCAB = ["music", "sports", "code", "art"]
+
+def fake_embed(texts):
+    return np.array([[t.lower().count(w) + 0.01 for w in VOCAB] for t in texts], dtype=np.float32)
+
+CLUBS = [
+    {"id": 1, "name": "Choir", "description": "music and singing, more music", "category": "Music"},
+    {"id": 2, "name": "Football", "description": "sports on weekends", "category": "Sports"},
+    {"id": 3, "name": "Hackers", "description": "code and code reviews", "category": "Technology"},
+]
+
+@pytest.fixture
+def index():
+    calls = []
+    def embed(texts):
+        calls.append(len(texts))
+        return fake_embed(texts)
+    idx = ClubVectorIndex(load_clubs=lambda: CLUBS, embed_fn=embed, cache_path=None, snapshot_dir=None)
+    idx.embed_calls = calls
+    return idx
+
+# --- Ranking ---
+def test_rank_returns_best_match_first(index):
+    results = index.rank(fake_embed(["music"])[0], top_k=2)
+    assert results[0]["club"]["name"] == "Choir"
+    assert len(results) == 2
+    print(color_text("test_rank_returns_best_match_first passed", "green"))
+
+def test_category_filter_applies_before_scoring(index):
+    results = index.rank(fake_embed(["music"])[0], categories=["sports"], top_k=5)
+    assert [r["club"]["name"] for r in results] == ["Football"]
+    print(color_text("test_category_filter_applies_before_scoring passed", "yellow"))
+
+def test_min_score_drops_weak_matches(index):
+    results = index.rank(fake_embed(["code"])[0], top_k=3, min_score=0.9)
+    assert [r["club"]["name"] for r in results] == ["Hackers"]
+    print(color_text("test_min_score_drops_weak_matches passed", "blue"))
+
+# --- Rebuilds ---
+def test_rebuild_embeds_only_changed_clubs(index):
+    index.build()
+    changed = CLUBS[:2] + [{**CLUBS[2], "description": "art and code"}]
+    assert index.build(changed) is True
+    assert index.build(changed) is False
+    assert index.embed_calls == [3, 1]
+    print(color_text("test_rebuild_embeds_only_changed_clubs passed", "red"))
+
+# --- Category inverted index ---
+def test_rank_categories_needs_no_query_embedding(index):
+    results = index.rank_categories(["Music", "technology"], top_k=5)
+    assert {r["club"]["name"] for r in results} == {"Choir", "Hackers"}
+    assert [c["name"] for c in index.clubs_in_categories(["sports"])] == ["Football"]
+    print(color_text("test_rank_categories_needs_no_query_embedding passed", "green"))
+
+# --- Shared snapshot (multi-worker) ---
+def test_snapshot_is_mapped_by_other_workers(tmp_path):
+    calls = []
+    def embed(texts):
+        calls.append(len(texts))
+        return fake_embed(texts)
+    first = ClubVectorIndex(load_clubs=lambda: CLUBS, embed_fn=embed, cache_path=None, snapshot_dir=str(tmp_path))
+    first.build()
+    # A second worker (and the gunicorn parent) map the same matrix without embedding
+    second = ClubVectorIndex(load_clubs=lambda: CLUBS, embed_fn=embed, cache_path=None, snapshot_dir=str(tmp_path))
+    assert second.build() is True
+    parent = ClubVectorIndex(load_clubs=lambda: [], cache_path=None, snapshot_dir=str(tmp_path))
+    assert parent.load_snapshot() is True
+    assert calls == [3]
+    assert isinstance(second.matrix, np.memmap) and isinstance(parent.matrix, np.memmap)
+    results = parent.rank(fake_embed(["music"])[0], top_k=1)
+    assert results[0]["club"]["name"] == "Choir"
+    print(color_text("test_snapshot_is_mapped_by_other_workers passed", "green"))
+
+def test_stale_snapshot_is_rebuilt(tmp_path):
+    index = ClubVectorIndex(load_clubs=lambda: CLUBS, embed_fn=fake_embed, cache_path=None, snapshot_dir=str(tmp_path))
+    index.build()
+    changed = CLUBS + [{"id": 4, "name": "Painters", "description": "art", "category": "Art"}]
+    other = ClubVectorIndex(load_clubs=lambda: changed, embed_fn=fake_embed, cache_path=None, snapshot_dir=str(tmp_path))
+    other.build()
+    assert other.stats["embedded"] == 4 and len(other.clubs) == 4
+    assert len(list(tmp_path.glob("matrix-*.npy"))) == 1
+    print(color_text("test_stale_snapshot_is_rebuilt passed", "yellow"))
+
+def test_default_cache_is_untracked():
+    # chroma_db/ is tracked in git; runtime files belong in the ignored cache/ directory
+    if "CLUB_INDEX_CACHE_PATH" not in os.environ:
+        assert club_index.CLUB_INDEX_CACHE_PATH.startswith("cache/")
+    if "CLUB_INDEX_SNAPSHOT_DIR" not in os.environ:
+        assert club_index.CLUB_INDEX_SNAPSHOT_DIR.startswith("cache/")
+    print(color_text("test_default_cache_is_untracked passed", "green"))
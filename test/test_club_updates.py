@@ -0,0 +1,171 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import httpx
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+import create_edit_funcs
+from club_updates import ClubUpdateEngine, BASE_KEY
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+
+class FakePool:
+    """Minimal stand-in for the PostgREST pool on an in-memory clubs table."""
+
+    def __init__(self, rows, rpc_error=None):
+        self.rows = rows
+        self.updates = []
+        self.rpc_calls = []
+        self.rpc_error = rpc_error
+
+    def request_sync(self, method, table, params=None, json=None, prefer=None, retry=None):
+        if table.startswith("rpc/"):
+            return self.rpc(json)
+        filters = {k: v[len("eq."):] for k, v in (params or {}).items() if str(v).startswith("eq.")}
+        rows = [r for r in self.rows if all(str(r.get(c)) == v for c, v in filters.items())]
+        if method == "PATCH":
+            self.updates.append(dict(json))
+            for row in rows:
+                row.update(json)
+        return [dict(r) for r in rows]
+
+    def rpc(self, params):
+        if self.rpc_error:
+            raise self.rpc_error
+        self.rpc_calls.append(params)
+        result = []
+        for change in params["changes"]:
+            row = next(r for r in self.rows if str(r["id"]) == change["id"])
+            applied = change["base"] is None or row["version"] == change["base"]
+            if applied:
+                row.update(change["fields"], version=row["version"] + 1)
+            result.append({"club_id": change["id"], "applied": applied, "version": row["version"]})
+        return result
+
+
+def _engine(rows, **kwargs):
+    engine = ClubUpdateEngine(pool=FakePool(rows, **kwargs), version_column="version")
+    engine.on_commit = MagicMock()
+    return engine
+
+
+def _club(club_id=1, version=1, **fields):
+    return {"id": club_id, "name": "Chess", "location": "Room 1", "version": version, **fields}
+
+
+def test_only_changed_columns_are_sent():
+    engine = _engine([_club()])
+    result = engine.commit(1, {"name": "Chess", "location": "Room 2", BASE_KEY: 1}, base=1)
+    assert result["status"] == "applied" and result["fields"] == ["location"]
+    assert engine.pool.updates == [{"location": "Room 2", "version": 2}]
+    engine.on_commit.assert_called_once_with(1)
+    print(color_text("✓ Only changed columns sent, cache invalidated on commit", "green"))
+
+
+def test_unchanged_updates_skip_the_write():
+    engine = _engine([_club()])
+    assert engine.commit(1, {"name": "Chess "})["status"] == "unchanged"
+    assert engine.pool.updates == []
+    engine.on_commit.assert_not_called()
+    print(color_text("✓ Unchanged values are not rewritten", "green"))
+
+
+def test_concurrent_commit_is_reported_as_conflict():
+    rows = [_club()]
+    engine = _engine(rows)
+    base = engine.snapshot(1)
+    rows[0].update(location="Gym", version=2)  # another manager commits meanwhile
+    result = engine.commit(1, {"location": "Room 2"}, base=base)
+    assert result["status"] == "conflict"
+    assert result["conflicts"] == {"location": "Gym"} and result["version"] == 2
+    assert rows[0]["location"] == "Gym"
+    # Rebased onto the reported version, the retry applies
+    assert engine.commit(1, {"location": "Room 2"}, base=result["version"])["status"] == "applied"
+    assert rows[0]["location"] == "Room 2"
+    print(color_text("✓ Conflicting commit detected, retry on the new version applies", "green"))
+
+
+def test_bulk_commit_is_one_request():
+    rows = [_club(1), _club(2), _club(3)]
+    engine = _engine(rows)
+    results = engine.commit_many([(1, {"location": "A"}, None), (2, {"name": "Chess"}, None), (3, {"name": "Go"}, None)])
+    assert [r["status"] for r in results] == ["applied", "unchanged", "applied"]
+    assert len(engine.pool.rpc_calls) == 1 and len(engine.pool.rpc_calls[0]["changes"]) == 2
+    assert rows[0]["location"] == "A" and rows[2]["name"] == "Go"
+    print(color_text("✓ Bulk edits sent in one request", "green"))
+
+
+def test_bulk_commit_reports_each_change_to_the_same_club():
+    rows = [_club(1), _club(2)]
+    engine = _engine(rows)
+    results = engine.commit_many([(1, {"location": "A"}, 1), (2, {"name": "Go"}, None), (1, {"name": "Go"}, 1)])
+    assert [(r["club_id"], r["status"]) for r in results] == [(1, "applied"), (2, "applied"), (1, "conflict")]
+    assert results[0]["fields"] == ["location"] and results[2]["conflicts"] == {"name": "Chess"}
+    assert rows[0]["location"] == "A" and rows[0]["name"] == "Chess"
+    print(color_text("✓ Two changes to one club get their own results", "yellow"))
+
+
+def test_bulk_commit_falls_back_without_rpc():
+    engine = _engine([_club(1), _club(2)], rpc_error=RuntimeError("function not found"))
+    results = engine.commit_many([(1, {"location": "A"}, None), (2, {"location": "B"}, None)])
+    assert [r["status"] for r in results] == ["applied", "applied"]
+    assert len(engine.pool.updates) == 2
+    print(color_text("✓ Bulk edits fall back to one commit per club", "green"))
+
+
+@patch("create_edit_funcs.state_store")
+def test_edit_session_conflict_keeps_session_open(mock_store):
+    rows = [_club(version=2, location="Gym")]
+    with patch.object(create_edit_funcs, "club_updates", _engine(rows)):
+        state = {"action": "editing", "club_id": 1, "updates": {"location": "Room 2", BASE_KEY: 1}}
+        question = SimpleNamespace(user_question="done", user_id="u1", session_id="s1", club_id=1)
+        response = create_edit_funcs.handle_club_edit(question, state, "key")
+    assert "someone else updated" in response["answer"]
+    assert mock_store.save.call_args.kwargs["updates"] == {"location": "Room 2", BASE_KEY: 2}
+    mock_store.clear.assert_not_called()
+    print(color_text("✓ Edit session rebased after a conflict", "green"))
+
+
+class FailingPool(FakePool):
+    def __init__(self, rows, error):
+        super().__init__(rows)
+        self.error = error
+
+    def request_sync(self, *args, **kwargs):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        return super().request_sync(*args, **kwargs)
+
+
+def test_transient_read_error_keeps_the_version_check():
+    engine = ClubUpdateEngine(pool=FailingPool([_club()], TimeoutError("read timed out")), version_column="version")
+    engine.on_commit = MagicMock()
+    with pytest.raises(TimeoutError):
+        engine.current(1)
+    assert engine.version_column == "version"
+    assert engine.snapshot(1) == 1
+    print(color_text("✓ A timeout does not drop the optimistic version check", "green"))
+
+
+def test_missing_version_column_drops_the_precondition():
+    request = httpx.Request("GET", "http://postgrest.test/rest/v1/clubs")
+    response = httpx.Response(400, json={"code": "42703", "message": "column clubs.version does not exist"},
+                              request=request)
+    error = httpx.HTTPStatusError("Bad Request", request=request, response=response)
+    engine = ClubUpdateEngine(pool=FailingPool([_club()], error), version_column="version")
+    assert engine.current(1)["name"] == "Chess"
+    assert engine.version_column is None
+    print(color_text("✓ Missing version column falls back to unconditional updates", "green"))
@@ -0,0 +1,79 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from unittest.mock import patch
+
+import dialogue_state
+import recommender
+from state_store import ChatStateStore, FileStateBackend
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+@pytest.fixture(autouse=True)
+def store(tmp_path):
+    store = ChatStateStore(FileStateBackend(str(tmp_path / "chat_state.json")))
+    with patch("dialogue_state.state_store", store):
+        yield store
+
+# --- Pending prompts ---
+def test_no_pending_prompt_by_default():
+    assert dialogue_state.get_pending_prompt("s1", "u1") is None
+    print(color_text("test_no_pending_prompt_by_default passed", "green"))
+
+def test_set_and_clear_pending_prompt():
+    dialogue_state.set_pending_prompt("s1", "u1", dialogue_state.AWAITING_ALL_CLUBS)
+    assert dialogue_state.get_pending_prompt("s1", "u1") == dialogue_state.AWAITING_ALL_CLUBS
+    dialogue_state.clear_pending_prompt("s1", "u1")
+    assert dialogue_state.get_pending_prompt("s1", "u1") is None
+    print(color_text("test_set_and_clear_pending_prompt passed", "yellow"))
+
+def test_pending_prompt_does_not_overwrite_edit(store):
+    store.save("s1", "u1", "editing", "club-1", {"name": "Chess"})
+    dialogue_state.set_pending_prompt("s1", "u1", dialogue_state.AWAITING_INTERESTS)
+    dialogue_state.clear_pending_prompt("s1", "u1")
+    assert store.load("s1", "u1")["action"] == "editing"
+    print(color_text("test_pending_prompt_does_not_overwrite_edit passed", "blue"))
+
+def test_guest_prompt_is_stored_without_user_id(store):
+    dialogue_state.set_pending_prompt("s1", "none", dialogue_state.AWAITING_INTERESTS)
+    store.flush()
+    assert store.backend.load("s1", None)["user_id"] is None
+    assert dialogue_state.get_pending_prompt("s1", "none") == dialogue_state.AWAITING_INTERESTS
+    print(color_text("test_guest_prompt_is_stored_without_user_id passed", "yellow"))
+
+# --- Replies to the interests prompt ---
+@pytest.mark.parametrize("reply", ["I like music and coding", "chess, hiking", "mostly sports I guess"])
+def test_interests_answer(reply):
+    assert dialogue_state.is_interests_answer(reply)
+    print(color_text(f"test_interests_answer passed for {reply!r}", "blue"))
+
+@pytest.mark.parametrize("reply", ["When does the chess club meet?", "how do I log in", "", "?"])
+def test_new_question_is_not_an_interests_answer(reply):
+    assert not dialogue_state.is_interests_answer(reply)
+    print(color_text(f"test_new_question_is_not_an_interests_answer passed for {reply!r}", "red"))
+
+# --- Recommender sets the state ---
+@patch("recommender.extract_interests", return_value=[])
+def test_recommender_clarify_awaits_interests(mock_extract):
+    result = recommender.recommend_clubs("recommend me a club", "u1", "s1")
+    assert result["answer"] == dialogue_state.INTERESTS_PROMPT
+    assert dialogue_state.get_pending_prompt("s1", "u1") == dialogue_state.AWAITING_INTERESTS
+    print(color_text("test_recommender_clarify_awaits_interests passed", "red"))
+
+@patch("recommender.recommendation_cache.get_or_compute", return_value=[])
+@patch("recommender.extract_interests", return_value=["Music"])
+def test_recommender_no_match_awaits_all_clubs(mock_extract, mock_rank):
+    result = recommender.recommend_clubs("I like jazz", "u1", "s1")
+    assert result["answer"].endswith(dialogue_state.ALL_CLUBS_PROMPT)
+    assert dialogue_state.get_pending_prompt("s1", "u1") == dialogue_state.AWAITING_ALL_CLUBS
+    print(color_text("test_recommender_no_match_awaits_all_clubs passed", "green"))
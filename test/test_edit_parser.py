@@ -0,0 +1,102 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+import create_edit_funcs
+from edit_parser import parse_edit_command, detect_edit_intent, coverage_report
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+
+@pytest.mark.parametrize("message,expected", [
+    ("Change the name to Chess Society", {"name": "Chess Society"}),
+    ("set location: Library Room 201", {"location": "Library Room 201"}),
+    ("update meeting_time to Tuesdays at 5pm", {"meeting_time": "Tuesdays at 5pm"}),
+    ("Rename the club to “Go Club”", {"name": "Go Club"}),
+    ("the leader's contact: ann@example.com, please", {"leader_contact": "ann@example.com"}),
+    ("Set the website to https://chess.example.org.", {"website_url": "https://chess.example.org"}),
+    ("change the club name to Chess Society and set the location to Room 3; category: Academics",
+     {"name": "Chess Society", "location": "Room 3", "category": "Academics"}),
+    ("Update the description to: Fun club", {"description": "Fun club"}),
+    ("set the description to We meet weekly; bring snacks", {"description": "We meet weekly; bring snacks"}),
+    ("location: Gym\ncategory: Sports", {"location": "Gym", "category": "Sports"}),
+    # Statements without an edit verb or an explicit ":"/"=" are not edits
+    ("email is a good way to reach us", {}),
+    ("the description should be updated soon", {}),
+    ("the leader's contact is ann@example.com", {}),
+    ("Our time is limited", {}),
+    ("Can you help me with the club?", {}),
+])
+def test_parse_edit_command(message, expected):
+    assert parse_edit_command(message) == expected
+    print(color_text(f"✓ {message!r} -> {expected}", "green"))
+
+
+@pytest.mark.parametrize("message,expected", [
+    ("Can you help me edit my club details?", "edit"),
+    ("Update the meeting time", "edit"),
+    ("Set location: Gym", "edit"),
+    ("How do I edit club details?", "none"),
+    ("Thanks!", "none"),
+    ("I'd like to fix something", None),
+])
+def test_detect_edit_intent(message, expected):
+    assert detect_edit_intent(message) == expected
+    print(color_text(f"✓ intent {message!r} -> {expected}", "green"))
+
+
+def _question(text):
+    return SimpleNamespace(user_question=text, user_id="u1", session_id="s1", club_id="c1")
+
+
+@patch("create_edit_funcs._snapshot", return_value=None)
+@patch("create_edit_funcs.query_gemini_json")
+@patch("create_edit_funcs.classify_edit")
+@patch("create_edit_funcs.state_store")
+def test_edit_flow_parsed_locally_without_llm(mock_store, mock_classify, mock_llm, mock_snapshot):
+    response = create_edit_funcs.handle_club_edit(_question("Change the name to Chess Society"), None, "key")
+    assert "name: Chess Society" in response["answer"]
+    assert mock_store.save.call_args.kwargs["updates"] == {"name": "Chess Society"}
+
+    state = {"action": "editing", "club_id": "c1", "updates": {"name": "Chess Society"}}
+    response = create_edit_funcs.handle_club_edit(_question("set location: Room 3"), state, "key")
+    assert "name: Chess Society; location: Room 3" in response["answer"]
+    assert mock_store.save.call_args.kwargs["updates"] == {"name": "Chess Society", "location": "Room 3"}
+    mock_classify.assert_not_called()
+    mock_llm.assert_not_called()
+    print(color_text("✓ Edit flow handled without LLM calls", "green"))
+
+
+@patch("create_edit_funcs.query_gemini_json", return_value={"description": "We play Go"})
+@patch("create_edit_funcs.state_store")
+def test_unparsed_update_falls_back_to_llm(mock_store, mock_llm):
+    state = {"action": "editing", "club_id": "c1", "updates": {}}
+    create_edit_funcs.handle_club_edit(_question("we mostly play Go these days, put that in"), state, "key")
+    mock_llm.assert_called_once()
+    assert mock_store.save.call_args.kwargs["updates"] == {"description": "We play Go"}
+    print(color_text("✓ Unparsed update falls back to the LLM", "green"))
+
+
+def test_coverage_report():
+    records = [
+        {"stage": "extract", "message": "set location: Gym"},
+        {"stage": "extract", "message": "we mostly play Go these days"},
+        {"stage": "intent", "message": "Update the meeting time"},
+    ]
+    report = coverage_report(records)
+    assert report["extract"]["coverage"] == 0.5
+    assert report["extract"]["unparsed_sample"] == ["we mostly play Go these days"]
+    assert report["intent"]["coverage"] == 1.0
+    print(color_text("✓ Coverage report on logged messages", "green"))
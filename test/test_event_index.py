@@ -0,0 +1,93 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from unittest.mock import patch
+
+import event_index
+import supabase_client
+from event_index import ClubEventIndex
+from shared_cache import SharedStore, SharedCache
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+EVENTS = [
+    {"title": "Open day", "start_date": "2030-01-10", "end_date": "2030-01-10"},
+    {"title": "Kickoff", "start_date": "2030-01-02", "end_date": None},
+]
+
+@pytest.fixture
+def fetch():
+    with patch("event_index.fetch_event_by_club", return_value=list(EVENTS)) as fetch:
+        yield fetch
+
+# --- Date window ---
+def test_window_is_pushed_to_the_query(fetch):
+    index = ClubEventIndex(horizon_days=30, max_events=7)
+    index.upcoming("c1", today="2030-01-01")
+    fetch.assert_called_once_with("c1", from_date="2030-01-01", to_date="2030-01-31", limit=7)
+    print(color_text("test_window_is_pushed_to_the_query passed", "yellow"))
+
+def test_database_filter_skips_ended_events_and_bounds_the_horizon():
+    with patch.object(supabase_client.pool, "request_sync", return_value=[]) as request:
+        supabase_client.fetch_event_by_club("c1", from_date="2030-01-01", to_date="2030-01-31", limit=7)
+    method, table = request.call_args.args
+    params = request.call_args.kwargs["params"]
+    assert (method, table) == ("GET", "events")
+    assert params["or"] == "(end_date.gte.2030-01-01,and(end_date.is.null,start_date.gte.2030-01-01))"
+    assert params["start_date"] == "lte.2030-01-31"
+    assert params["limit"] == 7 and params["order"] == "start_date.asc"
+    print(color_text("test_database_filter_skips_ended_events_and_bounds_the_horizon passed", "blue"))
+
+def test_upcoming_keeps_ongoing_events_soonest_first(fetch):
+    fetch.return_value = [
+        {"title": "Workshop", "start_date": "2030-01-05", "end_date": None},
+        {"title": "Exhibition", "start_date": "2029-12-20", "end_date": "2030-01-03"},
+    ]
+    titles = [e["title"] for e in ClubEventIndex().upcoming("c1", today="2030-01-01")]
+    assert titles == ["Exhibition", "Workshop"]
+    print(color_text("test_upcoming_keeps_ongoing_events_soonest_first passed", "red"))
+
+def test_new_day_moves_the_window(fetch):
+    index = ClubEventIndex(ttl=3600)
+    assert len(index.upcoming("c1", today="2030-01-01")) == 2
+    # Cached for the rest of the day
+    index.upcoming("c1", today="2030-01-01")
+    assert fetch.call_count == 1
+    # The next day reloads from the new window start
+    index.upcoming("c1", today="2030-01-03")
+    assert fetch.call_count == 2 and fetch.call_args.kwargs["from_date"] == "2030-01-03"
+    print(color_text("test_new_day_moves_the_window passed", "green"))
+
+def test_events_that_ended_before_today_are_dropped(fetch):
+    index = ClubEventIndex()
+    titles = [e["title"] for e in index.upcoming("c1", today="2030-01-05")]
+    assert titles == ["Open day"]
+    assert index.upcoming("c1", limit=0, today="2030-01-05") == []
+    print(color_text("test_events_that_ended_before_today_are_dropped passed", "yellow"))
+
+# --- Shared across workers ---
+def test_invalidation_reaches_other_workers(tmp_path, fetch):
+    path = str(tmp_path / "shared_cache.sqlite3")
+    def worker():
+        store = SharedStore(path, max_bytes=2 ** 20, sync_seconds=0)
+        with patch("event_index.create_cache", lambda namespace, maxsize, ttl: SharedCache(namespace, maxsize=maxsize, ttl=ttl, store=store)):
+            return ClubEventIndex(ttl=60)
+    a, b = worker(), worker()
+    assert [e["title"] for e in a.upcoming("c1", today="2030-01-01")] == ["Kickoff", "Open day"]
+    b.upcoming("c1", today="2030-01-01")
+    assert fetch.call_count == 1
+    # An events change reported to one worker reloads the club in every worker
+    b.invalidate("c1")
+    a.upcoming("c1", today="2030-01-01")
+    assert fetch.call_count == 2
+    print(color_text("test_invalidation_reaches_other_workers passed", "green"))
@@ -0,0 +1,60 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from unittest.mock import patch
+
+from fork_safe import PerProcess, ForkSafeProxy
+from worker_bench import bench_index
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+
+class FakeClient:
+    created = 0
+
+    def __init__(self):
+        FakeClient.created += 1
+        self.number = FakeClient.created
+
+    def table(self, name):
+        return (self.number, name)
+
+
+def test_per_process_value_is_recreated_after_fork():
+    value = PerProcess(object)
+    with patch("fork_safe.os.getpid", return_value=100):
+        parent = value.get()
+        assert value.get() is parent
+    with patch("fork_safe.os.getpid", return_value=101):
+        assert value.get() is not parent
+    print(color_text("✓ Forked worker gets its own client", "green"))
+
+
+def test_proxy_is_lazy_and_forwards_calls():
+    FakeClient.created = 0
+    client = ForkSafeProxy(FakeClient)
+    assert FakeClient.created == 0  # importing the module opens nothing
+    with patch("fork_safe.os.getpid", return_value=200):
+        assert client.table("clubs") == (1, "clubs")
+        assert client.table("events") == (1, "events")
+    with patch("fork_safe.os.getpid", return_value=201):
+        assert client.table("clubs") == (2, "clubs")
+    print(color_text("✓ Proxy opens one client per process on first use", "green"))
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_index_benchmark_runs_forked_workers():
+    rows = bench_index([1, 2], clubs=200, dim=16, duration=0.2)
+    assert [r["workers"] for r in rows] == [1, 2]
+    assert all(r["qps"] > 0 for r in rows)
+    print(color_text(f"✓ Worker benchmark: {rows}", "blue"))
@@ -0,0 +1,50 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from unittest.mock import patch
+
+import recommender
+from interest_normalizer import InterestNormalizer
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+# --- Lexicon and fuzzy matching ---
+@pytest.mark.parametrize("question, expected", [
+    ("I am interested in singing, what clubs are available?", ["Music"]),
+    ("I like coding and basketball", ["Technology", "Sports"]),
+    ("Any clubs for machine learning?", ["Technology"]),
+    ("I enjoy basketbal and progamming", ["Sports", "Technology"]),
+])
+def test_normalizer_maps_phrases_to_categories(question, expected):
+    categories, _ = InterestNormalizer().normalize(question)
+    assert categories == expected
+    print(color_text(f"test_normalizer_maps_phrases_to_categories passed: {question}", "green"))
+
+def test_normalizer_reports_unmapped_words():
+    categories, unmapped = InterestNormalizer().normalize("I like origami")
+    assert categories == []
+    assert unmapped == ["origami"]
+    categories, _ = InterestNormalizer(learned={"origami": "Arts"}).normalize("I like origami")
+    assert categories == ["Arts"]
+    print(color_text("test_normalizer_reports_unmapped_words passed", "yellow"))
+
+# --- extract_interests only calls the LLM for unmapped phrases ---
+@patch("recommender.llm_extract_interests")
+def test_extract_interests_local_first(mock_llm):
+    mock_llm.return_value = ["arts"]
+    assert recommender.extract_interests("I love playing football") == ["sports"]
+    assert recommender.extract_interests("What clubs do you recommend?") == []
+    assert mock_llm.call_count == 0
+    assert recommender.extract_interests("I like origami") == ["arts"]
+    assert mock_llm.call_count == 1
+    print(color_text("test_extract_interests_local_first passed", "blue"))
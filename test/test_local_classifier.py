@@ -0,0 +1,86 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from unittest.mock import patch
+
+from local_classifier import LocalClassifier
+import classifier
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+# --- Keyword rules ---
+@pytest.mark.parametrize("route,question,expected", [
+    ("question", "How do I reset my password?", "Website"),
+    ("noid", "What clubs are there?", "clublist"),
+    ("noid", "Can you recommend a club for me?", "recommendation"),
+    ("catcher", "yes please", "yes"),
+    ("catcher", "no thanks", "no"),
+    ("question", "How do i create new clubs?", "General"),
+    ("noid", "Tell me about the Chess Club", "single"),
+])
+def test_rules_answer_locally(route, question, expected):
+    assert LocalClassifier(route).classify(question) == expected
+    print(color_text(f"test_rules_answer_locally[{question}] passed", "green"))
+
+# --- Deferral ---
+def test_follow_up_defers_to_llm():
+    clf = LocalClassifier("question")
+    assert clf.classify("Can I join it?") is None
+    assert clf.get_stats()["llm_fallback"] == 1
+    print(color_text("test_follow_up_defers_to_llm passed", "yellow"))
+
+# Misroutes found in review: each must go to the LLM or land on the right label, never a wrong local answer
+@pytest.mark.parametrize("route,question,allowed", [
+    ("catcher", "no, show me music clubs", {None, "continue"}),
+    ("catcher", "ok show me sports clubs", {None, "continue"}),
+    ("question", "How do I register for the club's next event?", {None, "Club"}),
+    ("question", "Is the club room near the library?", {None, "Club"}),
+    ("noid", "What is the best club for me?", {None, "recommendation"}),
+])
+def test_mixed_cues_are_not_misrouted(route, question, allowed):
+    assert LocalClassifier(route).classify(question) in allowed
+    print(color_text(f"test_mixed_cues_are_not_misrouted[{question}] passed", "red"))
+
+# Out-of-domain questions the model was confidently wrong about: its words are mostly unseen
+@pytest.mark.parametrize("route,question", [
+    ("noid", "Where can I eat on campus?"),
+    ("noid", "which clubs meet on friday?"),
+    ("noid", "Is there a dance club?"),
+    ("noid", "Tell me about basketball"),
+    ("question", "Where can I eat on campus?"),
+])
+def test_unknown_words_defer_to_llm(route, question):
+    clf = LocalClassifier(route)
+    assert clf.predict(question) == (None, 0.0, "unknown_words")
+    assert clf.classify(question) is None
+    print(color_text(f"test_unknown_words_defer_to_llm[{question}] passed", "yellow"))
+
+def test_threshold_controls_fallback():
+    strict = LocalClassifier("noid", threshold=1.0)
+    assert strict.classify("How do I join clubs?") is None
+    assert strict.get_stats()["fallback_rate"] == 1.0
+    print(color_text("test_threshold_controls_fallback passed", "blue"))
+
+# --- Integration with the LLM classifier ---
+@patch("classifier.query_gemini_llm")
+def test_classify_catcher_skips_llm_when_confident(mock_llm):
+    assert classifier.classify_catcher_all_clubs("Yes") == "yes"
+    mock_llm.assert_not_called()
+    print(color_text("test_classify_catcher_skips_llm_when_confident passed", "red"))
+
+@patch("classifier.query_gemini_llm")
+def test_classify_catcher_uses_llm_when_unsure(mock_llm):
+    mock_llm.return_value = "continue"
+    assert classifier.classify_catcher_all_clubs("hmm, maybe") == "continue"
+    mock_llm.assert_called_once()
+    print(color_text("test_classify_catcher_uses_llm_when_unsure passed", "green"))
@@ -0,0 +1,137 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import asyncio
+import threading
+from unittest.mock import patch
+
+import micro_batcher
+from micro_batcher import build_batch_prompt
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+HISTORY = "PREVIOUS CONVERSATION:\nUser: Tell me about the Chess Club\nAssistant: It meets on Fridays.\n"
+CLUB_CONTEXT = "CLUB DETAILS:\n- Name: Chess Club\n" + "".join(f"FAQ {i}: question and answer text here\n" for i in range(200))
+
+# --- Batched prompt ---
+def test_batch_prompt_keeps_history_and_shortens_club_context():
+    prompt = build_batch_prompt("question", [("Can I join it?", HISTORY, CLUB_CONTEXT), ("How do I log in?", "", "")])
+    assert "User: Tell me about the Chess Club" in prompt
+    assert "- Name: Chess Club" in prompt
+    assert "FAQ 199" not in prompt
+    print(color_text("test_batch_prompt_keeps_history_and_shortens_club_context passed", "green"))
+
+def test_single_classifier_gets_history_then_club_context():
+    with patch.object(micro_batcher, "classify_locally", return_value=None), \
+         patch.dict(micro_batcher.ROUTE_SPECS["question"], {"single": lambda q, prefix, local_first: prefix}):
+        prefix = asyncio.run(micro_batcher.classify_async("question", "Can I join it?", prefix=HISTORY, context="CLUB"))
+    assert prefix == f"{HISTORY}\nCLUB"
+    print(color_text("test_single_classifier_gets_history_then_club_context passed", "yellow"))
+
+# --- Event loop ---
+def test_local_classification_runs_off_the_event_loop():
+    threads = []
+    def classify_locally(route, user_question):
+        threads.append(threading.current_thread())
+        return "single"
+    with patch.object(micro_batcher, "classify_locally", classify_locally):
+        assert asyncio.run(micro_batcher.classify_async("noid", "Tell me about the Chess Club")) == "single"
+    assert threads and threads[0] is not threading.main_thread()
+    print(color_text("test_local_classification_runs_off_the_event_loop passed", "blue"))
+
+# --- Batching ---
+class FakeLLM:
+    """Batched classifier LLM: labels each numbered item from `answers`, recording every prompt."""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.prompts = []
+
+    def __call__(self, prompt, context_text, api_key, call_site=None, response_schema=None):
+        self.prompts.append(prompt)
+        items = [line[len("Message: "):] for line in prompt.splitlines() if line.startswith("Message: ")]
+        reply = {str(i): self.answers[q] for i, q in enumerate(items, 1) if self.answers.get(q)}
+        return json.dumps(reply)
+
+def run_batch(batcher, questions):
+    async def main():
+        return await asyncio.gather(*[batcher.classify(q) for q in questions])
+    return asyncio.run(main())
+
+def test_concurrent_callers_share_one_llm_call():
+    llm = FakeLLM({"Who can join?": "Club", "How do I log in?": "Website", "Where is the library?": "General"})
+    batcher = micro_batcher.ClassificationBatcher("question", max_batch_size=8, max_wait_ms=20)
+    with patch.object(micro_batcher, "query_gemini_llm", llm):
+        labels = run_batch(batcher, ["Who can join?", "How do I log in?", "Where is the library?"])
+    assert labels == ["Club", "Website", "General"]
+    assert len(llm.prompts) == 1
+    assert batcher.get_stats()["batches"] == 1 and batcher.get_stats()["calls_saved"] == 2
+    print(color_text("test_concurrent_callers_share_one_llm_call passed", "red"))
+
+def test_full_batch_is_sent_without_waiting():
+    llm = FakeLLM({f"q{i}": "Club" for i in range(5)})
+    # A wait far longer than the test: only the size limit can send the first batch
+    batcher = micro_batcher.ClassificationBatcher("question", max_batch_size=2, max_wait_ms=60_000)
+    async def main():
+        first = [asyncio.ensure_future(batcher.classify(q)) for q in ("q0", "q1")]
+        done = await asyncio.wait_for(asyncio.gather(*first), timeout=5)
+        assert not batcher._queue and batcher._timer is None
+        return done
+    with patch.object(micro_batcher, "query_gemini_llm", llm):
+        assert asyncio.run(main()) == ["Club", "Club"]
+    assert len(llm.prompts) == 1
+    print(color_text("test_full_batch_is_sent_without_waiting passed", "green"))
+
+def test_partial_batch_is_sent_after_max_wait():
+    llm = FakeLLM({"q0": "Club", "q1": "Website", "q2": "General"})
+    batcher = micro_batcher.ClassificationBatcher("question", max_batch_size=2, max_wait_ms=10)
+    async def main():
+        labels = await asyncio.wait_for(asyncio.gather(*[batcher.classify(q) for q in ("q0", "q1", "q2")]), timeout=5)
+        return labels
+    with patch.object(micro_batcher, "query_gemini_llm", llm), \
+         patch.dict(micro_batcher.ROUTE_SPECS["question"], {"single": lambda q, prefix, local_first: "General"}):
+        labels = asyncio.run(main())
+    # q0 and q1 fill a batch at once; q2 waits alone until the timer sends it as a single-item call
+    assert labels == ["Club", "Website", "General"]
+    assert len(llm.prompts) == 1
+    assert batcher.get_stats()["batches"] == 2
+    print(color_text("test_partial_batch_is_sent_after_max_wait passed", "yellow"))
+
+def test_items_the_reply_leaves_out_fall_back_to_single_calls():
+    llm = FakeLLM({"Who can join?": "Club", "Tell me something": None, "How do I log in?": "Website"})
+    singles = []
+    def single(question, prefix, local_first):
+        singles.append(question)
+        return "General"
+    batcher = micro_batcher.ClassificationBatcher("question", max_batch_size=8, max_wait_ms=10)
+    with patch.object(micro_batcher, "query_gemini_llm", llm), \
+         patch.dict(micro_batcher.ROUTE_SPECS["question"], {"single": single}):
+        labels = run_batch(batcher, ["Who can join?", "Tell me something", "How do I log in?"])
+    assert labels == ["Club", "General", "Website"]
+    assert singles == ["Tell me something"]
+    assert batcher.get_stats()["single_fallbacks"] == 1
+    print(color_text("test_items_the_reply_leaves_out_fall_back_to_single_calls passed", "blue"))
+
+def test_running_batches_are_kept_referenced():
+    llm = FakeLLM({"q0": "Club", "q1": "Club"})
+    batcher = micro_batcher.ClassificationBatcher("question", max_batch_size=2, max_wait_ms=10)
+    seen = []
+    async def main():
+        pending = asyncio.gather(batcher.classify("q0"), batcher.classify("q1"))
+        await asyncio.sleep(0)
+        seen.append(len(batcher._running))
+        return await pending
+    with patch.object(micro_batcher, "query_gemini_llm", llm):
+        assert asyncio.run(main()) == ["Club", "Club"]
+    assert seen == [1] and not batcher._running
+    print(color_text("test_running_batches_are_kept_referenced passed", "red"))
@@ -0,0 +1,50 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+
+from need_history import follow_up_reason, need_history
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+# --- Follow-up cues ---
+@pytest.mark.parametrize("question", [
+    "Can I join it?",
+    "When does it start?",
+    "Is that available online?",
+    "Tell me more",
+    "and on weekends?",
+    "Tuesday?",
+])
+def test_follow_up_questions_need_history(question):
+    assert follow_up_reason(question) is not None
+    assert need_history(question) == "Yes"
+    print(color_text(f"test_follow_up_questions_need_history passed: {question}", "green"))
+
+# --- Self-contained questions ---
+@pytest.mark.parametrize("question", [
+    "What is the purpose of this club?",
+    "How do I reset my password?",
+    "Where can I find information about membership fees?",
+    "Thank you!",
+])
+def test_self_contained_questions_skip_history(question):
+    assert follow_up_reason(question) is None
+    assert need_history(question) == "No"
+    print(color_text(f"test_self_contained_questions_skip_history passed: {question}", "yellow"))
+
+# --- Topic continuity ---
+def test_topic_continuity_uses_last_answer():
+    last_turn = {"question": "Any events?", "answer": "The Robotics Workshop is on Friday."}
+    assert follow_up_reason("Where is the robotics workshop held?", last_turn) == "topic"
+    assert follow_up_reason("Where is the robotics workshop held?") is None
+    print(color_text("test_topic_continuity_uses_last_answer passed", "blue"))
@@ -0,0 +1,144 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from unittest.mock import patch, MagicMock
+
+import ai_init
+import classifier
+from prompt_cache import PromptPrefixCache
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+PREFIX = "You are a classifier. " * 50
+
+
+class FakeModel:
+    def __init__(self, handle, fail=False):
+        self.handle = handle
+        self.fail = fail
+        self.prompts = []
+
+    def generate_content(self, prompt):
+        if self.fail:
+            raise RuntimeError("cached content not found")
+        self.prompts.append(prompt)
+        usage = MagicMock(prompt_token_count=10, candidates_token_count=2, cached_content_token_count=250)
+        return MagicMock(text="Club", usage_metadata=usage)
+
+
+class FakeBackend:
+    """Stand-in for a provider with context caching; handles are plain dicts."""
+
+    def __init__(self, fail_create=False, fail_generate=False):
+        self.fail_create = fail_create
+        self.fail_generate = fail_generate
+        self.created = []
+        self.models = []
+
+    def create(self, model, static_text, ttl_seconds):
+        if self.fail_create:
+            raise RuntimeError("caching not supported")
+        handle = {"name": f"cachedContents/{len(self.created)}", "model": model, "text": static_text}
+        self.created.append(handle)
+        return handle
+
+    def model_for(self, handle):
+        model = FakeModel(handle, fail=self.fail_generate)
+        self.models.append(model)
+        return model
+
+    def delete(self, handle):
+        pass
+
+
+def test_prefix_registered_once_per_model():
+    cache = PromptPrefixCache(backend=FakeBackend(), min_tokens=0)
+    first = cache.handle("model-a", PREFIX)
+    assert cache.handle("model-a", PREFIX) is first
+    assert cache.handle("model-b", PREFIX) is not first
+    assert cache.get_stats()["created"] == 2 and cache.get_stats()["hits"] == 1
+    print(color_text("✓ Prefix registered once per model", "green"))
+
+
+def test_short_prefix_and_disabled_cache_send_inline():
+    backend = FakeBackend()
+    assert PromptPrefixCache(backend=backend, min_tokens=10_000).handle("m", PREFIX) is None
+    assert PromptPrefixCache(backend=backend, min_tokens=0, enabled=False).handle("m", PREFIX) is None
+    assert backend.created == []
+    print(color_text("✓ Short prefixes and disabled cache are sent inline", "green"))
+
+
+def test_provider_without_caching_falls_back_and_retries_later():
+    backend = FakeBackend(fail_create=True)
+    cache = PromptPrefixCache(backend=backend, min_tokens=0, retry_seconds=600)
+    assert cache.handle("m", PREFIX) is None
+    backend.fail_create = False
+    assert cache.handle("m", PREFIX) is None  # still cooling down
+    with patch("prompt_cache.time.time", return_value=cache._failed.get(cache.key("m", PREFIX)) + 1):
+        assert cache.handle("m", PREFIX) is not None
+    assert cache.get_stats()["errors"] == 1
+    print(color_text("✓ Unsupported provider falls back inline, retried after cooldown", "green"))
+
+
+def test_handle_recreated_near_expiry():
+    backend = FakeBackend()
+    cache = PromptPrefixCache(backend=backend, ttl=120, min_tokens=0)
+    first = cache.handle("m", PREFIX)
+    with patch("prompt_cache.time.time", return_value=cache._handles.get(cache.key("m", PREFIX))[1] - 30):
+        assert cache.handle("m", PREFIX) is not first
+    assert len(backend.created) == 2
+    print(color_text("✓ Handle recreated before it expires", "green"))
+
+
+@patch("ai_init.genai")
+def test_gemini_sends_only_dynamic_suffix_with_handle(mock_genai):
+    backend = FakeBackend()
+    with patch.object(ai_init, "prompt_prefix_cache", PromptPrefixCache(backend=backend, min_tokens=0)):
+        answer = ai_init.query_gemini_llm("Who can join?", "HISTORY\n", "key", call_site="classify_question",
+                                          static_prefix=PREFIX)
+        ai_init.query_gemini_llm("When?", "HISTORY\n", "key", call_site="classify_question", static_prefix=PREFIX)
+        stats = ai_init.prompt_prefix_cache.get_stats()
+    assert answer == "Club"
+    assert len(backend.created) == 1
+    assert backend.models[0].prompts == ["HISTORY\n\n\nUser question: Who can join?"]
+    assert stats["cached_tokens"] == 500
+    mock_genai.GenerativeModel.assert_not_called()
+    print(color_text("✓ Gemini call references the prefix by handle", "green"))
+
+
+@patch("ai_init.genai")
+def test_gemini_rejected_handle_falls_back_to_full_prompt(mock_genai):
+    backend = FakeBackend(fail_generate=True)
+    client = mock_genai.GenerativeModel.return_value
+    client.generate_content.return_value = MagicMock(text="Club", usage_metadata=None)
+    with patch.object(ai_init, "prompt_prefix_cache", PromptPrefixCache(backend=backend, min_tokens=0)):
+        answer = ai_init.query_gemini_llm("Who can join?", "HISTORY\n", "key", static_prefix=PREFIX)
+        assert ai_init.prompt_prefix_cache.get_stats()["prefixes"] == 0
+    assert answer == "Club"
+    client.generate_content.assert_called_once_with(f"{PREFIX}HISTORY\n\n\nUser question: Who can join?")
+    print(color_text("✓ Rejected handle falls back to the full prompt", "green"))
+
+
+@pytest.mark.parametrize("classify,labels", [
+    (classifier.classify_question, "Website, Club, General"),
+    (classifier.classify_question_noid, "single, clublist, recommendation, general"),
+    (classifier.classify_catcher_all_clubs, "yes, no, continue"),
+])
+@patch("classifier.query_gemini_llm", return_value="continue")
+def test_output_format_follows_the_history(mock_llm, classify, labels):
+    classify("hmm, what now", prefix="PREVIOUS CONVERSATION: ...", local_first=False)
+    context_text = mock_llm.call_args.args[1]
+    static_prefix = mock_llm.call_args.kwargs["static_prefix"]
+    assert "STRICTLY respond" not in static_prefix
+    assert context_text.index("PREVIOUS CONVERSATION") < context_text.index(f"following words:** {labels}")
+    print(color_text(f"✓ {classify.__name__} keeps its output format after the history", "green"))
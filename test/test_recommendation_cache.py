@@ -0,0 +1,68 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+import numpy as np
+
+from club_index import ClubVectorIndex
+from recommendation_cache import RecommendationCache
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+VOCAB = ["music", "sports", "code"]
+
+def fake_embed(texts):
+    return np.array([[t.lower().count(w) + 0.01 for w in VOCAB] for t in texts], dtype=np.float32)
+
+CLUBS = [
+    {"id": 1, "name": "Choir", "description": "music", "category": "Music"},
+    {"id": 2, "name": "Football", "description": "sports", "category": "Sports"},
+    {"id": 3, "name": "Hackers", "description": "code", "category": "Technology"},
+]
+
+@pytest.fixture
+def setup():
+    catalog = {"clubs": list(CLUBS)}
+    index = ClubVectorIndex(load_clubs=lambda: catalog["clubs"], embed_fn=fake_embed, cache_path=None, snapshot_dir=None)
+    cache = RecommendationCache(index, categories=["Music", "Sports", "Technology"])
+    index.listeners.append(cache.precompute)
+    return index, cache, catalog
+
+# --- Precomputed sets ---
+def test_singles_and_pairs_are_precomputed(setup):
+    index, cache, _ = setup
+    index.build()
+    assert cache.get_stats()["precomputed"] == 6
+    ranked = cache.get_or_compute(["Sports", "music"], lambda interests: pytest.fail("should be precomputed"))
+    assert {r["club"]["name"] for r in ranked} == {"Choir", "Football"}
+    assert cache.get_stats()["hits"] == 1
+    print(color_text("test_singles_and_pairs_are_precomputed passed", "green"))
+
+def test_other_interest_sets_are_cached_on_first_use(setup):
+    index, cache, _ = setup
+    calls = []
+    compute = lambda interests: calls.append(interests) or []
+    cache.get_or_compute(["origami"], compute)
+    cache.get_or_compute(["Origami"], compute)
+    assert len(calls) == 1
+    print(color_text("test_other_interest_sets_are_cached_on_first_use passed", "yellow"))
+
+# --- Catalog changes ---
+def test_catalog_change_recomputes_sets(setup):
+    index, cache, catalog = setup
+    index.build()
+    catalog["clubs"].append({"id": 4, "name": "Band", "description": "music", "category": "Music"})
+    index.invalidate()
+    ranked = cache.get_or_compute(["music"], lambda interests: pytest.fail("should be precomputed"))
+    assert {r["club"]["name"] for r in ranked} == {"Choir", "Band"}
+    assert cache.get_stats()["up_to_date"] is True
+    print(color_text("test_catalog_change_recomputes_sets passed", "blue"))
@@ -0,0 +1,108 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import gzip
+import json
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from retention import purge_chat_history
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+class FakePool:
+    """The slice of the PostgREST pool that the retention job uses, over an in-memory chat_history table."""
+
+    def __init__(self, rows):
+        self.tables = {"chat_history": rows}
+        self.selects = 0
+        self.deletes = []
+        self.retried_deletes = []
+
+    def request_sync(self, method, table, params=None, json=None, prefer=None, retry=None):
+        rows = self.tables[table]
+        params = params or {}
+        if method == "DELETE":
+            ids = {int(i) for i in params["id"][len("in.("):-1].split(",")}
+            matched = [row for row in rows if row["id"] in ids]
+            self.deletes.append([row["id"] for row in matched])
+            self.retried_deletes.append(retry)
+            self.tables[table] = [row for row in rows if row not in matched]
+            return None
+        cutoff = params["created_at"][len("lt."):]
+        matched = sorted((row for row in rows if row["created_at"] < cutoff), key=lambda row: row["created_at"])
+        matched = matched[:params["limit"]]
+        self.selects += 1
+        columns = params["select"].split(",")
+        return [{c: row[c] for c in columns} for row in matched]
+
+
+def chat_rows(old, recent):
+    """`old` rows past the 90-day cutoff (stored newest first) and `recent` rows inside it."""
+    now = datetime.now(timezone.utc)
+    rows = []
+    for i in range(old):
+        created = (now - timedelta(days=200 - i)).isoformat()
+        rows.append({"id": i + 1, "session_id": "s1", "user_id": "u1", "question": f"old question {i}",
+                     "answer": f"old answer {i}", "created_at": created, "embedding": [0.1]})
+    for i in range(recent):
+        created = (now - timedelta(days=i)).isoformat()
+        rows.append({"id": 1000 + i, "session_id": "s2", "user_id": None, "question": f"recent question {i}",
+                     "answer": f"recent answer {i}", "created_at": created, "embedding": [0.2]})
+    return list(reversed(rows[:old])) + rows[old:]
+
+def read_archive(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def test_partial_last_batch_stops_without_extra_select(tmp_path):
+    client = FakePool(chat_rows(old=7, recent=2))
+    with patch("retention.pool", client):
+        stats = purge_chat_history(older_than_days=90, batch_size=3, archive_dir=str(tmp_path))
+    assert stats["rows"] == 7 and stats["batches"] == 3
+    assert [len(ids) for ids in client.deletes] == [3, 3, 1]
+    assert client.selects == 3
+    assert sorted(row["id"] for row in client.tables["chat_history"]) == [1000, 1001]
+    assert all(client.retried_deletes)
+    print(color_text("Old rows are deleted in batches and recent rows are kept.", "green"))
+
+def test_exact_multiple_ends_on_empty_batch(tmp_path):
+    client = FakePool(chat_rows(old=6, recent=1))
+    with patch("retention.pool", client):
+        stats = purge_chat_history(older_than_days=90, batch_size=3, archive_dir=str(tmp_path))
+    assert stats["rows"] == 6 and stats["batches"] == 2
+    assert client.selects == 3
+    assert [row["id"] for row in client.tables["chat_history"]] == [1000]
+    print(color_text("A full last batch is followed by one empty select, then the job stops.", "green"))
+
+def test_archive_holds_deleted_rows_oldest_first(tmp_path):
+    client = FakePool(chat_rows(old=5, recent=2))
+    with patch("retention.pool", client):
+        stats = purge_chat_history(older_than_days=90, batch_size=2, archive_dir=str(tmp_path))
+    archived = read_archive(stats["archive_path"])
+    assert [row["id"] for row in archived] == [1, 2, 3, 4, 5]
+    assert set(archived[0]) == {"id", "session_id", "user_id", "question", "answer", "created_at"}
+    assert archived[0]["question"] == "old question 0"
+    assert [row["created_at"] for row in archived] == sorted(row["created_at"] for row in archived)
+    assert [sorted(ids) for ids in client.deletes] == [[1, 2], [3, 4], [5]]
+    print(color_text("Every deleted row is archived, oldest first, with the archive columns only.", "green"))
+
+def test_max_batches_and_no_archive(tmp_path):
+    client = FakePool(chat_rows(old=7, recent=0))
+    with patch("retention.pool", client):
+        stats = purge_chat_history(older_than_days=90, batch_size=3, archive_dir=str(tmp_path),
+                                   archive=False, max_batches=1)
+    assert stats["rows"] == 3 and stats["batches"] == 1
+    assert stats["archive_path"] is None and os.listdir(tmp_path) == []
+    assert [row["id"] for row in client.tables["chat_history"]] == [7, 6, 5, 4]
+    print(color_text("max_batches bounds the run and --no-archive writes nothing.", "green"))
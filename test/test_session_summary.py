@@ -0,0 +1,59 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+import pytest
+from unittest.mock import patch, AsyncMock
+
+import session_summary
+from token_budget import estimate_tokens
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+# --- Extractive summary ---
+def test_long_answers_are_condensed_to_first_sentence():
+    club_list = "Here are all our clubs. " + "Chess Club: we play chess. " * 200
+    summary = session_summary.extractive_update("", "What clubs are there?", club_list)
+    assert summary == "- User: What clubs are there? | Assistant: Here are all our clubs."
+    print(color_text("test_long_answers_are_condensed_to_first_sentence passed", "green"))
+
+def test_summary_stays_within_token_bound():
+    summary = ""
+    for i in range(50):
+        summary = session_summary.extractive_update(summary, f"Question number {i} about events?", "Sure, here it is.", max_tokens=60)
+    assert estimate_tokens(summary) <= 60
+    assert "Question number 49" in summary
+    assert "Question number 0 " not in summary
+    print(color_text("test_summary_stays_within_token_bound passed", "yellow"))
+
+# --- Prompt context ---
+def test_history_context_uses_summary_or_falls_back():
+    with patch("session_summary.load_summary", AsyncMock(return_value="- User: hi | Assistant: hello")):
+        context = asyncio.run(session_summary.history_context("s1", "u1"))
+    assert "summary" in context and "- User: hi" in context
+    with patch("session_summary.load_summary", AsyncMock(return_value=None)), \
+         patch("faq_formatter.history_parser_async", AsyncMock(return_value="RAW")) as raw:
+        assert asyncio.run(session_summary.history_context("s1", "u1")) == "RAW"
+        raw.assert_called_once_with("u1", "s1", limit=3)
+    print(color_text("test_history_context_uses_summary_or_falls_back passed", "blue"))
+
+# --- Durable summary ---
+def test_summary_upsert_names_its_conflict_key():
+    request = AsyncMock()
+    with patch("session_summary.supabase_pool.pool.request", request):
+        asyncio.run(session_summary._store_summary("s1", "none", "- User: hi | Assistant: hello"))
+    method, table = request.call_args.args
+    assert (method, table) == ("POST", "chat_summary")
+    assert request.call_args.kwargs["params"] == {"on_conflict": "session_id,user_id"}
+    assert "resolution=merge-duplicates" in request.call_args.kwargs["prefer"]
+    assert request.call_args.kwargs["json"]["user_id"] is None
+    print(color_text("test_summary_upsert_names_its_conflict_key passed", "red"))
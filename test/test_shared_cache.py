@@ -0,0 +1,110 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import time
+import multiprocessing
+import pytest
+import numpy as np
+from unittest.mock import patch
+
+from shared_cache import SharedStore, SharedCache
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two 'workers': separate stores (connections) and L1 tiers on the same shared file."""
+    path = str(tmp_path / "shared_cache.sqlite3")
+    def worker(**kwargs):
+        store = SharedStore(path, max_bytes=kwargs.pop("max_bytes", 2 ** 20), sync_seconds=0)
+        return SharedCache("test", maxsize=16, store=store, **kwargs)
+    return worker
+
+
+def test_value_computed_by_one_worker_is_a_hit_for_another(workers):
+    a, b = workers(ttl=60), workers(ttl=60)
+    a.set("question", np.arange(4, dtype=np.float32))
+    assert np.array_equal(b.get("question"), np.arange(4, dtype=np.float32))
+    assert b.get_stats()["l2_hits"] == 1
+    b.get("question")
+    assert b.get_stats()["l1_hits"] == 1
+    print(color_text("✓ Shared tier hit across workers, then served from L1", "green"))
+
+
+def test_entries_expire(workers):
+    a, b = workers(), workers()
+    a.set(("s1", "u1"), "summary", ttl=0.05)
+    time.sleep(0.1)
+    assert b.get(("s1", "u1")) is None
+    print(color_text("✓ TTL applies to the shared tier", "green"))
+
+
+def test_delete_and_version_bump_reach_other_workers(workers):
+    a = workers(version_key=lambda key: key[0])
+    b = workers(version_key=lambda key: key[0])
+    a.set(("c1", "2030-01-01"), "context v0", version=a.version("c1"))
+    assert b.get(("c1", "2030-01-01")) == "context v0"
+    started_at = b.version("c1")
+    a.bump("c1")
+    assert b.get(("c1", "2030-01-01")) is None
+    # A render that started before the bump is not stored
+    b.set(("c1", "2030-01-01"), "stale", version=started_at)
+    assert a.get(("c1", "2030-01-01")) is None and b.get_stats()["stale_writes"] == 1
+
+    plain_a, plain_b = workers(), workers()
+    plain_a.set("user", "Ann")
+    assert plain_b.get("user") == "Ann"
+    plain_a.delete("user")
+    assert plain_b.get("user") is None
+    print(color_text("✓ Invalidations reach every worker", "blue"))
+
+
+def test_rewritten_values_are_never_served_stale(workers):
+    # Read-through caches (session summaries, last turns) always see the latest write
+    a, b = workers(ttl=60, read_through=True), workers(ttl=60, read_through=True)
+    a.set(("s1", "u1"), "turn1")
+    assert b.get(("s1", "u1")) == "turn1"
+    a.set(("s1", "u1"), "turn1\nturn2")
+    assert b.get(("s1", "u1")) == "turn1\nturn2"
+    b.set(("s1", "u1"), "turn1\nturn2\nturn3")
+    assert a.get(("s1", "u1")) == "turn1\nturn2\nturn3"
+    assert len(a.l1) == 0 and len(b.l1) == 0
+    print(color_text("✓ Rewritten values are read through the shared tier", "green"))
+
+
+def test_size_bound_evicts_least_recently_used(workers):
+    cache = workers(max_bytes=4000)
+    with patch("shared_cache.EVICTION_CHECK_EVERY", 1):
+        for i in range(20):
+            cache.set(f"k{i}", "x" * 500)
+    stats = cache.store.get_stats()
+    assert stats["evicted"] > 0 and stats["entries"] * 500 <= 4000
+    cache.l1.clear()
+    assert cache.get("k19") is not None and cache.get("k0") is None
+    print(color_text(f"✓ Size-bounded shared tier: {stats['entries']} entries kept", "yellow"))
+
+
+def _child_set(cache):
+    cache.set("from_child", {"pid": os.getpid()})
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_worker_shares_entries(workers):
+    cache = workers()
+    cache.set("from_parent", 1)  # opens the parent's connection before the fork
+    child = multiprocessing.get_context("fork").Process(target=_child_set, args=(cache,))
+    child.start()
+    child.join()
+    assert child.exitcode == 0
+    assert cache.get("from_child")["pid"] == child.pid
+    print(color_text("✓ Forked worker opens its own connection and shares entries", "red"))
@@ -0,0 +1,100 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from unittest.mock import MagicMock
+
+from state_store import ChatStateStore, FileStateBackend
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+@pytest.fixture
+def backend(tmp_path):
+    real = FileStateBackend(str(tmp_path / "chat_state.json"))
+    spy = MagicMock(wraps=real)
+    return spy
+
+# --- Negative caching ---
+def test_missing_state_is_cached(backend):
+    store = ChatStateStore(backend)
+    assert store.load("s1", "u1") is None
+    assert store.load("s1", "u1") is None
+    assert backend.load.call_count == 1
+    print(color_text("test_missing_state_is_cached passed", "green"))
+
+# --- Write coalescing ---
+def test_save_then_clear_skips_backend_when_row_never_existed(backend):
+    store = ChatStateStore(backend)
+    store.load("s1", "u1")
+    store.save("s1", "u1", "editing", "club-1", {})
+    store.clear("s1", "u1")
+    store.flush("s1", "u1")
+    assert backend.save.call_count == 0
+    assert backend.delete.call_count == 0
+    print(color_text("test_save_then_clear_skips_backend_when_row_never_existed passed", "yellow"))
+
+def test_repeated_saves_write_once(backend):
+    store = ChatStateStore(backend)
+    store.save("s1", "u1", "editing", "club-1", {})
+    store.save("s1", "u1", "editing", "club-1", {"name": "Chess"})
+    store.flush()
+    assert backend.save.call_count == 1
+    fresh = ChatStateStore(backend)
+    assert fresh.load("s1", "u1")["updates"] == {"name": "Chess"}
+    print(color_text("test_repeated_saves_write_once passed", "blue"))
+
+# --- TTL expiry ---
+def test_abandoned_session_expires(backend):
+    store = ChatStateStore(backend, ttl=0)
+    store.save("s1", "u1", "editing", "club-1", {})
+    store.flush()
+    assert store.load("s1", "u1") is None
+    store.flush()
+    assert ChatStateStore(backend).load("s1", "u1") is None
+    print(color_text("test_abandoned_session_expires passed", "red"))
+
+# --- Several workers ---
+def _in_other_worker(path, action):
+    """Run one state operation in a separate process with its own store, like another gunicorn worker."""
+    import multiprocessing
+
+    def run():
+        store = ChatStateStore(FileStateBackend(path), cache_reads=False)
+        if action == "save":
+            store.save("s1", "u1", "editing", "club-1", {"name": "Chess"})
+        else:
+            store.clear("s1", "u1")
+        store.flush()
+
+    worker = multiprocessing.get_context("fork").Process(target=run)
+    worker.start()
+    worker.join()
+    assert worker.exitcode == 0
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_workers_see_each_others_state(tmp_path):
+    path = str(tmp_path / "chat_state.json")
+    store = ChatStateStore(FileStateBackend(path), cache_reads=False)
+    assert store.load("s1", "u1") is None
+    _in_other_worker(path, "save")
+    assert store.load("s1", "u1")["updates"] == {"name": "Chess"}  # no stale "no state"
+    _in_other_worker(path, "clear")
+    assert store.load("s1", "u1") is None  # no stale "editing" row
+
+    # A row this worker never saw is still deleted by its clear
+    store = ChatStateStore(FileStateBackend(path), cache_reads=False)
+    assert store.load("s1", "u1") is None
+    _in_other_worker(path, "save")
+    store.clear("s1", "u1")
+    store.flush()
+    assert ChatStateStore(FileStateBackend(path)).load("s1", "u1") is None
+    print(color_text("test_workers_see_each_others_state passed", "green"))
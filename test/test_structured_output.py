@@ -0,0 +1,118 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+import ai_init
+from cleaner import parse_llm_json_response
+from structured_output import IncrementalJsonParser, repair_json, validate, parse_json_reply
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+SCHEMA = {
+    "type": "object",
+    "properties": {"name": {"type": "string"}, "location": {"type": "string"}},
+}
+
+
+def test_incremental_parser_tracks_partial_stream():
+    parser = IncrementalJsonParser()
+    parser.feed('```json\n{"name": "Chess')
+    assert parser.partial() == {"name": "Chess"} and not parser.done
+    parser.feed(' Club", "meta": {"tags": ["a", "b"]}, "loc')
+    assert parser.partial() == {"name": "Chess Club", "meta": {"tags": ["a", "b"]}}
+    parser.feed('ation": "Gym"}\n``` trailing text')
+    assert parser.done and parser.value()["location"] == "Gym"
+    print(color_text("✓ Partial stream parsed incrementally", "green"))
+
+
+def test_incremental_parser_rejects_invalid_stream_early():
+    parser = IncrementalJsonParser()
+    assert parser.feed('{"name": Chess') is False
+    assert parser.failed and "unexpected character" in parser.error
+    print(color_text("✓ Invalid stream detected before it ends", "green"))
+
+
+@pytest.mark.parametrize("raw,expected", [
+    ('Sure! {"name": "Go", "extra": {"a": {"b": 1}}} hope that helps', {"name": "Go", "extra": {"a": {"b": 1}}}),
+    ("{'name': 'Go', 'active': True,}", {"name": "Go", "active": True}),
+    ('{"name": "None of the above", "tags": ["a", "b"], "ok": None}', {"name": "None of the above", "tags": ["a", "b"], "ok": None}),
+])
+def test_repair_json(raw, expected):
+    assert repair_json(raw) == expected
+    print(color_text(f"✓ Repaired {raw!r}", "green"))
+
+
+def test_cut_off_reply_is_not_a_value():
+    with pytest.raises(ValueError):
+        repair_json('{"description": "We play chess every Tues')
+    with pytest.raises(ValueError):
+        parse_json_reply('{"description": "We play chess every Tues', SCHEMA)
+    print(color_text("✓ Truncated reply rejected instead of saved", "green"))
+
+
+@patch("ai_init.query_gemini_llm", side_effect=['{"description": "We play chess every Tues',
+                                                 '{"description": "We play chess every Tuesday"}'])
+def test_cut_off_reply_gets_the_repair_call(mock_llm):
+    schema = {"type": "object", "properties": {"description": {"type": "string"}}}
+    assert ai_init.query_gemini_json("prompt", "", "key", schema) == {"description": "We play chess every Tuesday"}
+    assert mock_llm.call_count == 2
+    print(color_text("✓ Truncated reply triggers the single repair call", "green"))
+
+
+def test_nested_values_survive_legacy_cleaner():
+    assert parse_llm_json_response('Result: {"name": "Go", "meta": {"x": 1}}') == {"name": "Go", "meta": {"x": 1}}
+    print(color_text("✓ cleaner keeps nested values", "green"))
+
+
+def test_validate_drops_unknown_keys_and_checks_enums():
+    assert validate({"name": "Go", "color": "red"}, SCHEMA) == {"name": "Go"}
+    with pytest.raises(ValueError):
+        validate({"1": "maybe"}, {"type": "object", "properties": {"1": {"type": "string", "enum": ["yes", "no"]}}})
+    with pytest.raises(ValueError):
+        parse_json_reply('{"name": 5}', SCHEMA)
+    print(color_text("✓ Schema validation", "green"))
+
+
+@patch("ai_init.query_gemini_llm", side_effect=['{"name": 5}', '{"name": "Go"}'])
+def test_single_repair_round_trip(mock_llm):
+    assert ai_init.query_gemini_json("prompt", "", "key", SCHEMA, call_site="edit_extract") == {"name": "Go"}
+    assert mock_llm.call_count == 2
+    assert mock_llm.call_args.kwargs["response_schema"] == SCHEMA
+    print(color_text("✓ One repair call after an invalid reply", "green"))
+
+
+@patch("ai_init.query_gemini_llm", return_value='Here you go: {"name": "Go",}')
+def test_local_repair_needs_no_round_trip(mock_llm):
+    assert ai_init.query_gemini_json("prompt", "", "key", SCHEMA) == {"name": "Go"}
+    assert mock_llm.call_count == 1
+    print(color_text("✓ Locally repairable reply costs no extra call", "green"))
+
+
+def test_schema_stream_stops_when_value_is_complete():
+    chunks = ['{"name"', ': "Go"}', ' ignored', ' never read']
+    read = []
+
+    def stream():
+        for chunk in chunks:
+            read.append(chunk)
+            yield SimpleNamespace(text=chunk)
+
+    model = MagicMock()
+    model.generate_content.return_value = stream()
+    response, text = ai_init._generate(model, "prompt", SCHEMA)
+    assert text == '{"name": "Go"}'
+    assert len(read) == 2
+    assert model.generate_content.call_args.kwargs["generation_config"]["response_mime_type"] == "application/json"
+    print(color_text("✓ Schema-constrained stream read only until the value completes", "green"))
@@ -0,0 +1,148 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import time
+import asyncio
+import httpx
+import pytest
+from unittest.mock import patch
+
+import supabase_pool
+from supabase_pool import PostgrestPool
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+def make_pool(handler, **kwargs):
+    return PostgrestPool(url="http://postgrest.test", key="key", transport=httpx.MockTransport(handler), **kwargs)
+
+def replies(*responses):
+    """Handler that returns the given responses (or raises the given exceptions) in order."""
+    calls = []
+    def handler(request):
+        calls.append(request)
+        response = responses[min(len(calls), len(responses)) - 1]
+        if isinstance(response, Exception):
+            raise response
+        return response
+    return handler, calls
+
+# --- Retries ---
+def test_transient_status_is_retried():
+    handler, calls = replies(httpx.Response(503), httpx.Response(200, json=[{"id": 1}]))
+    pool = make_pool(handler)
+    assert asyncio.run(pool.request("GET", "clubs", params={"id": "eq.1"})) == [{"id": 1}]
+    assert len(calls) == 2 and calls[0].url.params["id"] == "eq.1"
+    assert pool.get_stats()["retries"] == 1 and pool.get_stats()["errors"] == 0
+    print(color_text("test_transient_status_is_retried passed", "green"))
+
+def test_client_error_is_not_retried():
+    handler, calls = replies(httpx.Response(400, json={"code": "42703"}))
+    pool = make_pool(handler)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(pool.request("GET", "clubs"))
+    assert len(calls) == 1 and pool.get_stats()["errors"] == 1
+    print(color_text("test_client_error_is_not_retried passed", "yellow"))
+
+def test_retries_stop_at_max_retries():
+    handler, calls = replies(httpx.ConnectError("refused"))
+    pool = make_pool(handler, max_retries=2)
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(pool.request("GET", "clubs"))
+    assert len(calls) == 3 and pool.get_stats()["retries"] == 2
+    print(color_text("test_retries_stop_at_max_retries passed", "blue"))
+
+# --- Deadline ---
+def test_deadline_bounds_all_attempts():
+    async def slow(request):
+        await asyncio.sleep(5)
+        return httpx.Response(200, json=[])
+    pool = make_pool(slow, deadline=0.2)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(pool.request("GET", "clubs"))
+    stats = pool.get_stats()
+    assert stats["timeouts"] == 1 and stats["in_flight"] == 0
+    print(color_text("test_deadline_bounds_all_attempts passed", "red"))
+
+def test_per_call_deadline_overrides_pool_deadline():
+    async def slow(request):
+        await asyncio.sleep(0.3)
+        return httpx.Response(200, json=[])
+    pool = make_pool(slow, deadline=0.1)
+    assert asyncio.run(pool.request("GET", "clubs", deadline=2)) == []
+    print(color_text("test_per_call_deadline_overrides_pool_deadline passed", "green"))
+
+# --- Writes ---
+def test_insert_is_not_retried():
+    handler, calls = replies(httpx.Response(503), httpx.Response(201))
+    pool = make_pool(handler)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(pool.request("POST", "chat_history", json={"question": "Hi"}))
+    assert len(calls) == 1 and pool.get_stats()["retries"] == 0
+    print(color_text("test_insert_is_not_retried passed", "yellow"))
+
+def test_idempotent_write_is_retried_when_marked():
+    handler, calls = replies(httpx.ConnectError("reset"), httpx.Response(204))
+    pool = make_pool(handler)
+    assert asyncio.run(pool.request("DELETE", "chat_state", params={"session_id": "eq.s1"}, retry=True)) is None
+    assert len(calls) == 2
+    print(color_text("test_idempotent_write_is_retried_when_marked passed", "blue"))
+
+def test_state_helpers_upsert_users_and_replace_guest_rows():
+    handler, calls = replies(httpx.Response(204))
+    pool = make_pool(handler)
+    with patch.object(supabase_pool, "pool", pool):
+        asyncio.run(supabase_pool.save_state("s1", "u1", "editing", "c1", {"name": "Chess"}))
+        asyncio.run(supabase_pool.save_state("s1", None, "editing", "c1", {}))
+    upsert, delete, insert = calls
+    assert upsert.method == "POST" and upsert.url.params["on_conflict"] == "session_id,user_id"
+    assert "merge-duplicates" in upsert.headers["Prefer"]
+    assert json.loads(upsert.content)["updates"] == {"name": "Chess"}
+    assert delete.method == "DELETE" and delete.url.params["user_id"] == "is.null"
+    assert insert.method == "POST" and "on_conflict" not in insert.url.params
+    print(color_text("test_state_helpers_upsert_users_and_replace_guest_rows passed", "red"))
+
+# --- Blocking path ---
+def test_sync_requests_share_the_retry_policy_and_stats():
+    handler, calls = replies(httpx.Response(502), httpx.Response(200, json=[{"id": 1}]), httpx.Response(502))
+    pool = make_pool(handler)
+    assert pool.request_sync("GET", "clubs") == [{"id": 1}]
+    with pytest.raises(httpx.HTTPStatusError):
+        pool.request_sync("POST", "chat_history", json={})
+    stats = pool.get_stats()
+    assert len(calls) == 3 and stats["retries"] == 1 and stats["errors"] == 1
+    assert stats["latency"]["GET clubs"]["count"] == 1 and stats["in_flight"] == 0
+    print(color_text("test_sync_requests_share_the_retry_policy_and_stats passed", "green"))
+
+def test_sync_deadline_bounds_all_attempts():
+    handler, calls = replies(httpx.ConnectError("refused"))
+    pool = make_pool(handler, deadline=0.3, max_retries=100)
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        pool.request_sync("GET", "clubs")
+    assert time.monotonic() - start < 2
+    assert pool.get_stats()["timeouts"] == 1
+    print(color_text("test_sync_deadline_bounds_all_attempts passed", "yellow"))
+
+# --- Event loops ---
+def test_client_of_a_finished_event_loop_is_closed():
+    handler, _ = replies(httpx.Response(200, json=[]))
+    pool = make_pool(handler)
+    asyncio.run(pool.request("GET", "clubs"))
+    first = pool._client
+
+    async def second_loop():
+        await pool.request("GET", "clubs")
+        await pool.close()
+    asyncio.run(second_loop())
+    assert first.is_closed and pool._client is None
+    print(color_text("test_client_of_a_finished_event_loop_is_closed passed", "blue"))
@@ -0,0 +1,46 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+
+from token_budget import truncate_to_budget, get_budget, estimate_tokens
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+# --- Line-based truncation ---
+def test_text_within_budget_is_unchanged():
+    assert truncate_to_budget("short\n", 10) == ("short\n", False)
+    print(color_text("test_text_within_budget_is_unchanged passed", "green"))
+
+@pytest.mark.parametrize("strategy,kept,dropped", [
+    ("head", "line 0\n", "line 59\n"),
+    ("tail", "line 59\n", "line 0\n"),
+    ("middle", "line 0\n", "line 30\n"),
+])
+def test_strategies_keep_their_end(strategy, kept, dropped):
+    text = "".join(f"line {i}\n" for i in range(60))
+    result, truncated = truncate_to_budget(text, 20, strategy)
+    assert truncated and kept in result and dropped not in result
+    assert "lines omitted" in result
+    assert estimate_tokens(result) <= 20 + 15
+    print(color_text(f"test_strategies_keep_their_end[{strategy}] passed", "yellow"))
+
+# --- A single line over budget ---
+@pytest.mark.parametrize("strategy", ["head", "tail", "middle"])
+def test_single_long_line_is_cut_by_characters(strategy):
+    text = "Chess Club meets every Friday in Room 201. " * 100
+    result, truncated = truncate_to_budget(text, 50, strategy)
+    assert truncated
+    assert "Chess Club" in result
+    assert "characters omitted" in result
+    assert estimate_tokens(result) <= 50 + 15
+    print(color_text(f"test_single_long_line_is_cut_by_characters[{strategy}] passed", "blue"))
@@ -0,0 +1,62 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+# vector_db needs the langchain stack; skip where it is not installed
+pytest.importorskip("langchain.text_splitter")
+pytest.importorskip("langchain_chroma")
+import vector_db
+
+# --- Helper for color output ---
+def color_text(text, color):
+    colors = {
+        "green": "\033[92m",
+        "yellow": "\033[93m",
+        "blue": "\033[94m",
+        "red": "\033[91m",
+        "reset": "\033[0m"
+    }
+    return f"{colors.get(color, '')}{text}{colors['reset']}"
+
+DOCS = [SimpleNamespace(page_content="Clubs register at the start of term."),
+        SimpleNamespace(page_content="Each club needs an advisor.")]
+
+@pytest.fixture
+def store():
+    store = MagicMock()
+    store.similarity_search_by_vector.return_value = list(DOCS)
+    llm = MagicMock()
+    llm.invoke.return_value = SimpleNamespace(content="Register at the start of term.",
+                                              usage_metadata={"input_tokens": 50, "output_tokens": 8})
+    with patch("vector_db.initialize_vector_db", return_value=store), \
+         patch("vector_db.ChatGoogleGenerativeAI", return_value=llm):
+        store.llm = llm
+        yield store
+
+def test_precomputed_embedding_is_reused(store):
+    with patch("vector_db.embed_query") as embed_query:
+        answer = vector_db.query_pdf("How do I register?", mode="general_club",
+                                     query_embedding=np.array([0.25, 0.5], dtype=np.float32))
+    assert answer == "Register at the start of term."
+    embed_query.assert_not_called()
+    store.similarity_search_by_vector.assert_called_once_with([0.25, 0.5], k=6)
+    print(color_text("query_pdf searches with the embedding it was given.", "green"))
+
+def test_question_is_embedded_through_the_cache(store):
+    with patch("vector_db.embed_query", return_value=np.array([1.0, 0.0], dtype=np.float32)) as embed_query:
+        vector_db.query_pdf("How do I register?", mode="general_club")
+    embed_query.assert_called_once_with("How do I register?")
+    store.similarity_search_by_vector.assert_called_once_with([1.0, 0.0], k=6)
+    print(color_text("query_pdf embeds the question once via the embedding cache.", "green"))
+
+def test_retrieved_chunks_are_stuffed_in_order(store):
+    with patch("vector_db.embed_query", return_value=np.zeros(2, dtype=np.float32)):
+        vector_db.query_pdf("How do I register?", mode="general_club")
+    prompt = store.llm.invoke.call_args[0][0]
+    assert prompt.index(DOCS[0].page_content) < prompt.index(DOCS[1].page_content)
+    assert "Question: How do I register?" in prompt
+    print(color_text("Retrieved chunks are stuffed into one prompt, most relevant first.", "green"))
@@ -0,0 +1,153 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Rough characters-per-token ratio used when the provider does not report usage
+CHARS_PER_TOKEN = 4
+
+# Default input budgets (tokens) and truncation strategy per call site.
+# Override a budget with TOKEN_BUDGET_<CALL_SITE>, e.g. TOKEN_BUDGET_CLASSIFY_QUESTION=1500.
+DEFAULT_BUDGETS = {
+    "classify_question": (2000, "middle"),
+    "classify_noid": (2000, "middle"),
+    "classify_catcher": (1500, "middle"),
+    "classify_edit": (1500, "middle"),
+    "classify_question_batch": (8000, "middle"),
+    "classify_noid_batch": (8000, "middle"),
+    "classify_catcher_batch": (8000, "middle"),
+    "safety": (600, "head"),
+    # No whole-prompt budget: the club context trims its own FAQ/event segment ("club_context"),
+    # so the club details, username and answer rules around it are always sent in full
+    "answer_club": (None, "head"),
+    "club_context": (3500, "head"),
+    "answer_clublist": (6000, "middle"),
+    "recommend_extract": (800, "head"),
+    "recommend_match": (6000, "middle"),
+    "recommend_phrase": (1500, "middle"),
+    "edit_extract": (1000, "middle"),
+    "session_summary": (1500, "middle"),
+    "query_pdf": (6000, "head"),
+}
+
+# Placeholder inserted where text was removed
+TRUNCATION_MARKER = "[... {omitted} omitted to fit the prompt budget ...]"
+
+_lock = threading.Lock()
+_usage = {}
+
+
+def estimate_tokens(text):
+    """Cheap token estimate for budgeting (about 4 characters per token)."""
+    return (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def get_budget(call_site):
+    """Return (max_input_tokens or None, strategy) for a call site."""
+    budget, strategy = DEFAULT_BUDGETS.get(call_site, (None, "middle"))
+    override = os.getenv(f"TOKEN_BUDGET_{call_site.upper()}")
+    if override:
+        budget = int(override)
+    return budget, strategy
+
+
+def truncate_to_budget(text, max_tokens, strategy="middle"):
+    """
+    Trim text to roughly `max_tokens`, cutting on line boundaries so the result
+    is deterministic for the same input. A single line longer than the budget
+    is cut by characters instead, so something of it is always kept.
+
+    Strategies:
+        head: keep the beginning, drop trailing lines.
+        tail: keep the end, drop leading lines.
+        middle: keep the beginning (instructions) and the end (the ask), drop
+            lines from the middle (typically bulky history or catalog data).
+
+    Returns:
+        (text, truncated) where truncated says whether anything was removed.
+    """
+    if not text or max_tokens is None or estimate_tokens(text) <= max_tokens:
+        return text, False
+
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    lines = text.splitlines(keepends=True)
+    cut = []
+
+    def take(candidates, limit, from_end=False):
+        kept, used = [], 0
+        for line in candidates:
+            if used + len(line) > limit:
+                if not kept and limit > 0:
+                    # Not even one whole line fits: keep the part of it that does
+                    kept.append(line[len(line) - limit:] if from_end else line[:limit])
+                    cut.append(True)
+                break
+            kept.append(line)
+            used += len(line)
+        return kept
+
+    def marker(kept):
+        if cut:
+            omitted = f"{len(text) - sum(len(line) for line in kept)} characters"
+        else:
+            omitted = f"{len(lines) - len(kept)} lines"
+        return TRUNCATION_MARKER.format(omitted=omitted) + "\n"
+
+    def before_marker(kept):
+        head_text = "".join(kept)
+        return head_text if not head_text or head_text.endswith("\n") else head_text + "\n"
+
+    if strategy == "head":
+        kept = take(lines, max_chars)
+        return before_marker(kept) + marker(kept), True
+    if strategy == "tail":
+        kept = take(reversed(lines), max_chars, from_end=True)[::-1]
+        return marker(kept) + "".join(kept), True
+
+    head = take(lines, int(max_chars * 0.6))
+    tail = take(reversed(lines[len(head):]), max_chars - sum(len(l) for l in head), from_end=True)[::-1]
+    return before_marker(head) + marker(head + tail) + "".join(tail), True
+
+
+def apply_budget(call_site, text):
+    """Trim a prompt to its call site's budget. Returns (text, truncated)."""
+    budget, strategy = get_budget(call_site)
+    result = truncate_to_budget(text, budget, strategy)
+    if result[1]:
+        print(f"Prompt for '{call_site}' exceeded {budget} tokens; truncated ({strategy})")
+    return result
+
+
+def record_usage(call_site, input_tokens, output_tokens, latency_seconds=0.0, truncated=False, route=None):
+    """Accumulate token usage for a call site (and optionally the request route)."""
+    keys = [call_site] + ([f"{call_site}:{route}"] if route else [])
+    with _lock:
+        for key in keys:
+            entry = _usage.setdefault(key, {
+                "calls": 0, "input_tokens": 0, "output_tokens": 0,
+                "truncated": 0, "max_input_tokens": 0, "total_seconds": 0.0,
+            })
+            entry["calls"] += 1
+            entry["input_tokens"] += input_tokens
+            entry["output_tokens"] += output_tokens
+            entry["max_input_tokens"] = max(entry["max_input_tokens"], input_tokens)
+            entry["truncated"] += int(truncated)
+            entry["total_seconds"] += latency_seconds
+
+
+def get_token_usage():
+    with _lock:
+        return {
+            key: {
+                "calls": v["calls"],
+                "input_tokens": v["input_tokens"],
+                "output_tokens": v["output_tokens"],
+                "avg_input_tokens": round(v["input_tokens"] / v["calls"], 1),
+                "max_input_tokens": v["max_input_tokens"],
+                "truncated": v["truncated"],
+                "avg_seconds": round(v["total_seconds"] / v["calls"], 3),
+            }
+            for key, v in _usage.items()
+        }
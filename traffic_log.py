@@ -0,0 +1,55 @@
+import os
+import json
+import threading
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Set TRAFFIC_LOG_ENABLED=1 to record labelled traffic (classifier decisions, etc.)
+TRAFFIC_LOG_ENABLED = os.getenv("TRAFFIC_LOG_ENABLED", "0") == "1"
+TRAFFIC_LOG_DIR = os.getenv("TRAFFIC_LOG_DIR", "logs")
+
+_lock = threading.Lock()
+
+
+def _log_path(kind):
+    return os.path.join(TRAFFIC_LOG_DIR, f"{kind}.jsonl")
+
+
+def log_event(kind, **fields):
+    """
+    Append one JSON object to logs/<kind>.jsonl when traffic logging is enabled.
+
+    These logs are the source of extra training examples for the local
+    classifiers and of coverage reports; they never affect a live answer.
+    """
+    if not TRAFFIC_LOG_ENABLED:
+        return
+    record = {"ts": datetime.now(timezone.utc).isoformat(), **fields}
+    try:
+        with _lock:
+            os.makedirs(TRAFFIC_LOG_DIR, exist_ok=True)
+            with open(_log_path(kind), "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"Error writing traffic log '{kind}': {e}")
+
+
+def read_events(kind, path=None):
+    """Return all logged records of a kind (empty list if none were logged)."""
+    path = path or _log_path(kind)
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
@@ -1,14 +1,16 @@
 import os
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain.prompts import PromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.chains import RetrievalQA
 from langchain_chroma import Chroma
+from embeddings import get_embedder, embed_query
 import chromadb
 from dotenv import load_dotenv
 import shutil
+import time
+from token_budget import apply_budget, estimate_tokens, record_usage
+from fork_safe import PerProcess
 
 # Load environment variables
 load_dotenv()
@@ -18,14 +20,17 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 # Set up ChromaDB directory
 CHROMA_DB_DIR = "chroma_db"
 
-# Initialize ChromaDB client
 os.makedirs(CHROMA_DB_DIR, exist_ok=True)
-chroma_client = chromadb.PersistentClient(path=CHROMA_DB_DIR)
 
-# Global vector store references (for caching)
-pdf_vector_store_general_club = None
-pdf_vector_website_manager = None
-pdf_vector_website_student = None
+# ChromaDB client and loaded vector stores, per process: the client keeps the SQLite
+# store open, so it is created after gunicorn forks the workers, never in the parent
+_chroma_client = PerProcess(lambda: chromadb.PersistentClient(path=CHROMA_DB_DIR))
+_vector_stores = PerProcess(dict)
+
+
+def get_chroma_client():
+    """Return this process's ChromaDB client (opened on first use)."""
+    return _chroma_client.get()
 
 
 def initialize_vector_db(pdf_path, mode):
@@ -39,30 +44,20 @@ def initialize_vector_db(pdf_path, mode):
     Returns:
         ChromaDB vector store object
     """
-    global pdf_vector_store_general_club
-    global pdf_vector_website_manager
-    global pdf_vector_website_student
-    
+    vector_stores = _vector_stores.get()
+    chroma_client = get_chroma_client()
+
     try:
         # Check if the specific vector store for this mode already exists in memory
-        if mode == "general_club" and pdf_vector_store_general_club:
+        if vector_stores.get(mode):
             print(f"Using existing in-memory vector store for {mode}")
-            return pdf_vector_store_general_club
-        elif mode == "website_manager" and pdf_vector_website_manager:
-            print(f"Using existing in-memory vector store for {mode}")
-            return pdf_vector_website_manager
-        elif mode == "website_student" and pdf_vector_website_student:
-            print(f"Using existing in-memory vector store for {mode}")
-            return pdf_vector_website_student
+            return vector_stores[mode]
         
         # Set collection name
         collection_name = f"clubfaq_{mode}"
         
-        # Create embeddings
-        embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",  # Using the standard embedding model
-            google_api_key=GEMINI_API_KEY
-        )
+        # Shared embeddings client (same model the question embeddings use)
+        embeddings = get_embedder()
         
         # Check if collection exists
         try:
@@ -79,13 +74,8 @@ def initialize_vector_db(pdf_path, mode):
                         embedding_function=embeddings
                     )
                     
-                    # Store in appropriate global variable
-                    if mode == "general_club":
-                        pdf_vector_store_general_club = vector_store
-                    elif mode == "website_manager":
-                        pdf_vector_website_manager = vector_store
-                    elif mode == "website_student":
-                        pdf_vector_website_student = vector_store
+                    # Keep it for this process
+                    vector_stores[mode] = vector_store
                     
                     # Check if the collection has data
                     collection = chroma_client.get_collection(name=collection_name)
@@ -145,13 +135,8 @@ def initialize_vector_db(pdf_path, mode):
             collection_name=collection_name
         )
         
-        # Store in the appropriate global variable
-        if mode == "general_club":
-            pdf_vector_store_general_club = vector_store
-        elif mode == "website_manager":
-            pdf_vector_website_manager = vector_store
-        elif mode == "website_student":
-            pdf_vector_website_student = vector_store
+        # Keep it for this process
+        vector_stores[mode] = vector_store
         
         print(f"Vector database for {mode} initialized successfully")
         return vector_store
@@ -163,14 +148,15 @@ def initialize_vector_db(pdf_path, mode):
 def reset_collection(collection_name):
     """Delete an existing collection to reset it"""
     try:
-        chroma_client.delete_collection(name=collection_name)
+        get_chroma_client().delete_collection(name=collection_name)
+        _vector_stores.reset()
         print(f"Successfully deleted collection '{collection_name}'")
         return True
     except Exception as e:
         print(f"Error deleting collection: {e}")
         return False
 
-def query_pdf(question, mode, context_prefix=""):
+def query_pdf(question, mode, context_prefix="", query_embedding=None):
     """
     Query the ChromaDB vector database with a question using Gemini.
     
@@ -178,6 +164,9 @@ def query_pdf(question, mode, context_prefix=""):
         question: User's question
         mode: The mode to determine which PDF to use
         context_prefix: Additional context to prepend to the answer
+        query_embedding: Precomputed question embedding. When omitted the cached
+            embedding from embeddings.embed_query is used, so a question already
+            embedded by the centroid router is not embedded again.
         
     Returns:
         Answer from the vector database
@@ -198,10 +187,10 @@ def query_pdf(question, mode, context_prefix=""):
         # Get API key
         api_key = os.getenv("GEMINI_API_KEY")
         
-        # Create a retriever
-        retriever = vector_store.as_retriever(
-            search_kwargs={"k": 6}  # Fetch 6 most relevant chunks
-        )
+        # Retrieve the 6 most relevant chunks by vector
+        if query_embedding is None:
+            query_embedding = embed_query(question)
+        docs = vector_store.similarity_search_by_vector(list(map(float, query_embedding)), k=6)
         
         # Create a custom prompt template
         template = """
@@ -231,21 +220,27 @@ def query_pdf(question, mode, context_prefix=""):
             temperature=0.5
         )
         
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=retriever,
-            return_source_documents=False,
-            chain_type_kwargs={"prompt": prompt}
+        # "Stuff" the retrieved chunks (most relevant first) into the prompt and answer
+        context, truncated = apply_budget("query_pdf", "\n\n".join(doc.page_content for doc in docs))
+        full_prompt = prompt.format(context=context, question=question)
+        start = time.perf_counter()
+        message = llm.invoke(full_prompt)
+        result = message.content
+
+        usage = getattr(message, "usage_metadata", None) or {}
+        record_usage(
+            "query_pdf",
+            usage.get("input_tokens") or estimate_tokens(full_prompt),
+            usage.get("output_tokens") or estimate_tokens(result),
+            time.perf_counter() - start,
+            truncated,
+            mode
         )
         
-        # Run the chain
-        result = qa_chain.invoke(question)
-        
         # Format the response
         if context_prefix:
-            return f" {result['result']}"
-        return result['result']
+            return f" {result}"
+        return result
         
     except Exception as e:
         print(f"Error querying vector database: {e}")
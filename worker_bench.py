@@ -0,0 +1,197 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+import numpy as np
+import httpx
+from dotenv import load_dotenv
+
+from club_index import ClubVectorIndex
+
+# Load environment variables
+load_dotenv()
+
+# Question sent to /ask in the HTTP benchmark (a guest recommendation, no club context)
+BENCH_QUESTION = os.getenv("BENCH_QUESTION", "Can you recommend some clubs for someone who likes music and coding?")
+
+
+def private_memory_mb():
+    """Memory private to this process (not shared with other workers), or None off Linux."""
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            kb = sum(int(line.split()[1]) for line in f if line.startswith(("Private_Clean", "Private_Dirty")))
+        return round(kb / 1024, 1)
+    except (OSError, ValueError):
+        return None
+
+
+def synthetic_index(snapshot_dir, clubs=5000, dim=768, seed=0):
+    """Build (and snapshot) an index over a random catalog, as the real one is after its first build."""
+    rng = np.random.default_rng(seed)
+    catalog = [{"id": i, "name": f"Club {i}", "category": f"Category {i % 20}", "description": f"club {i}"}
+               for i in range(clubs)]
+    index = ClubVectorIndex(
+        load_clubs=lambda: catalog,
+        embed_fn=lambda texts: rng.standard_normal((len(texts), dim)).astype(np.float32),
+        cache_path=None, snapshot_dir=snapshot_dir, refresh_seconds=10 ** 9,
+    )
+    index.build()
+    return index
+
+
+def _index_worker(index, dim, duration, results):
+    rng = np.random.default_rng(os.getpid())
+    queries = rng.standard_normal((64, dim)).astype(np.float32)
+    count, deadline = 0, time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        index.rank(queries[count % len(queries)], top_k=5)
+        count += 1
+    results.put({"queries": count, "private_mb": private_memory_mb()})
+
+
+def bench_index(worker_counts, clubs=5000, dim=768, duration=3.0):
+    """
+    Rank throughput of the club index with 1..N forked workers.
+
+    The index is mapped in the parent before forking (as gunicorn.conf.py does
+    with preload), so workers share the matrix pages instead of copying them.
+
+    Returns:
+        List of {"workers", "qps", "speedup", "private_mb_per_worker", "matrix_mb"}.
+    """
+    snapshot_dir = tempfile.mkdtemp(prefix="club_index_bench_")
+    ctx = multiprocessing.get_context("fork")
+    try:
+        synthetic_index(snapshot_dir, clubs, dim)
+        # A fresh index that only maps the snapshot, like the gunicorn parent
+        index = ClubVectorIndex(load_clubs=lambda: [], cache_path=None, snapshot_dir=snapshot_dir,
+                                refresh_seconds=10 ** 9)
+        index.load_snapshot()
+        rows = []
+        for n in worker_counts:
+            results = ctx.Queue()
+            workers = [ctx.Process(target=_index_worker, args=(index, dim, duration, results)) for _ in range(n)]
+            for worker in workers:
+                worker.start()
+            reports = [results.get() for _ in workers]
+            for worker in workers:
+                worker.join()
+            qps = sum(r["queries"] for r in reports) / duration
+            private = [r["private_mb"] for r in reports if r["private_mb"] is not None]
+            rows.append({
+                "workers": n,
+                "qps": round(qps, 1),
+                "speedup": round(qps / rows[0]["qps"], 2) if rows else 1.0,
+                "private_mb_per_worker": round(sum(private) / len(private), 1) if private else None,
+                "matrix_mb": round(index.matrix.nbytes / 2 ** 20, 1),
+            })
+        return rows
+    finally:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+
+def _wait_until_up(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{url}/stats", timeout=2).status_code == 200:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def bench_http(worker_counts, port=8100, concurrency=16, duration=20.0, question=BENCH_QUESTION):
+    """
+    End-to-end /ask throughput of a local gunicorn deployment with 1..N workers.
+
+    Starts `gunicorn main:app` (configured by gunicorn.conf.py) once per worker
+    count, so it needs the same .env as the service itself.
+    """
+    url = f"http://127.0.0.1:{port}"
+    payload = {"club_id": "none", "user_question": question, "user_id": "none",
+               "logged_role": "guest", "session_id": "worker-bench"}
+    rows = []
+    for n in worker_counts:
+        env = {**os.environ, "WEB_CONCURRENCY": str(n), "PORT": str(port)}
+        server = subprocess.Popen(["gunicorn", "main:app", "--bind", f"127.0.0.1:{port}"], env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not _wait_until_up(url):
+                print(f"gunicorn with {n} workers did not come up")
+                continue
+            latencies, errors, pids = [], [0], set()
+            lock = threading.Lock()
+            deadline = time.perf_counter() + duration
+
+            def client():
+                with httpx.Client(base_url=url, timeout=60) as http:
+                    while time.perf_counter() < deadline:
+                        start = time.perf_counter()
+                        try:
+                            ok = http.post("/ask", json=payload).status_code == 200
+                        except httpx.HTTPError:
+                            ok = False
+                        with lock:
+                            if ok:
+                                latencies.append(time.perf_counter() - start)
+                            else:
+                                errors[0] += 1
+                    for _ in range(n * 4):
+                        pids.add(http.get("/stats").json().get("worker", {}).get("pid"))
+
+            threads = [threading.Thread(target=client) for _ in range(concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            latencies.sort()
+            rps = len(latencies) / duration
+            rows.append({
+                "workers": n,
+                "rps": round(rps, 1),
+                "speedup": round(rps / rows[0]["rps"], 2) if rows and rows[0]["rps"] else 1.0,
+                "p50_ms": round(latencies[len(latencies) // 2] * 1000) if latencies else None,
+                "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000) if latencies else None,
+                "errors": errors[0],
+                "workers_seen": len(pids - {None}),
+            })
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    return rows
+
+
+def print_table(rows):
+    if not rows:
+        print("No results")
+        return
+    columns = list(rows[0])
+    print("  ".join(f"{c:>22}" for c in columns))
+    for row in rows:
+        print("  ".join(f"{str(row[c]):>22}" for c in columns))
+
+
+if __name__ == "__main__":
+    # Example: python worker_bench.py --workers 1 2 4 8
+    #          python worker_bench.py --mode http --workers 1 2 4 --duration 30
+    parser = argparse.ArgumentParser(description="Benchmark scaling from 1 to N worker processes.")
+    parser.add_argument("--mode", choices=("index", "http"), default="index",
+                        help="index: offline club index ranking; http: /ask against a local gunicorn")
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=None, help="Seconds per worker count")
+    parser.add_argument("--clubs", type=int, default=5000, help="Synthetic catalog size (index mode)")
+    parser.add_argument("--dim", type=int, default=768, help="Embedding size (index mode)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients (http mode)")
+    parser.add_argument("--port", type=int, default=8100, help="Port for the local gunicorn (http mode)")
+    args = parser.parse_args()
+
+    if args.mode == "index":
+        print_table(bench_index(args.workers, args.clubs, args.dim, args.duration or 3.0))
+    else:
+        print_table(bench_http(args.workers, args.port, args.concurrency, args.duration or 20.0))